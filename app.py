@@ -6,10 +6,11 @@ import streamlit as st
 from datetime import datetime, date, timedelta
 from utils.auth import check_password, logout
 from utils.db import (
-    tasks_db, journal_db, get_journal_entry, save_journal_entry,
+    tasks_db, journal_db, settings, get_journal_entry, save_journal_entry,
     get_tasks_for_date, get_tasks_by_status, get_setting, set_setting
 )
 from utils.ai import generate_daily_summary, generate_task_suggestions
+from utils.search import search_palette
 from tinydb import Query
 
 
@@ -31,6 +32,10 @@ with st.sidebar:
     st.title("🏠 Personal Dashboard")
     st.markdown("---")
     
+    # Quick search across every page
+    search_palette()
+    st.markdown("---")
+    
     # Theme toggle
     current_theme = get_setting("theme", "light")
     theme_option = st.selectbox(
@@ -82,6 +87,8 @@ today_str = today.strftime("%Y-%m-%d")
 
 # Initialize session state
 if "daily_priorities" not in st.session_state:
+    # Keep old priorities_<date> keys out of the hot settings table
+    settings.archive_dated()
     st.session_state.daily_priorities = get_setting(f"priorities_{today_str}", ["", "", ""])
 
 if "mood" not in st.session_state:
@@ -6,6 +6,7 @@ import streamlit as st
 from datetime import datetime, date, timedelta
 from utils.auth import check_password
 from utils.db import gratitude_db
+from utils.search import show_search_target
 from utils.ai import get_ai_response
 from tinydb import Query
 import pandas as pd
@@ -23,6 +24,7 @@ if not check_password():
     st.stop()
 
 st.title("🙏 Gratitude & Reflection")
+show_search_target("gratitude")
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["✍️ Today's Reflection", "📚 Past Reflections", "📊 Insights"])
@@ -36,23 +38,17 @@ Q = Query()
 def get_gratitude_entry(date_obj):
     """Get gratitude entry for a specific date."""
     date_str = date_obj.strftime("%Y-%m-%d") if isinstance(date_obj, date) else date_obj
-    result = gratitude_db.search(Q.date == date_str)
-    return result[0] if result else None
+    return gratitude_db.get_by("date", date_str)
 
 
 def save_gratitude_entry(date_obj, data):
     """Save or update gratitude entry."""
     date_str = date_obj.strftime("%Y-%m-%d") if isinstance(date_obj, date) else date_obj
     
-    existing = get_gratitude_entry(date_str)
-    
     data["date"] = date_str
     data["updated_at"] = datetime.now().isoformat()
     
-    if existing:
-        gratitude_db.update(data, existing.doc_id)
-    else:
-        gratitude_db.insert(data)
+    gratitude_db.upsert_by("date", data)
 
 
 with tab1:
@@ -257,13 +253,11 @@ with tab2:
     st.markdown("---")
     st.markdown("### 📅 Recent Reflections")
     
-    # Show last 7 days
-    all_entries = gratitude_db.get_all()
+    # Show last 7 entries, newest first (only reads the newest partitions)
+    recent_entries = gratitude_db.latest(7)
     
-    if all_entries:
-        sorted_entries = sorted(all_entries, key=lambda x: x.get("date", ""), reverse=True)
-        
-        for entry in sorted_entries[:7]:
+    if recent_entries:
+        for entry in recent_entries:
             entry_date = datetime.strptime(entry.get("date"), "%Y-%m-%d").date()
             
             with st.expander(f"🌟 {entry_date.strftime('%A, %B %d, %Y')} - Happiness: {entry.get('happiness', 0)}/10"):
@@ -281,9 +275,7 @@ with tab2:
 with tab3:
     st.markdown("### 📊 Gratitude & Happiness Insights")
     
-    all_entries = gratitude_db.get_all()
-    
-    if len(all_entries) >= 3:
+    if len(gratitude_db.latest(3)) >= 3:
         # Time range
         time_range = st.selectbox("Time range", ["Last 7 days", "Last 30 days", "All time"])
         
@@ -294,7 +286,7 @@ with tab3:
         else:
             cutoff = "2000-01-01"
         
-        filtered = [e for e in all_entries if e.get("date", "") >= cutoff]
+        filtered = gratitude_db.range("date", cutoff)
         
         if filtered:
             # Prepare data
@@ -386,7 +378,7 @@ with tab3:
             
             while True:
                 date_str = current_date.strftime("%Y-%m-%d")
-                if any(e.get("date") == date_str for e in all_entries):
+                if gratitude_db.get_by("date", date_str):
                     streak += 1
                     current_date -= timedelta(days=1)
                 else:
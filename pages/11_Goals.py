@@ -6,6 +6,8 @@ import streamlit as st
 from datetime import datetime, date, timedelta
 from utils.auth import check_password
 from utils.db import goals_db
+from utils.undo import delete_with_undo, show_undo
+from utils.search import show_search_target
 from tinydb import Query
 import pandas as pd
 
@@ -22,6 +24,8 @@ if not check_password():
     st.stop()
 
 st.title("🎯 Goals & OKRs")
+show_undo()
+show_search_target("goals")
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["🎯 Active Goals", "➕ Add Goal/OKR", "📊 Progress Overview"])
@@ -109,7 +113,7 @@ with tab1:
                     
                     # Delete
                     if st.button("🗑️ Delete", key=f"delete_{goal.doc_id}"):
-                        goals_db.remove(goal.doc_id)
+                        delete_with_undo(goals_db, goal.doc_id, f"goal **{goal.get('title', '')}**")
                         st.rerun()
     else:
         st.info("No active goals. Set your first goal in the 'Add Goal/OKR' tab!")
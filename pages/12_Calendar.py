@@ -7,6 +7,8 @@ from datetime import datetime, date, timedelta
 import calendar as cal
 from utils.auth import check_password
 from utils.db import events_db, tasks_db, goals_db
+from utils.undo import delete_with_undo, show_undo
+from utils.search import show_search_target
 from tinydb import Query
 import pandas as pd
 
@@ -23,6 +25,8 @@ if not check_password():
     st.stop()
 
 st.title("📅 Calendar")
+show_undo()
+show_search_target("events")
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["📅 Month View", "➕ Add Event", "📋 Agenda"])
@@ -249,14 +253,11 @@ with tab3:
     start_str = start_date.isoformat()
     end_str = end_date.isoformat()
     
-    range_events = [e for e in events_db.get_all() 
-                    if start_str <= e.get("date", "") <= end_str]
+    range_events = events_db.range("date", start_str, end_str)
     
-    range_tasks = [t for t in tasks_db.get_all() 
-                   if t.get("deadline") and start_str <= t.get("deadline", "") <= end_str]
+    range_tasks = tasks_db.range("deadline", start_str, end_str)
     
-    range_goals = [g for g in goals_db.get_all() 
-                   if g.get("deadline") and start_str <= g.get("deadline", "") <= end_str]
+    range_goals = goals_db.range("deadline", start_str, end_str)
     
     # Organize by date
     agenda_by_date = {}
@@ -308,7 +309,7 @@ with tab3:
                 
                 with col_e2:
                     if st.button("🗑️", key=f"del_event_{event.doc_id}"):
-                        events_db.remove(event.doc_id)
+                        delete_with_undo(events_db, event.doc_id, f"event **{event.get('title', '')}**")
                         st.rerun()
             
             # Tasks
@@ -6,6 +6,8 @@ import streamlit as st
 from datetime import datetime, date, timedelta
 from utils.auth import check_password
 from utils.db import tasks_db
+from utils.undo import delete_with_undo, show_undo
+from utils.search import show_search_target
 from utils.ai import generate_task_suggestions
 from tinydb import Query
 import pandas as pd
@@ -23,6 +25,8 @@ if not check_password():
     st.stop()
 
 st.title("✅ Tasks & Projects Manager")
+show_undo()
+show_search_target("tasks")
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["📋 Kanban Board", "➕ Add Task", "📊 Projects"])
@@ -48,13 +52,15 @@ with tab1:
         sort_by = st.selectbox("Sort by", ["Created", "Deadline", "Priority"], key="sort_by")
     
     # Filter tasks
-    filtered_tasks = all_tasks.copy()
+    task_query = tasks_db.select()
     
     if filter_priority != "All":
-        filtered_tasks = [t for t in filtered_tasks if t.get("priority") == filter_priority]
+        task_query.where(priority=filter_priority)
     
     if filter_tag != "All":
-        filtered_tasks = [t for t in filtered_tasks if filter_tag in t.get("tags", [])]
+        task_query.where_contains("tags", filter_tag)
+    
+    filtered_tasks = task_query.all()
     
     # Kanban columns
     col_todo, col_doing, col_done = st.columns(3)
@@ -97,7 +103,7 @@ with tab1:
                 
                 with col_c:
                     if st.button("🗑️", key=f"del_{task.doc_id}"):
-                        tasks_db.remove(task.doc_id)
+                        delete_with_undo(tasks_db, task.doc_id, f"task **{task.get('title', '')}**")
                         st.rerun()
                 
                 st.markdown("---")
@@ -140,7 +146,7 @@ with tab1:
                 
                 with col_c:
                     if st.button("🗑️", key=f"del2_{task.doc_id}"):
-                        tasks_db.remove(task.doc_id)
+                        delete_with_undo(tasks_db, task.doc_id, f"task **{task.get('title', '')}**")
                         st.rerun()
                 
                 st.markdown("---")
@@ -166,7 +172,7 @@ with tab1:
                 
                 with col_b:
                     if st.button("🗑️", key=f"del3_{task.doc_id}"):
-                        tasks_db.remove(task.doc_id)
+                        delete_with_undo(tasks_db, task.doc_id, f"task **{task.get('title', '')}**")
                         st.rerun()
                 
                 st.markdown("---")
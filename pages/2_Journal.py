@@ -5,11 +5,14 @@ Daily, weekly, and monthly journal with AI analysis
 import streamlit as st
 from datetime import datetime, date, timedelta
 from utils.auth import check_password
-from utils.db import journal_db, get_journal_entry, save_journal_entry
+from utils.db import journal_db, gratitude_db, get_journal_entry, save_journal_entry, GRATITUDE_FIELDS
+from utils.search import show_search_target
 from utils.ai import analyze_journal_entry, generate_journal_summary, extract_goals_from_journal
 from tinydb import Query
 import pandas as pd
 
+SIMILAR_DAYS = 5
+
 
 # Page config
 st.set_page_config(
@@ -23,9 +26,10 @@ if not check_password():
     st.stop()
 
 st.title("📝 Personal Journal")
+show_search_target("journal")
 
 # Tabs
-tab1, tab2, tab3 = st.tabs(["✍️ Daily Journal", "📅 Past Entries", "📊 Insights"])
+tab1, tab2, tab3, tab4 = st.tabs(["✍️ Daily Journal", "📅 Past Entries", "📊 Insights", "🔍 Search"])
 
 
 with tab1:
@@ -95,6 +99,43 @@ with tab1:
                     st.metric("😰 Stress", f"{entry.get('stress')}/10")
         else:
             st.info("Start writing to use AI tools...")
+    
+    if journal_content.strip():
+        st.markdown("---")
+        st.markdown("### 🔗 Similar Days")
+        st.caption("Past entries that talk about the same things as today's.")
+        
+        col_journal, col_gratitude = st.columns(2)
+        today_str = today.strftime("%Y-%m-%d")
+        
+        with col_journal:
+            st.markdown("**📝 Journal**")
+            similar = [
+                (doc, score) for doc, score in journal_db.similar([journal_content], limit=SIMILAR_DAYS + 1)[0]
+                if doc.get("date") != today_str
+            ][:SIMILAR_DAYS]
+            for doc, score in similar:
+                entry_date = datetime.strptime(doc.get("date"), "%Y-%m-%d").date()
+                with st.expander(f"{entry_date.strftime('%A, %B %d, %Y')} · {score:.0%} similar"):
+                    content = doc.get("content", "")
+                    st.markdown(content[:500] + ("..." if len(content) > 500 else ""))
+            if not similar:
+                st.caption("No similar entries yet.")
+        
+        with col_gratitude:
+            st.markdown("**🙏 Gratitude**")
+            similar = [
+                (doc, score) for doc, score in gratitude_db.similar([journal_content], limit=SIMILAR_DAYS + 1)[0]
+                if doc.get("date") != today_str
+            ][:SIMILAR_DAYS]
+            for doc, score in similar:
+                entry_date = datetime.strptime(doc.get("date"), "%Y-%m-%d").date()
+                with st.expander(f"{entry_date.strftime('%A, %B %d, %Y')} · {score:.0%} similar"):
+                    for field in GRATITUDE_FIELDS:
+                        if doc.get(field):
+                            st.markdown(f"**{field.replace('_', ' ').capitalize()}:** {doc[field]}")
+            if not similar:
+                st.caption("No similar gratitude entries yet.")
 
 
 with tab2:
@@ -139,14 +180,11 @@ with tab2:
     st.markdown("---")
     st.markdown("### 📚 Recent Entries")
     
-    # Show last 7 days
-    all_entries = journal_db.get_all()
+    # Show last 7 entries, newest first (only reads the newest partitions)
+    recent_entries = journal_db.latest(7)
     
-    if all_entries:
-        # Sort by date descending
-        sorted_entries = sorted(all_entries, key=lambda x: x.get("date", ""), reverse=True)
-        
-        for entry in sorted_entries[:7]:
+    if recent_entries:
+        for entry in recent_entries:
             entry_date = datetime.strptime(entry.get("date"), "%Y-%m-%d").date()
             
             with st.expander(f"📝 {entry_date.strftime('%A, %B %d, %Y')}"):
@@ -171,21 +209,19 @@ with tab2:
 with tab3:
     st.markdown("### 📊 Journal Insights")
     
-    all_entries = journal_db.get_all()
-    
-    if len(all_entries) >= 3:
+    if len(journal_db.latest(3)) >= 3:
         # Time range selector
         time_range = st.selectbox("Select time range", ["Last 7 days", "Last 30 days", "All time"])
         
         # Filter entries by time range
         if time_range == "Last 7 days":
             cutoff_date = (date.today() - timedelta(days=7)).strftime("%Y-%m-%d")
-            filtered_entries = [e for e in all_entries if e.get("date", "") >= cutoff_date]
+            filtered_entries = journal_db.range("date", cutoff_date)
         elif time_range == "Last 30 days":
             cutoff_date = (date.today() - timedelta(days=30)).strftime("%Y-%m-%d")
-            filtered_entries = [e for e in all_entries if e.get("date", "") >= cutoff_date]
+            filtered_entries = journal_db.range("date", cutoff_date)
         else:
-            filtered_entries = all_entries
+            filtered_entries = journal_db.get_all()
         
         if filtered_entries:
             # Generate AI summary
@@ -266,5 +302,30 @@ with tab3:
         st.info("Write at least 3 journal entries to see insights!")
 
 
+with tab4:
+    st.markdown("### 🔍 Search Journal")
+    
+    search_query = st.text_input("Search your entries", placeholder="Enter keywords...")
+    
+    if search_query:
+        # Best matches first, from the full-text index
+        results = journal_db.search_text(search_query, limit=50)
+        
+        if results:
+            st.markdown(f"**Found {len(results)} entr{'y' if len(results) == 1 else 'ies'}**")
+            st.markdown("---")
+            
+            for entry, score, snippet in results:
+                entry_date = datetime.strptime(entry.get("date"), "%Y-%m-%d").date()
+                
+                with st.expander(f"📝 {entry_date.strftime('%A, %B %d, %Y')}"):
+                    st.caption(snippet)
+                    st.markdown(entry.get("content", ""))
+        else:
+            st.info("No entries found matching your search.")
+    else:
+        st.info("Enter a search term to find past entries.")
+
+
 st.markdown("---")
 st.caption("💡 Tip: Journal regularly to track your thoughts, feelings, and progress over time.")
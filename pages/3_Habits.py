@@ -5,8 +5,7 @@ Build and maintain habits with streak tracking and visualization
 import streamlit as st
 from datetime import datetime, date, timedelta
 from utils.auth import check_password
-from utils.db import habits_db, add_habit_entry
-from tinydb import Query
+from utils.db import habits_db, add_habit_entry, get_habit_entries, get_habit_entry, remove_habit
 import pandas as pd
 
 
@@ -70,13 +69,12 @@ with tab1:
     today_str = today.strftime("%Y-%m-%d")
     
     # Get active habits
-    Q = Query()
-    active_habits = habits_db.search(Q.active == True)
+    active_habits = habits_db.select().where(active=True).all()
     
     if active_habits:
         for habit in active_habits:
-            entries = habit.get("entries", [])
-            today_entry = next((e for e in entries if e["date"] == today_str), None)
+            entries = get_habit_entries(habit.doc_id)
+            today_entry = get_habit_entry(habit.doc_id, today_str)
             is_completed = today_entry.get("completed", False) if today_entry else False
             
             col1, col2, col3 = st.columns([3, 1, 1])
@@ -102,9 +100,8 @@ with tab1:
             if habit.get('frequency') == 'weekly':
                 # Calculate this week's progress
                 week_start = today - timedelta(days=today.weekday())
-                week_entries = [e for e in entries 
-                              if e["date"] >= week_start.strftime("%Y-%m-%d") 
-                              and e.get("completed")]
+                week_entries = [e for e in get_habit_entries(habit.doc_id, week_start) 
+                              if e.get("completed")]
                 target = habit.get("target", 3)
                 progress = min((len(week_entries) / target) * 100, 100)
                 st.progress(progress / 100)
@@ -134,8 +131,7 @@ with tab1:
                 "frequency": new_habit_frequency,
                 "target": new_habit_target,
                 "active": True,
-                "created_at": datetime.now().isoformat(),
-                "entries": []
+                "created_at": datetime.now().isoformat()
             })
             st.success(f"✅ Habit added: {new_habit_name}")
             st.rerun()
@@ -157,7 +153,7 @@ with tab2:
                     if habit.get('frequency') == 'weekly':
                         st.markdown(f"**Target:** {habit.get('target', 3)} times per week")
                     
-                    entries = habit.get("entries", [])
+                    entries = get_habit_entries(habit.doc_id)
                     streak = calculate_streak(entries)
                     completion_rate = get_completion_rate(entries)
                     
@@ -176,7 +172,7 @@ with tab2:
                             st.rerun()
                     
                     if st.button("🗑️ Delete", key=f"delete_habit_{habit.doc_id}"):
-                        habits_db.remove(habit.doc_id)
+                        remove_habit(habit.doc_id)
                         st.success("Habit deleted!")
                         st.rerun()
     else:
@@ -195,7 +191,7 @@ with tab3:
         
         if selected_habit_name:
             selected_habit = habit_names[selected_habit_name]
-            entries = selected_habit.get("entries", [])
+            entries = get_habit_entries(selected_habit.doc_id)
             
             if entries:
                 # Stats
@@ -228,10 +224,11 @@ with tab3:
                 
                 heatmap_data = []
                 current_date = start_date
+                entries_by_date = {e["date"]: e for e in entries}
                 
                 while current_date <= end_date:
                     date_str = current_date.strftime("%Y-%m-%d")
-                    entry = next((e for e in entries if e["date"] == date_str), None)
+                    entry = entries_by_date.get(date_str)
                     completed = entry.get("completed", False) if entry else False
                     
                     heatmap_data.append({
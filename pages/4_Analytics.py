@@ -5,7 +5,7 @@ Visualize productivity, mood, habits, and overall progress
 import streamlit as st
 from datetime import datetime, date, timedelta
 from utils.auth import check_password
-from utils.db import tasks_db, journal_db, habits_db, health_db, finance_db, gratitude_db, goals_db
+from utils.db import tasks_db, journal_db, habits_db, health_db, finance_db, gratitude_db, goals_db, get_habit_entries
 from utils.ai import get_ai_response
 from tinydb import Query
 import pandas as pd
@@ -58,8 +58,7 @@ with col1:
     st.metric("✅ Tasks Completed", len(completed_tasks))
 
 # Journal entries
-all_journals = journal_db.get_all()
-journals_in_range = [j for j in all_journals if j.get("date", "") >= start_date]
+journals_in_range = journal_db.range("date", start_date)
 
 with col2:
     st.metric("📝 Journal Entries", len(journals_in_range))
@@ -166,10 +165,8 @@ if active_habits:
     habit_performance = []
     
     for habit in active_habits:
-        entries = habit.get("entries", [])
-        entries_in_range = [e for e in entries 
-                           if e.get("date", "") >= start_date 
-                           and e.get("completed")]
+        entries_in_range = [e for e in get_habit_entries(habit.doc_id, start_date) 
+                           if e.get("completed")]
         
         # Calculate days in range
         days_in_range = (date.today() - datetime.strptime(start_date, "%Y-%m-%d").date()).days
@@ -304,8 +301,7 @@ with adv_tab1:
             }
             
             # Add health data if available
-            health_entries = health_db.get_all()
-            health_on_date = next((h for h in health_entries if h.get("date") == journal.get("date")), None)
+            health_on_date = health_db.get_by("date", journal.get("date"))
             
             if health_on_date:
                 entry["sleep_hours"] = health_on_date.get("sleep_hours", 0)
@@ -438,13 +434,13 @@ with adv_tab2:
         
         for habit in active_habits:
             # Calculate current streak
-            entries = sorted(habit.get("entries", []), key=lambda x: x.get("date", ""), reverse=True)
+            entries_by_date = {e["date"]: e for e in get_habit_entries(habit.doc_id, date.today() - timedelta(days=30))}
             current_streak = 0
             check_date = date.today()
             
             for i in range(30):  # Check last 30 days
                 date_str = check_date.isoformat()
-                entry = next((e for e in entries if e.get("date") == date_str), None)
+                entry = entries_by_date.get(date_str)
                 
                 if entry and entry.get("completed"):
                     current_streak += 1
@@ -471,11 +467,9 @@ with adv_tab3:
     if st.button("🔮 Generate Predictions", use_container_width=True):
         with st.spinner("Analyzing trends and generating predictions..."):
             # Gather comprehensive stats
-            health_entries = health_db.get_all()
-            health_in_range = [h for h in health_entries if h.get("date", "") >= start_date]
+            health_in_range = health_db.range("date", start_date)
             
-            finance_entries = finance_db.get_all()
-            finance_in_range = [f for f in finance_entries if f.get("date", "") >= start_date]
+            finance_in_range = finance_db.range("date", start_date)
             
             goals_entries = goals_db.get_all()
             active_goals = [g for g in goals_entries if g.get("progress", 0) < 100]
@@ -588,8 +582,8 @@ with adv_tab4:
     if active_habits:
         total_completion = 0
         for habit in active_habits:
-            entries_in_range = [e for e in habit.get("entries", []) 
-                              if e.get("date", "") >= start_date and e.get("completed")]
+            entries_in_range = [e for e in get_habit_entries(habit.doc_id, start_date) 
+                              if e.get("completed")]
             completion_rate = len(entries_in_range) / days_in_range if days_in_range > 0 else 0
             total_completion += completion_rate
         
@@ -597,12 +591,12 @@ with adv_tab4:
         wellness_components["Habits"] = avg_habit_completion * 20  # out of 20
     
     # Health tracking (15%)
-    health_in_range = [h for h in health_db.get_all() if h.get("date", "") >= start_date]
+    health_in_range = health_db.range("date", start_date)
     health_score = (len(health_in_range) / days_in_range * 15) if days_in_range > 0 else 0
     wellness_components["Health Tracking"] = min(health_score, 15)  # out of 15
     
     # Gratitude practice (10%)
-    gratitude_in_range = [g for g in gratitude_db.get_all() if g.get("date", "") >= start_date]
+    gratitude_in_range = gratitude_db.range("date", start_date)
     gratitude_score = (len(gratitude_in_range) / days_in_range * 10) if days_in_range > 0 else 0
     wellness_components["Gratitude"] = min(gratitude_score, 10)  # out of 10
     
@@ -642,8 +636,8 @@ with adv_tab4:
         st.metric("🏃 Health Logs", len(health_in_range))
     
     with stat_col4:
-        expenses = sum([f.get("amount", 0) for f in finance_db.get_all() 
-                       if f.get("type") == "expense" and f.get("date", "") >= start_date])
+        expenses = sum([f.get("amount", 0) for f in finance_db.range("date", start_date) 
+                       if f.get("type") == "expense"])
         st.metric("💰 Expenses", f"${expenses:,.0f}")
         st.metric("🙏 Gratitude Days", len(gratitude_in_range))
 
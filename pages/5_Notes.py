@@ -6,6 +6,8 @@ import streamlit as st
 from datetime import datetime
 from utils.auth import check_password
 from utils.db import notes_db
+from utils.undo import delete_with_undo, show_undo
+from utils.search import show_search_target
 from utils.ai import categorize_note
 from tinydb import Query
 
@@ -22,6 +24,8 @@ if not check_password():
     st.stop()
 
 st.title("💡 Notes & Ideas")
+show_undo()
+show_search_target("notes")
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["📝 All Notes", "➕ New Note", "🔍 Search"])
@@ -73,8 +77,7 @@ with tab1:
                 
                 with col_delete:
                     if st.button("🗑️ Delete", key=f"del_note_{note.doc_id}"):
-                        notes_db.remove(note.doc_id)
-                        st.success("Note deleted!")
+                        delete_with_undo(notes_db, note.doc_id, f"note **{note.get('title', '')}**")
                         st.rerun()
     else:
         st.info("No notes yet. Create your first note in the 'New Note' tab!")
@@ -136,22 +139,16 @@ with tab3:
     search_query = st.text_input("Search by title or content", placeholder="Enter keywords...")
     
     if search_query:
-        all_notes = notes_db.get_all()
+        # Every note holding the text anywhere in title, content or tags, best matches first
+        results = notes_db.search_text(search_query, limit=None, substring=True)
         
-        # Search in title and content
-        matching_notes = [
-            n for n in all_notes
-            if search_query.lower() in n.get("title", "").lower()
-            or search_query.lower() in n.get("content", "").lower()
-            or search_query.lower() in " ".join(n.get("tags", [])).lower()
-        ]
-        
-        if matching_notes:
-            st.markdown(f"**Found {len(matching_notes)} note(s)**")
+        if results:
+            st.markdown(f"**Found {len(results)} note(s)**")
             st.markdown("---")
             
-            for note in matching_notes:
+            for note, score, snippet in results:
                 with st.expander(f"💡 {note.get('title', 'Untitled')} - 🏷️ {note.get('category', 'Uncategorized')}"):
+                    st.caption(snippet)
                     st.markdown(note.get("content", ""))
                     
                     if note.get("tags"):
@@ -174,7 +171,7 @@ with tab3:
         selected_tag = st.selectbox("Select a tag", sorted(all_tags))
         
         if selected_tag:
-            tagged_notes = [n for n in all_notes if selected_tag in n.get("tags", [])]
+            tagged_notes = notes_db.select().where_contains("tags", selected_tag).all()
             
             st.markdown(f"**{len(tagged_notes)} note(s) with tag '{selected_tag}'**")
             
@@ -5,7 +5,7 @@ Auto-generated progress reports with AI insights
 import streamlit as st
 from datetime import datetime, date, timedelta
 from utils.auth import check_password
-from utils.db import tasks_db, journal_db, habits_db
+from utils.db import tasks_db, journal_db, habits_db, get_habit_entries
 from utils.ai import generate_weekly_report, generate_monthly_report
 import pandas as pd
 
@@ -84,31 +84,22 @@ with tab1:
     end_str = end_date.strftime("%Y-%m-%d")
     
     # Tasks
-    all_tasks = tasks_db.get_all()
     week_tasks_completed = [
-        t for t in all_tasks
+        t for t in tasks_db.range("completed_at", start_str, end_str)
         if t.get("status") == "done"
-        and t.get("completed_at")
-        and start_str <= t.get("completed_at", "9999")[:10] <= end_str
     ]
     
     # Journal
-    all_journals = journal_db.get_all()
-    week_journals = [
-        j for j in all_journals
-        if start_str <= j.get("date", "") <= end_str
-    ]
+    week_journals = journal_db.range("date", start_str, end_str)
     
     # Habits
     all_habits = habits_db.get_all()
     week_habit_completions = 0
     
     for habit in all_habits:
-        entries = habit.get("entries", [])
         week_entries = [
-            e for e in entries
-            if start_str <= e.get("date", "") <= end_str
-            and e.get("completed")
+            e for e in get_habit_entries(habit.doc_id, start_str, end_str)
+            if e.get("completed")
         ]
         week_habit_completions += len(week_entries)
     
@@ -209,26 +200,15 @@ with tab2:
     end_str = end_date.strftime("%Y-%m-%d")
     
     # Tasks
-    all_tasks = tasks_db.get_all()
     month_tasks_completed = [
-        t for t in all_tasks
+        t for t in tasks_db.range("completed_at", start_str, end_str)
         if t.get("status") == "done"
-        and t.get("completed_at")
-        and start_str <= t.get("completed_at", "9999")[:10] <= end_str
     ]
     
-    month_tasks_created = [
-        t for t in all_tasks
-        if t.get("created_at")
-        and start_str <= t.get("created_at", "9999")[:10] <= end_str
-    ]
+    month_tasks_created = tasks_db.range("created_at", start_str, end_str)
     
     # Journal
-    all_journals = journal_db.get_all()
-    month_journals = [
-        j for j in all_journals
-        if start_str <= j.get("date", "") <= end_str
-    ]
+    month_journals = journal_db.range("date", start_str, end_str)
     
     # Habits
     all_habits = habits_db.get_all()
@@ -241,11 +221,9 @@ with tab2:
             habits_created += 1
         
         # Count completions
-        entries = habit.get("entries", [])
         month_entries = [
-            e for e in entries
-            if start_str <= e.get("date", "") <= end_str
-            and e.get("completed")
+            e for e in get_habit_entries(habit.doc_id, start_str, end_str)
+            if e.get("completed")
         ]
         month_habit_completions += len(month_entries)
     
@@ -35,23 +35,17 @@ Q = Query()
 def get_health_entry(date_obj):
     """Get health entry for a specific date."""
     date_str = date_obj.strftime("%Y-%m-%d") if isinstance(date_obj, date) else date_obj
-    result = health_db.search(Q.date == date_str)
-    return result[0] if result else None
+    return health_db.get_by("date", date_str)
 
 
 def save_health_entry(date_obj, data):
     """Save or update health entry."""
     date_str = date_obj.strftime("%Y-%m-%d") if isinstance(date_obj, date) else date_obj
     
-    existing = get_health_entry(date_str)
-    
     data["date"] = date_str
     data["updated_at"] = datetime.now().isoformat()
     
-    if existing:
-        health_db.update(data, existing.doc_id)
-    else:
-        health_db.insert(data)
+    health_db.upsert_by("date", data)
 
 
 with tab1:
@@ -222,7 +216,7 @@ with tab2:
     cutoff_date = (today - timedelta(days=days)).strftime("%Y-%m-%d")
     
     # Get health entries
-    all_entries = health_db.search(Q.date >= cutoff_date)
+    all_entries = health_db.range("date", cutoff_date)
     
     if all_entries:
         # Sort by date
@@ -362,10 +356,12 @@ with tab3:
         exercise_goal = st.number_input("Exercise goal (minutes)", min_value=0, max_value=180, value=30)
         
         if st.button("Save Goals"):
-            from utils.db import set_setting
-            set_setting("health_sleep_goal", sleep_goal)
-            set_setting("health_water_goal", water_goal)
-            set_setting("health_exercise_goal", exercise_goal)
+            from utils.db import settings
+            settings.put_many({
+                "health_sleep_goal": sleep_goal,
+                "health_water_goal": water_goal,
+                "health_exercise_goal": exercise_goal,
+            })
             st.success("Goals saved!")
     
     with col2:
@@ -5,7 +5,9 @@ Track income, expenses, budget, and startup burn rate
 import streamlit as st
 from datetime import datetime, date, timedelta
 from utils.auth import check_password
-from utils.db import finance_db, get_setting, set_setting
+from utils.db import finance_db, settings, get_setting, set_setting
+from utils.undo import delete_with_undo, show_undo
+from utils.search import show_search_target
 from tinydb import Query
 import pandas as pd
 
@@ -22,6 +24,8 @@ if not check_password():
     st.stop()
 
 st.title("💰 Finance Tracker")
+show_undo()
+show_search_target("finance")
 
 # Tabs
 tab1, tab2, tab3, tab4 = st.tabs(["📝 Transactions", "📊 Budget", "🔥 Burn Rate", "📈 Analytics"])
@@ -84,8 +88,7 @@ with tab1:
         today_str = date.today().strftime("%Y-%m-%d")
         month_start = date.today().replace(day=1).strftime("%Y-%m-%d")
         
-        all_transactions = finance_db.get_all()
-        this_month = [t for t in all_transactions if t.get("date", "") >= month_start]
+        this_month = finance_db.range("date", month_start)
         
         income_this_month = sum([t.get("amount", 0) for t in this_month if t.get("type") == "income"])
         expenses_this_month = sum([t.get("amount", 0) for t in this_month if t.get("type") == "expense"])
@@ -107,10 +110,21 @@ with tab1:
         filter_timeframe = st.selectbox("Timeframe", ["This Month", "Last 30 Days", "Last 90 Days", "All Time"])
     
     with col_f3:
-        filter_category = st.selectbox("Category", ["All"] + list(set([t.get("category") for t in all_transactions])))
+        # Streamed so older years are not all held in memory at once
+        categories = {t.get("category") for t in finance_db.stream()}
+        filter_category = st.selectbox("Category", ["All"] + list(categories))
     
     # Apply filters
-    filtered = all_transactions.copy()
+    if filter_timeframe == "This Month":
+        filtered = finance_db.range("date", month_start)
+    elif filter_timeframe == "Last 30 Days":
+        cutoff = (date.today() - timedelta(days=30)).strftime("%Y-%m-%d")
+        filtered = finance_db.range("date", cutoff)
+    elif filter_timeframe == "Last 90 Days":
+        cutoff = (date.today() - timedelta(days=90)).strftime("%Y-%m-%d")
+        filtered = finance_db.range("date", cutoff)
+    else:
+        filtered = finance_db.get_all()
     
     if filter_type != "All":
         filtered = [t for t in filtered if t.get("type") == filter_type.lower()]
@@ -118,15 +132,6 @@ with tab1:
     if filter_category != "All":
         filtered = [t for t in filtered if t.get("category") == filter_category]
     
-    if filter_timeframe == "This Month":
-        filtered = [t for t in filtered if t.get("date", "") >= month_start]
-    elif filter_timeframe == "Last 30 Days":
-        cutoff = (date.today() - timedelta(days=30)).strftime("%Y-%m-%d")
-        filtered = [t for t in filtered if t.get("date", "") >= cutoff]
-    elif filter_timeframe == "Last 90 Days":
-        cutoff = (date.today() - timedelta(days=90)).strftime("%Y-%m-%d")
-        filtered = [t for t in filtered if t.get("date", "") >= cutoff]
-    
     # Display transactions
     if filtered:
         # Sort by date descending
@@ -150,7 +155,7 @@ with tab1:
             
             with col_d:
                 if st.button("🗑️", key=f"del_trans_{trans.doc_id}"):
-                    finance_db.remove(trans.doc_id)
+                    delete_with_undo(finance_db, trans.doc_id, f"transaction **{trans.get('description', '')}**")
                     st.rerun()
     else:
         st.info("No transactions found. Add your first transaction above!")
@@ -183,27 +188,27 @@ with tab2:
         categories = ["Food & Dining", "Transportation", "Shopping", "Bills & Utilities",
                      "Healthcare", "Entertainment", "Business Expense", "Other"]
         
+        saved_budgets = settings.get_prefix("budget_")
         category_budgets = {}
         for cat in categories:
             budget = st.number_input(
                 f"{cat} ($)",
                 min_value=0.0,
-                value=float(get_setting(f"budget_{cat}", 0)),
+                value=float(saved_budgets.get(f"budget_{cat}", 0)),
                 step=50.0,
                 key=f"budget_{cat}"
             )
             category_budgets[cat] = budget
         
         if st.button("Save Category Budgets"):
-            for cat, amount in category_budgets.items():
-                set_setting(f"budget_{cat}", amount)
+            settings.put_many({f"budget_{cat}": amount for cat, amount in category_budgets.items()})
             st.success("Category budgets saved!")
     
     with col2:
         st.markdown("#### This Month's Budget Status")
         
         month_start = date.today().replace(day=1).strftime("%Y-%m-%d")
-        this_month = [t for t in finance_db.get_all() if t.get("date", "") >= month_start and t.get("type") == "expense"]
+        this_month = [t for t in finance_db.range("date", month_start) if t.get("type") == "expense"]
         
         total_spent = sum([t.get("amount", 0) for t in this_month])
         
@@ -250,34 +255,43 @@ with tab3:
     with col1:
         st.markdown("#### Current Metrics")
         
-        runway_months = st.number_input("Runway (months)", min_value=0, value=int(get_setting("runway_months", 12)))
+        metrics = settings.get_many({
+            "runway_months": 12,
+            "cash_on_hand": 50000,
+            "monthly_revenue": 0,
+            "monthly_expenses": 5000,
+        })
+        
+        runway_months = st.number_input("Runway (months)", min_value=0, value=int(metrics["runway_months"]))
         
         cash_on_hand = st.number_input(
             "Cash on hand ($)",
             min_value=0.0,
-            value=float(get_setting("cash_on_hand", 50000)),
+            value=float(metrics["cash_on_hand"]),
             step=1000.0
         )
         
         monthly_revenue = st.number_input(
             "Monthly Revenue ($)",
             min_value=0.0,
-            value=float(get_setting("monthly_revenue", 0)),
+            value=float(metrics["monthly_revenue"]),
             step=100.0
         )
         
         monthly_expenses = st.number_input(
             "Monthly Expenses ($)",
             min_value=0.0,
-            value=float(get_setting("monthly_expenses", 5000)),
+            value=float(metrics["monthly_expenses"]),
             step=100.0
         )
         
         if st.button("Save Metrics"):
-            set_setting("runway_months", runway_months)
-            set_setting("cash_on_hand", cash_on_hand)
-            set_setting("monthly_revenue", monthly_revenue)
-            set_setting("monthly_expenses", monthly_expenses)
+            settings.put_many({
+                "runway_months": runway_months,
+                "cash_on_hand": cash_on_hand,
+                "monthly_revenue": monthly_revenue,
+                "monthly_expenses": monthly_expenses,
+            })
             st.success("Metrics saved!")
     
     with col2:
@@ -343,7 +357,7 @@ with tab4:
     else:
         cutoff = "2000-01-01"
     
-    all_trans = finance_db.search(Q.date >= cutoff)
+    all_trans = finance_db.range("date", cutoff)
     
     if all_trans:
         # Income vs Expenses over time
@@ -6,6 +6,8 @@ import streamlit as st
 from datetime import datetime, date, timedelta
 from utils.auth import check_password
 from utils.db import contacts_db
+from utils.undo import delete_with_undo, show_undo
+from utils.search import show_search_target
 from tinydb import Query
 import pandas as pd
 
@@ -22,12 +24,17 @@ if not check_password():
     st.stop()
 
 st.title("👥 Contacts & Network")
+show_undo()
+show_search_target("contacts")
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["📇 Contacts", "➕ Add Contact", "📊 Network Insights"])
 
 Q = Query()
 
+# Contacts shown while typing in the search box
+SUGGESTIONS = 10
+
 
 with tab1:
     st.markdown("### 📇 Your Network")
@@ -46,20 +53,19 @@ with tab1:
     with col3:
         sort_by = st.selectbox("Sort by", ["Name", "Last Contact", "Priority"])
     
-    # Filter contacts
-    filtered = all_contacts.copy()
-    
-    if search_query:
-        filtered = [
-            c for c in filtered
-            if search_query.lower() in c.get("name", "").lower()
-            or search_query.lower() in c.get("company", "").lower()
-            or search_query.lower() in " ".join(c.get("tags", [])).lower()
-        ]
+    # Filter contacts: every contact holding the text in its name, company or tags
+    filtered = contacts_db.search_substring(search_query) if search_query else all_contacts.copy()
     
     if filter_category != "All":
         filtered = [c for c in filtered if c.get("category") == filter_category]
     
+    # Best name, company or tag completions first, then matches inside words
+    # (e.g. "neil" in "McNeil")
+    if search_query:
+        best = contacts_db.complete(search_query, limit=None, among=filtered)
+        shown = {c.doc_id for c in best}
+        filtered = (best + [c for c in filtered if c.doc_id not in shown])[:SUGGESTIONS]
+    
     # Sort
     if sort_by == "Name":
         filtered = sorted(filtered, key=lambda x: x.get("name", "").lower())
@@ -69,7 +75,10 @@ with tab1:
         priority_order = {"high": 3, "medium": 2, "low": 1}
         filtered = sorted(filtered, key=lambda x: priority_order.get(x.get("priority", "low"), 0), reverse=True)
     
-    st.markdown(f"**{len(filtered)} contact(s)**")
+    if search_query:
+        st.markdown(f"**{len(filtered)} best match(es)**")
+    else:
+        st.markdown(f"**{len(filtered)} contact(s)**")
     st.markdown("---")
     
     # Display contacts
@@ -130,7 +139,7 @@ with tab1:
                     
                     # Delete
                     if st.button("🗑️ Delete", key=f"del_{contact.doc_id}"):
-                        contacts_db.remove(contact.doc_id)
+                        delete_with_undo(contacts_db, contact.doc_id, f"contact **{contact.get('name', '')}**")
                         st.rerun()
     else:
         st.info("No contacts found. Add your first contact in the 'Add Contact' tab!")
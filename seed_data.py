@@ -3,8 +3,9 @@ Seed sample data for testing the dashboard
 Run this script to populate the database with sample data
 """
 from datetime import datetime, date, timedelta
-from utils.db import (tasks_db, journal_db, habits_db, notes_db, settings_db,
-                      health_db, finance_db, contacts_db, gratitude_db, goals_db, events_db)
+from utils.db import (tasks_db, journal_db, habits_db, habit_entries_db, notes_db, settings_db,
+                      health_db, finance_db, contacts_db, gratitude_db, goals_db, events_db,
+                      add_habit_entry, batch)
 import random
 
 
@@ -14,6 +15,7 @@ def clear_all_data():
     tasks_db.clear()
     journal_db.clear()
     habits_db.clear()
+    habit_entries_db.clear()
     notes_db.clear()
     settings_db.clear()
     health_db.clear()
@@ -202,14 +204,17 @@ def seed_habits():
     """Seed sample habits."""
     print("🎯 Seeding habits...")
     
+    def add_entries(habit_id, entries):
+        for entry in entries:
+            add_habit_entry(habit_id, entry["date"], entry["completed"])
+    
     # Create habits
     habit_1 = habits_db.insert({
         "name": "Morning meditation",
         "frequency": "daily",
         "target": 1,
         "active": True,
-        "created_at": (datetime.now() - timedelta(days=30)).isoformat(),
-        "entries": []
+        "created_at": (datetime.now() - timedelta(days=30)).isoformat()
     })
     
     habit_2 = habits_db.insert({
@@ -217,8 +222,7 @@ def seed_habits():
         "frequency": "weekly",
         "target": 3,
         "active": True,
-        "created_at": (datetime.now() - timedelta(days=25)).isoformat(),
-        "entries": []
+        "created_at": (datetime.now() - timedelta(days=25)).isoformat()
     })
     
     habit_3 = habits_db.insert({
@@ -226,8 +230,7 @@ def seed_habits():
         "frequency": "daily",
         "target": 1,
         "active": True,
-        "created_at": (datetime.now() - timedelta(days=20)).isoformat(),
-        "entries": []
+        "created_at": (datetime.now() - timedelta(days=20)).isoformat()
     })
     
     habit_4 = habits_db.insert({
@@ -235,8 +238,7 @@ def seed_habits():
         "frequency": "weekly",
         "target": 5,
         "active": True,
-        "created_at": (datetime.now() - timedelta(days=15)).isoformat(),
-        "entries": []
+        "created_at": (datetime.now() - timedelta(days=15)).isoformat()
     })
     
     # Add entries for meditation (high consistency)
@@ -246,7 +248,7 @@ def seed_habits():
         completed = random.random() > 0.2  # 80% completion rate
         meditation_entries.append({"date": entry_date, "completed": completed})
     
-    habits_db.update({"entries": meditation_entries}, habit_1)
+    add_entries(habit_1, meditation_entries)
     
     # Add entries for exercise (moderate consistency)
     exercise_entries = []
@@ -255,7 +257,7 @@ def seed_habits():
         completed = random.random() > 0.6  # 40% completion rate
         exercise_entries.append({"date": entry_date, "completed": completed})
     
-    habits_db.update({"entries": exercise_entries}, habit_2)
+    add_entries(habit_2, exercise_entries)
     
     # Add entries for reading (good consistency)
     reading_entries = []
@@ -264,7 +266,7 @@ def seed_habits():
         completed = random.random() > 0.35  # 65% completion rate
         reading_entries.append({"date": entry_date, "completed": completed})
     
-    habits_db.update({"entries": reading_entries}, habit_3)
+    add_entries(habit_3, reading_entries)
     
     # Add entries for code review (work week only)
     code_review_entries = []
@@ -275,7 +277,7 @@ def seed_habits():
             completed = random.random() > 0.3  # 70% completion rate on weekdays
             code_review_entries.append({"date": entry_date.strftime("%Y-%m-%d"), "completed": completed})
     
-    habits_db.update({"entries": code_review_entries}, habit_4)
+    add_entries(habit_4, code_review_entries)
     
     print("✅ Seeded 4 habits with entries!")
 
@@ -690,20 +692,23 @@ def main():
     """Main function to seed all data."""
     print("\n🌱 Starting to seed sample data...\n")
     
-    clear_all_data()
-    print()
-    
-    seed_tasks()
-    seed_journal()
-    seed_habits()
-    seed_notes()
-    seed_settings()
-    seed_health()
-    seed_finance()
-    seed_contacts()
-    seed_gratitude()
-    seed_goals()
-    seed_events()
+    # One write per table instead of one per document
+    with batch(tasks_db, journal_db, habits_db, habit_entries_db, notes_db, settings_db,
+               health_db, finance_db, contacts_db, gratitude_db, goals_db, events_db):
+        clear_all_data()
+        print()
+        
+        seed_tasks()
+        seed_journal()
+        seed_habits()
+        seed_notes()
+        seed_settings()
+        seed_health()
+        seed_finance()
+        seed_contacts()
+        seed_gratitude()
+        seed_goals()
+        seed_events()
     
     print("\n🎉 All sample data seeded successfully!")
     print("\nYou can now run the app with: streamlit run app.py\n")
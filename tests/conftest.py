@@ -0,0 +1,22 @@
+"""Fixtures shared by the tests: each test gets an empty data/ directory."""
+import pytest
+
+from utils import db
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Point utils.db at an empty data/ directory, with the tinydb backend."""
+    monkeypatch.setattr(db, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(db, "SQLITE_PATH", tmp_path / "dashboard.sqlite3")
+    monkeypatch.setattr(db, "DB_BACKEND", "tinydb")
+    # The table list is cached by directory mtime, which a new directory can repeat
+    monkeypatch.setattr(db, "_catalog", (None, set()))
+    return tmp_path
+
+
+@pytest.fixture(params=sorted(db.BACKENDS))
+def backend(request, data_dir, monkeypatch):
+    """Run the test once per storage backend, selected as DB_BACKEND would."""
+    monkeypatch.setattr(db, "DB_BACKEND", request.param)
+    return request.param
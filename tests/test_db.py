@@ -0,0 +1,373 @@
+"""Tests for the tables in utils.db."""
+import multiprocessing
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from utils import db
+
+
+def _in_memory(table):
+    """Return whether ``table`` holds its documents in memory."""
+    if table._docs is not None:
+        return True
+    if isinstance(table, db.LogDatabase):
+        return table.stored is not None
+    return table.deferred is not None and table.deferred.data is not None
+
+
+def test_release_drops_the_parsed_table(data_dir):
+    table = db.Database("notes", shared=False)
+    with table.transaction():
+        for i in range(100):
+            table.insert({"title": f"note {i}"})
+    assert table.count() == 100
+    
+    table.release()
+    assert not _in_memory(table)
+    assert table.count() == 100
+    assert table.insert({"title": "one more"}) == 101
+
+
+def test_release_keeps_unsaved_changes(data_dir):
+    table = db.Database("notes", shared=False, write_behind=60)
+    table.insert({"title": "not saved yet"})
+    
+    table.release()
+    assert table.deferred.dirty
+    assert [doc["title"] for doc in table.get_all()] == ["not saved yet"]
+    table.flush()
+    assert db.Database("notes", shared=False).count() == 1
+
+
+def test_release_reloads_the_log_backend(data_dir):
+    table = db.LogDatabase("notes", shared=False)
+    first = table.insert({"title": "first"})
+    last = table.insert({"title": "last"})
+    table.remove(last)
+    
+    table.release()
+    assert not _in_memory(table)
+    assert [doc["title"] for doc in table.get_all()] == ["first"]
+    # The removed document's ID is not handed out again
+    assert table.insert({"title": "new"}) == last + 1
+    assert table.get(first)["title"] == "first"
+
+
+def test_cold_partitions_are_released(backend):
+    journal = db.open_database("journal", partition_by="date", unique=("date",), cold_cache=1)
+    with journal.transaction():
+        for year in (2015, 2016, 2017):
+            for day in range(1, 51):
+                journal.insert({"date": f"{year}-03-{day % 28 + 1:02d}T{day:02d}", "content": "x" * 100})
+    
+    assert len(list(journal.stream())) == 150
+    assert not _in_memory(journal.partitions[2015])
+    assert not _in_memory(journal.partitions[2016])
+    assert journal.range("date", "2016-01-01", "2016-12-31")[0]["date"].startswith("2016")
+
+
+def test_complete_among_ranks_like_the_index(backend):
+    contacts = db.open_database("contacts", substring=("name", "company"), prefix=("name", "company"))
+    for i in range(30):
+        contacts.insert({"name": f"Ana {i}", "company": "Smithy", "category": "Work"})
+    contacts.insert({"name": "Bo Smith", "company": "Acme", "category": "Family"})
+    contacts.insert({"name": "Cy Blacksmith", "company": "Acme", "category": "Family"})
+    
+    everyone = contacts.search_substring("smith")
+    assert [doc.doc_id for doc in contacts.complete("smith", limit=None, among=everyone)][:10] == [
+        doc.doc_id for doc in contacts.complete("smith", limit=10)
+    ]
+    # Filtered first, the family contacts are found however many others rank above them
+    family = [doc for doc in everyone if doc["category"] == "Family"]
+    assert [doc["name"] for doc in contacts.complete("smith", limit=None, among=family)] == ["Bo Smith"]
+
+
+def _unshared_writer(backend, directory, rows):
+    options = {"checkpoint_every": 50} if backend == "log" else {}
+    table = db.BACKENDS[backend]("notes", path=directory / "notes.json", shared=False, **options)
+    for i in range(rows):
+        table.insert({"title": f"note {i}"})
+
+
+@pytest.mark.parametrize("backend", ["tinydb", "log"])
+def test_vacuum_alongside_an_unshared_writer(backend, data_dir, monkeypatch):
+    monkeypatch.setattr(db, "DB_BACKEND", backend)
+    db.BACKENDS[backend]("notes", shared=False).insert({"title": "first"})
+    writer = multiprocessing.Process(target=_unshared_writer, args=(backend, data_dir, 300))
+    writer.start()
+    while writer.is_alive():
+        db.vacuum()
+    writer.join()
+    
+    assert writer.exitcode == 0
+    assert db.BACKENDS[backend]("notes", shared=True).count() == 301
+
+
+def test_restore_puts_the_document_back_in_order(backend):
+    table = db.open_database("notes")
+    ids = [table.insert({"title": f"note {i}"}) for i in range(5)]
+    table.get_all()
+    
+    assert table.delete(ids[1])
+    assert table.restore(ids[1])
+    assert [doc.doc_id for doc in table.get_all()] == ids
+
+
+def test_deletes_share_one_save(data_dir, monkeypatch):
+    table = db.Database("notes", shared=False)
+    with table.transaction():
+        ids = [table.insert({"title": f"note {i}"}) for i in range(20)]
+    saves = []
+    write = db.FileStorage.write
+    monkeypatch.setattr(db.FileStorage, "write", lambda storage, data: saves.append(1) or write(storage, data))
+    
+    for doc_id in ids[:10]:
+        table.delete(doc_id)
+    assert table.count() == 10
+    assert not saves
+    table.flush()
+    assert len(saves) == 1
+    assert db.Database("notes", shared=False).count() == 10
+
+
+def test_sqlite_reads_stay_in_sql(data_dir):
+    tasks = db.SQLiteDatabase("tasks")
+    for i in range(20):
+        tasks.insert({"status": "open" if i % 2 else "done"})
+    
+    assert len(tasks.get_all()) == 20
+    assert tasks._docs is None
+    assert "sql:" in tasks.select().where(status="open").explain()
+    assert tasks.select().where(status="open").count() == 10
+
+
+def test_sqlite_tables_only_see_their_own_changes(data_dir):
+    notes = db.SQLiteDatabase("notes")
+    tasks = db.SQLiteDatabase("tasks")
+    notes.insert({"title": "a"})
+    version = notes.version
+    
+    tasks.insert({"title": "b"})
+    db.SQLiteDatabase("tasks").insert({"title": "c"})
+    assert notes.version == version
+    db.SQLiteDatabase("notes").insert({"title": "d"})
+    assert notes.version != version
+    assert notes.count() == 2
+
+
+def test_sqlite_reads_do_not_wait_for_a_writer(data_dir):
+    notes = db.SQLiteDatabase("notes")
+    notes.insert({"title": "saved"})
+    results = []
+    with notes.transaction():
+        notes.insert({"title": "not committed yet"})
+        reader = threading.Thread(target=lambda: results.append([doc["title"] for doc in notes.get_all()]))
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+        # The writer sees its own insert
+        assert notes.count() == 2
+    assert results == [["saved"]]
+
+
+def test_habit_migration_reads_each_habit_again(data_dir, monkeypatch):
+    habits = db.LazyDatabase("habits", indexed=("active",))
+    entries = db.LazyDatabase("habit_entries", unique=("key",), ordered=("key",))
+    monkeypatch.setattr(db, "habits_db", habits)
+    monkeypatch.setattr(db, "habit_entries_db", entries)
+    monkeypatch.setattr(db, "_habit_entries_migrated", False)
+    habit_id = habits.insert({"name": "Run", "entries": [{"date": "2024-01-01", "completed": True}]})
+    scan = habits.get_all
+    
+    def get_all():
+        docs = scan()
+        # Another session checks the habit off and renames it right after the scan
+        added = docs[0]["entries"] + [{"date": "2024-01-02", "completed": True}]
+        habits.update({"name": "Run daily", "entries": added}, habit_id)
+        return docs
+    
+    monkeypatch.setattr(habits, "get_all", get_all)
+    assert db.migrate_habit_entries() == 2
+    assert dict(habits.get(habit_id)) == {"name": "Run daily"}
+    assert [entry["date"] for entry in entries.get_all()] == ["2024-01-01", "2024-01-02"]
+
+
+def test_partitioned_count_release_and_view(backend):
+    journal = db.open_database("journal", partition_by="date", unique=("date",), cold_cache=5)
+    for year in (2015, 2016, 2017):
+        for day in range(1, 11):
+            journal.insert({"date": f"{year}-01-{day:02d}", "content": "x"})
+    
+    assert journal.count() == 30
+    assert sorted(journal._view().docs) == sorted(doc.doc_id for doc in journal.get_all())
+    journal.release()
+    assert not any(_in_memory(partition) for partition in journal.partitions.values())
+    assert journal.count() == 30
+
+
+def test_partitioned_search_skips_hidden_hits_before_the_limit(backend, monkeypatch):
+    journal = db.open_database("journal", partition_by="date", unique=("date",), text=("content",))
+    best = journal.insert({"date": "2016-01-01", "content": "rice rice rice"})
+    second = journal.insert({"date": "2016-01-02", "content": "rice rice"})
+    journal.insert({"date": "2017-01-01", "content": "rice with a lot of other words around it"})
+    get = journal.get
+    # As if the best hit was deleted after the index was read
+    monkeypatch.setattr(journal, "get", lambda doc_id: None if doc_id == best else get(doc_id))
+    
+    assert [doc.doc_id for doc, _, _ in journal.search_text("rice", limit=1)] == [second]
+
+
+def test_partition_ids_stay_reserved(backend):
+    legacy = db.open_database("journal")
+    legacy.insert({"date": "2016-01-01"})
+    legacy.insert({"date": "2016-01-02"})
+    journal = db.open_database("journal", partition_by="date", unique=("date",))
+    ids = [doc.doc_id for doc in journal.get_all()]
+    assert ids == [2016 * db.PARTITION_ID_SPAN + 1, 2016 * db.PARTITION_ID_SPAN + 2]
+    
+    # Soft-deleted documents keep their IDs, even when nothing else is left
+    for doc_id in ids:
+        assert journal.delete(doc_id)
+    assert journal.insert({"date": "2016-01-03"}) == ids[-1] + 1
+    assert journal.restore(ids[0])
+    assert journal.get(ids[0])["date"] == "2016-01-01"
+
+
+def _random_query(table, rng):
+    query = table.select()
+    for _ in range(rng.randint(0, 3)):
+        kind = rng.choice(["==", "in", "range", "contains", "number"])
+        if kind == "==":
+            query.where(status=rng.choice(["todo", "doing", "done", "missing"]))
+        elif kind == "in":
+            query.where_in("status", rng.sample(["todo", "doing", "done"], rng.randint(0, 2)))
+        elif kind == "range":
+            start = rng.choice([None, "2024-03", "2024-06-15"])
+            query.where_range("date", start, rng.choice([None, "2024-06", "2024-09-30"]))
+        elif kind == "contains":
+            query.where_contains("tags", rng.choice(["a", "b", "c"]))
+        else:
+            query.where_range("priority", rng.choice([None, 1, 2]), rng.choice([None, 2, 3]))
+    if rng.random() < 0.6:
+        # Unique values, so every plan agrees on the order
+        query.order_by(rng.choice(["date", "created"]), desc=rng.random() < 0.5)
+    if rng.random() < 0.5:
+        query.limit(rng.randint(0, 15))
+    return query
+
+
+def test_planner_matches_a_full_scan(backend):
+    rng = random.Random(3)
+    tasks = db.open_database("tasks", ordered=("date", "created"), indexed=("status", "tags"))
+    dates = rng.sample(range(1, 366), 200)
+    for i in range(200):
+        doc = {
+            "status": rng.choice(["todo", "doing", "done"]),
+            "tags": rng.sample(["a", "b", "c"], rng.randint(0, 2)),
+            "priority": rng.randint(1, 3),
+            "created": f"2024-01-01T{i:05d}",
+        }
+        if i % 7:
+            day = date(2024, 1, 1) + timedelta(days=dates[i] - 1)
+            doc["date"] = day.isoformat()
+        tasks.insert(doc)
+    for doc_id in rng.sample(range(1, 201), 20):
+        tasks.delete(doc_id)
+    
+    everything = sorted(tasks.get_all(), key=lambda doc: doc.doc_id)
+    for _ in range(300):
+        query = _random_query(tasks, rng)
+        expected = [doc for doc in everything if all(db._holds(condition, doc) for condition in query.conditions)]
+        total = len(expected) if query.max_rows is None else min(len(expected), query.max_rows)
+        if query.order:
+            expected = db._sorted_docs(expected, *query.order)
+        expected = expected[:query.max_rows]
+        assert [doc.doc_id for doc in query.all()] == [doc.doc_id for doc in expected], query.explain()
+        assert query.count() == total, query.explain()
+
+
+def test_readers_keep_their_snapshot(data_dir):
+    notes = db.Database("notes", shared=False)
+    first = notes.insert({"title": "old"})
+    before = notes.get_all()
+    
+    notes.update({"title": "new"}, first)
+    notes.insert({"title": "another"})
+    assert [doc["title"] for doc in before] == ["old"]
+    assert [doc["title"] for doc in notes.get_all()] == ["new", "another"]
+
+
+def _open_counter(backend, path):
+    options = {} if backend == "sqlite" else {"shared": True}
+    return db.BACKENDS[backend]("counter", unique=("key",), path=path, **options)
+
+
+def _count_up(backend, path, rounds):
+    table = _open_counter(backend, path)
+    for _ in range(rounds):
+        with table.transaction():
+            counter = table.get_by("key", "counter")
+            table.update({"value": counter["value"] + 1}, counter.doc_id)
+
+
+def test_processes_lose_no_updates(backend, data_dir):
+    path = data_dir / ("counter.sqlite3" if backend == "sqlite" else "counter.json")
+    _open_counter(backend, path).insert({"key": "counter", "value": 0})
+    # Spawned, so no process inherits another's open connections or locks
+    spawn = multiprocessing.get_context("spawn")
+    workers = [spawn.Process(target=_count_up, args=(backend, path, 100)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    assert [worker.exitcode for worker in workers] == [0] * 4
+    assert _open_counter(backend, path).get_by("key", "counter")["value"] == 400
+
+
+def _open_rows(backend, path):
+    options = {} if backend == "sqlite" else {"shared": False, "group_commit": 0.002}
+    return db.BACKENDS[backend]("rows", path=path, **options)
+
+
+def _insert_from_threads(backend, path, recorded):
+    table = _open_rows(backend, path)
+    
+    def write(worker):
+        n = 0
+        while True:
+            table.insert({"worker": worker, "n": n})
+            n += 1
+            recorded[worker] = n
+    
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(len(recorded))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_group_commit_keeps_every_returned_write(backend, data_dir):
+    spawn = multiprocessing.get_context("spawn")
+    rng = random.Random(5)
+    for attempt in range(3):
+        path = data_dir / (f"rows{attempt}.sqlite3" if backend == "sqlite" else f"rows{attempt}.json")
+        recorded = spawn.Array("q", 4)
+        writer = spawn.Process(target=_insert_from_threads, args=(backend, path, recorded))
+        writer.start()
+        while sum(recorded) < 50 and writer.is_alive():
+            time.sleep(0.001)
+        time.sleep(rng.uniform(0, 0.05))
+        writer.kill()
+        writer.join()
+        
+        saved = {worker: set() for worker in range(4)}
+        for doc in _open_rows(backend, path).get_all():
+            saved[doc["worker"]].add(doc["n"])
+        # Every insert that returned was saved, whichever thread's save it rode on
+        for worker, count in enumerate(recorded):
+            assert set(range(count)) <= saved[worker]
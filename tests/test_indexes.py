@@ -0,0 +1,95 @@
+"""Check that indexes kept up to date by writes match ones built from scratch."""
+import random
+
+import pytest
+
+from utils import db
+from utils.indexes import HashIndex, PrefixIndex, SortedIndex, TextIndex, TrigramIndex
+
+WORDS = ["rice", "price", "ana", "smith", "blacksmith", "tech", "run", "running", "notes", "x"]
+
+
+def _random_doc(rng):
+    doc = {
+        "title": " ".join(rng.choices(WORDS, k=rng.randint(1, 4))),
+        "status": rng.choice(["todo", "doing", "done"]),
+        "tags": rng.sample(["a", "b", "c"], rng.randint(0, 2)),
+    }
+    if rng.random() < 0.8:
+        doc["date"] = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    return doc
+
+
+def _edit_randomly(table, rng, rounds=300):
+    """Insert, update, replace, remove, soft-delete and restore at random."""
+    live, deleted = [], []
+    for _ in range(rounds):
+        action = rng.random()
+        if action < 0.35 or not live:
+            live.append(table.insert(_random_doc(rng)))
+        elif action < 0.55:
+            table.update({"title": rng.choice(WORDS), "tags": rng.sample(["a", "b", "c"], 1)}, rng.choice(live))
+        elif action < 0.65:
+            table.replace(_random_doc(rng), rng.choice(live))
+        elif action < 0.75:
+            doc_id = live.pop(rng.randrange(len(live)))
+            table.remove(doc_id)
+        elif action < 0.9:
+            doc_id = live.pop(rng.randrange(len(live)))
+            table.delete(doc_id)
+            deleted.append(doc_id)
+        elif deleted:
+            doc_id = deleted.pop(rng.randrange(len(deleted)))
+            table.restore(doc_id)
+            live.append(doc_id)
+
+
+@pytest.mark.parametrize("backend", ["tinydb", "log"])
+def test_indexes_after_edits_equal_a_rebuild(backend, data_dir, monkeypatch):
+    monkeypatch.setattr(db, "DB_BACKEND", backend)
+    table = db.open_database(
+        "notes", indexed=("status", "tags"), ordered=("date",), text=("title",), substring=("title",),
+        prefix=("title",),
+    )
+    rng = random.Random(7)
+    for _ in range(50):
+        table.insert(_random_doc(rng))
+    # Build every index, so the edits below update them in place
+    table.search_text("rice")
+    table.search_substring("ric")
+    table.complete("ri")
+    
+    _edit_randomly(table, rng)
+    docs = {doc.doc_id: doc for doc in table.get_all()}
+    assert not any(index.stale for index in table.lazy_indexes)
+    
+    for field, index in table.hash_indexes.items():
+        rebuilt = HashIndex(field)
+        rebuilt.rebuild(docs)
+        assert {key: sorted(ids) for key, ids in index.entries.items()} == {
+            key: sorted(ids) for key, ids in rebuilt.entries.items()
+        }
+    for field, index in table.sorted_indexes.items():
+        rebuilt = SortedIndex(field)
+        rebuilt.rebuild(docs)
+        assert index.keys == rebuilt.keys
+    
+    text = TextIndex(("title",))
+    text.sync(docs)
+    assert table.text_index.postings == text.postings
+    assert {doc_id: (fingerprint, length, set(terms)) for doc_id, (fingerprint, length, terms)
+            in table.text_index.docs.items()} == {
+        doc_id: (fingerprint, length, set(terms)) for doc_id, (fingerprint, length, terms) in text.docs.items()
+    }
+    
+    trigrams = TrigramIndex(("title",))
+    trigrams.sync(docs)
+    assert table.trigram_index.grams == trigrams.grams
+    
+    prefixes = PrefixIndex(("title",))
+    prefixes.sync(docs)
+    for word in WORDS:
+        for end in range(1, len(word) + 1):
+            assert table.prefix_index.complete(word[:end], PrefixIndex.KEEP) == prefixes.complete(
+                word[:end], PrefixIndex.KEEP
+            )
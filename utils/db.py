@@ -1,91 +1,2925 @@
 """Database utilities using TinyDB for local JSON storage."""
+import atexit
 import os
-from datetime import datetime, date
-from tinydb import TinyDB, Query
+import sqlite3
+import re
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+from datetime import datetime, date, timedelta
+from dotenv import load_dotenv
+from tinydb import TinyDB
+from tinydb.middlewares import Middleware
+from tinydb.storages import Storage
+from tinydb.table import Document
+from utils import formats
+from utils.filelock import FileLock
+from utils.indexes import HashIndex, PrefixIndex, SortedIndex, TextIndex, TrigramIndex, VectorIndex
 from pathlib import Path
+import copy
+import heapq
+import itertools
 import json
 
+load_dotenv()
 
-# Ensure data directory exists
+
+# Created on first use by open_database()
 DATA_DIR = Path(__file__).parent.parent / "data"
-DATA_DIR.mkdir(exist_ok=True)
+
+# Storage backend: "tinydb" (JSON files, default), "log" or "sqlite"
+DB_BACKEND = os.getenv("DB_BACKEND", "tinydb").lower()
+SQLITE_PATH = DATA_DIR / "dashboard.sqlite3"
+
+# Number of log records after which the log backend writes a snapshot
+LOG_CHECKPOINT_EVERY = int(os.getenv("DB_LOG_CHECKPOINT", "500"))
+
+# Set when several processes (e.g. Streamlit replicas) share data/
+MULTIPROCESS = os.getenv("DB_MULTIPROCESS", "false").lower() == "true"
+
+# Table file encoding ("json", "compact" or "msgpack"), optionally zstd-framed.
+# Convert existing files with `python -m utils.db migrate --format=...`
+DB_FORMAT = os.getenv("DB_FORMAT", "json").lower()
+DB_COMPRESS = os.getenv("DB_COMPRESS", "none").lower() == "zstd"
+
+# With the tinydb backend, save changes in the background at most this many
+# milliseconds after they are made (0: save before returning). Ignored
+# with DB_MULTIPROCESS, where other processes must see every write.
+WRITE_BEHIND_MS = int(os.getenv("DB_WRITE_BEHIND_MS", "0"))
+
+# How far a saved write survives a power cut: "full" fsyncs each file and
+# its directory, "data" only the file, "off" leaves flushing to the OS.
+# Table files are replaced by rename either way, so a crash of the app
+# itself never leaves one half-written.
+FSYNC_POLICIES = ("full", "data", "off")
+DB_FSYNC = os.getenv("DB_FSYNC", "full").lower()
+
+# Writers wait this many extra milliseconds for others to join their save
+# (group commit). Writers arriving while a save is running always join the next one.
+GROUP_COMMIT_MS = int(os.getenv("DB_GROUP_COMMIT_MS", "0"))
+
+# Soft-deleted documents carry this field (when they were deleted) and can
+# be restored for DB_UNDO_SECONDS, after which the purge thread removes them
+TOMBSTONE = "_deleted_at"
+UNDO_SECONDS = int(os.getenv("DB_UNDO_SECONDS", "30"))
+
+# Without DB_MULTIPROCESS, tombstones are saved in the background this many
+# seconds after a delete, so a burst of deletes costs one save
+TOMBSTONE_SAVE_SECONDS = 1.0
+
+# SQLite's own setting for each DB_FSYNC policy; in WAL mode NORMAL syncs
+# at checkpoints only, so the last commits can be lost to a power cut
+SQLITE_SYNCHRONOUS = {"full": "FULL", "data": "NORMAL", "off": "OFF"}
+
+# Fields copied into indexed columns by the SQLite backend
+INDEXED_FIELDS = ("date", "status", "key", "deadline", "type")
+
+# SQLite condition for rows that are not soft-deleted
+LIVE_SQL = f"json_extract(doc, '$.{TOMBSTONE}') IS NULL"
+
+
+class FileStorage(Storage):
+    """TinyDB storage that keeps a table file in one of utils.formats."""
+    
+    def __init__(self, path, format=DB_FORMAT, compress=DB_COMPRESS, fsync=DB_FSYNC):
+        formats.check(format, compress)
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}', expected one of {list(FSYNC_POLICIES)}")
+        self.path = path
+        self.format = format
+        self.compress = compress
+        self.fsync = fsync
+    
+    def read(self):
+        try:
+            with open(self.path, "rb") as f:
+                return formats.decode(f.read())
+        except FileNotFoundError:
+            return None
+    
+    def write(self, data):
+        """Write a temporary file next to the file and rename it over it.
+        
+        Whenever the process dies, the file holds either the old tables or
+        the new ones. Each write gets its own temporary file, so writers in
+        other handles or processes (e.g. vacuum) never rename each other's.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".",
+                                        prefix=f"{os.path.basename(self.path)}.", suffix=".tmp")
+        try:
+            with open(fd, "wb") as f:
+                f.write(formats.encode(data, self.format, self.compress))
+                if self.fsync != "off":
+                    f.flush()
+                    os.fsync(f.fileno())
+            try:
+                # mkstemp makes the file private; keep the table's permissions
+                os.chmod(tmp_path, os.stat(self.path).st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        if self.fsync == "full":
+            _fsync_directory(os.path.dirname(self.path))
+
+
+def _fsync_directory(path):
+    """Make renames and new files in ``path`` durable (a no-op on Windows)."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path or ".", os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BufferedStorage(Middleware):
+    """TinyDB middleware that can hold writes in memory until committed."""
+    
+    def __init__(self, storage_cls):
+        super().__init__(storage_cls)
+        self.buffering = False
+        self.pending = None
+        self.dirty = False
+    
+    def begin(self):
+        self.buffering = True
+        self.pending = self.storage.read()
+        if isinstance(self.storage, DeferredStorage):
+            # That is the live data, and TinyDB edits it in place
+            self.pending = _copy_tables(self.pending)
+        self.dirty = False
+    
+    def read(self):
+        if self.buffering:
+            return self.pending
+        return self.storage.read()
+    
+    def write(self, data):
+        if self.buffering:
+            self.pending = data
+            self.dirty = True
+        else:
+            self.storage.write(data)
+    
+    def commit(self):
+        data, dirty = self.pending, self.dirty
+        self.rollback()
+        if dirty:
+            self.storage.write(data)
+    
+    def rollback(self):
+        self.buffering = False
+        self.pending = None
+        self.dirty = False
+
+
+class DeferredStorage(Middleware):
+    """TinyDB middleware that keeps the table in memory and saves it later.
+    
+    The file is read once. A write replaces the in-memory data and calls
+    ``on_write``; ``flush`` saves whatever is latest, so any number of
+    writes between two flushes cost one file write.
+    """
+    
+    def __init__(self, storage_cls, on_write):
+        super().__init__(storage_cls)
+        self.on_write = on_write
+        self.data = None
+        self.loaded = False
+        self.dirty = False
+    
+    def read(self):
+        if not self.loaded:
+            self.data = self.storage.read()
+            self.loaded = True
+        return self.data
+    
+    def write(self, data):
+        self.data = data
+        self.loaded = True
+        self.dirty = True
+        self.on_write()
+    
+    def flush(self):
+        if self.dirty:
+            self.storage.write(self.data)
+            self.dirty = False
+    
+    def forget(self):
+        """Drop the data unless it has unsaved changes; the next read loads the file."""
+        if not self.dirty:
+            self.data = None
+            self.loaded = False
+
+
+def _copy_tables(data):
+    """Copy a TinyDB tables dict down to the documents."""
+    if data is None:
+        return None
+    return {name: {doc_id: dict(doc) for doc_id, doc in table.items()} for name, table in data.items()}
+
+
+class WriteBehind:
+    """Background thread that saves tables opened with write-behind.
+    
+    A table is flushed ``delay`` seconds after its first unsaved change,
+    so every change made in that window goes out in one write and none
+    waits longer than the delay. Anything still unsaved is flushed at exit.
+    Subclasses call another table method than ``flush``.
+    """
+    
+    action = "flush"
+    
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.due = {}  # table -> monotonic time by which it must be flushed
+        self.tables = set()
+        self.thread = None
+        atexit.register(self.flush_all)
+    
+    def schedule(self, table, delay):
+        """Note an unsaved change to ``table``."""
+        with self.condition:
+            self.tables.add(table)
+            if table not in self.due:
+                self.due[table] = time.monotonic() + delay
+                self.condition.notify()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name=f"db-{self.action}", daemon=True)
+                self.thread.start()
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.due:
+                    self.condition.wait()
+                    continue
+                table, due = min(self.due.items(), key=lambda item: item[1])
+                if due > time.monotonic():
+                    self.condition.wait(due - time.monotonic())
+                    continue
+                del self.due[table]
+            try:
+                getattr(table, self.action)()
+            except Exception as exc:
+                print(f"⚠️  Could not {self.action} {table.name}, retrying: {exc}", file=sys.stderr)
+                self.schedule(table, 1.0)
+    
+    def flush_all(self):
+        """Save every table now."""
+        with self.condition:
+            tables = list(self.tables)
+            self.due.clear()
+        for table in tables:
+            getattr(table, self.action)()
+
+
+class Purger(WriteBehind):
+    """Background thread that removes soft-deleted documents for good.
+    
+    A table is scheduled when a document in it is deleted, and purges
+    every expired tombstone in one write (see ``Database.purge``).
+    """
+    
+    action = "purge"
+
+
+_write_behind = WriteBehind()
+_purger = Purger()
+
+
+class GroupCommit:
+    """Let writers that commit close together share one save.
+    
+    A writer takes a ticket with ``note()`` while it still holds the table
+    lock, then calls ``wait(ticket)`` once it has let go. The first writer
+    to wait runs ``flush``; writers that commit meanwhile wait for it and
+    then for the next flush, which covers all of them. So under load each
+    save serves a group of writers instead of one, and a lone writer pays
+    no more than before. ``window`` (seconds) holds the flush back a
+    little longer to let more writers join.
+    """
+    
+    def __init__(self, flush, window=0):
+        self.flush = flush
+        self.window = window
+        self.condition = threading.Condition()
+        self.issued = 0  # last ticket handed out
+        self.durable = 0  # every ticket up to this one is saved
+        self.flushing = False
+    
+    def note(self):
+        """Return a ticket for a write that has just been applied."""
+        with self.condition:
+            self.issued += 1
+            return self.issued
+    
+    def wait(self, ticket):
+        """Return once the write behind ``ticket`` is saved, saving it if no one else is."""
+        with self.condition:
+            while self.flushing and self.durable < ticket:
+                self.condition.wait()
+            if self.durable >= ticket:
+                return
+            self.flushing = True
+        saved = self.durable
+        try:
+            if self.window:
+                time.sleep(self.window)
+            with self.condition:
+                covered = self.issued
+            self.flush()
+            saved = covered
+        finally:
+            with self.condition:
+                self.durable = max(self.durable, saved)
+                self.flushing = False
+                self.condition.notify_all()
+
+
+class Snapshot:
+    """Read-only view of a table's documents and indexes at one version."""
+    
+    def __init__(self, version, docs, hash_indexes, sorted_indexes):
+        self.version = version
+        self.docs = docs
+        self.hash_indexes = hash_indexes
+        self.sorted_indexes = sorted_indexes
+
+
+class Select:
+    """A query on one table, built by chaining and planned by the table.
+    
+        tasks_db.select().where(status="todo").where_contains("tags", "Tech")
+                .order_by("deadline").limit(10).all()
+    
+    The table answers the condition that leaves the fewest candidates
+    from an index when one covers it, or scans, and checks the remaining
+    conditions on the candidates. ``explain()`` shows the plan.
+    """
+    
+    def __init__(self, table):
+        self.table = table
+        self.conditions = []
+        self.order = None  # (field, descending)
+        self.max_rows = None
+    
+    def where(self, **fields):
+        """Keep documents whose fields equal the given values."""
+        self.conditions.extend(("==", field, value) for field, value in fields.items())
+        return self
+    
+    def where_in(self, field, values):
+        """Keep documents whose ``field`` is one of ``values``."""
+        self.conditions.append(("in", field, list(values)))
+        return self
+    
+    def where_range(self, field, start=None, end=None):
+        """Keep documents whose ``field`` lies between ``start`` and ``end``.
+        
+        Strings and dates compare as in ``Database.range``, numbers as numbers.
+        """
+        self.conditions.append(("range", field, (_iso(start), _iso(end))))
+        return self
+    
+    def where_contains(self, field, value):
+        """Keep documents whose list ``field`` (e.g. tags) contains ``value``."""
+        self.conditions.append(("contains", field, value))
+        return self
+    
+    def order_by(self, field, desc=False):
+        """Sort by ``field``; documents without it come last."""
+        self.order = (field, desc)
+        return self
+    
+    def limit(self, n):
+        self.max_rows = n
+        return self
+    
+    def all(self):
+        """Return the matching documents."""
+        return self.table._run(self)
+    
+    def first(self):
+        """Return the first matching document, or None."""
+        query = copy.copy(self)
+        query.max_rows = 1 if self.max_rows is None else min(self.max_rows, 1)
+        rows = self.table._run(query)
+        return rows[0] if rows else None
+    
+    def count(self):
+        """Count the matches without building a list of them."""
+        return self.table._count(self)
+    
+    def explain(self):
+        """Describe how the table will run this query."""
+        return self.table._explain(self)
+    
+    def __iter__(self):
+        return iter(self.all())
 
 
 class Database:
-    """Simple database wrapper for TinyDB."""
+    """Simple database wrapper for TinyDB.
     
-    def __init__(self, name):
-        self.db = TinyDB(DATA_DIR / f"{name}.json", indent=2)
+    Reads are served from an in-memory snapshot of the table that is kept
+    in step with our own writes and reloaded when anyone else changes the
+    file. Fields listed in ``unique`` get a hash index that makes
+    ``get_by``/``upsert_by`` O(1) and rejects duplicate values; fields
+    listed in ``ordered`` get a sorted index that serves ``range``, and
+    fields listed in ``indexed`` get a plain hash index. All of them serve
+    ``select()`` queries.
     
-    def insert(self, data):
+    Streamlit runs each session on its own thread. Writers take ``lock``
+    and so run one at a time; readers take no lock at all. The first read
+    after a write publishes an immutable Snapshot, and readers work on
+    whichever one is current, so a long report never holds up a write and
+    never sees one half-applied. A snapshot shares the documents and
+    indexes it was made from; the next write copies them before changing
+    anything, so writes with no read in between copy nothing.
+    
+    With ``shared`` (DB_MULTIPROCESS) writes also hold an flock on
+    ``<name>.lock`` and bump the generation counter kept in it. Other
+    processes compare that counter instead of stat()ing the table, and
+    reload only when it moved.
+    
+    With ``write_behind`` (seconds, DB_WRITE_BEHIND_MS by default) a write
+    returns once it is applied in memory, and the WriteBehind thread saves
+    the file within that delay. Reads in this process see the change
+    straight away; other processes see it once saved. It cannot be
+    combined with ``shared``.
+    
+    ``delete`` only marks a document with a TOMBSTONE. It vanishes from
+    reads and indexes at once, ``restore`` brings it back, and after
+    UNDO_SECONDS the Purger removes it together with every other expired
+    one, in one write. ``remove`` still deletes for good straight away.
+    
+    Otherwise, unless ``shared``, writes use group commit: a write is
+    applied in memory, then waits (without the lock) for a save that
+    includes it, and writers that commit while a save is running share
+    the next one. ``group_commit`` (seconds, DB_GROUP_COMMIT_MS by
+    default) delays each save to let more writers join. Shared tables
+    save every write before releasing the file lock; the others take it
+    only around each save, which is enough to keep vacuum out.
+    """
+    
+    # Bumped on every write through this object and whenever the
+    # snapshot is dropped because someone else changed the table
+    _version = 0
+    _docs = None
+    _published = None
+    _shared = False  # _docs and the indexes also back _published
+    _writes = None  # threading.local with the version of each thread's last write
+    _seen_signature = None
+    _subscribers = ()
+    deferred = None  # DeferredStorage when writing behind or group committing
+    group_commit = None  # GroupCommit that makes our writes durable
+    # Set when a change by another handle or process was noticed but
+    # subscribers have not been told yet
+    _changed_elsewhere = False
+    
+    def __init__(self, name, unique=(), ordered=(), indexed=(), text=(), substring=(), prefix=(), vectors=(),
+                 path=None, shared=MULTIPROCESS, write_behind=None, group_commit=GROUP_COMMIT_MS / 1000):
+        if write_behind is None:
+            write_behind = 0 if shared else WRITE_BEHIND_MS / 1000
+        elif write_behind and shared:
+            raise ValueError(f"{name}: write-behind cannot be used on a table shared between processes")
+        self.name = name
+        self.path = Path(path) if path else _table_path(name)
+        self.file_lock = FileLock(self.path.parent / f"{name}.lock") if shared else None
+        # Unshared writes only take the lock file around saves, to keep out vacuum
+        self.save_lock = None if shared else FileLock(self.path.parent / f"{name}.lock")
+        storage = FileStorage
+        if write_behind:
+            self.deferred = storage = DeferredStorage(
+                FileStorage, lambda: _write_behind.schedule(self, write_behind)
+            )
+        elif not shared:
+            # Writers save through the group commit once they let go of the lock
+            self.deferred = storage = DeferredStorage(FileStorage, lambda: None)
+            self.group_commit = GroupCommit(self.flush, group_commit)
+        self.db = TinyDB(self.path, storage=BufferedStorage(storage))
+        self.lock = threading.RLock()
+        self.in_transaction = False
+        self._create_indexes(unique, ordered, indexed, text, substring, prefix, vectors, self.path.parent)
+        self._seen_signature = self._signature()
+    
+    @contextmanager
+    def transaction(self, durable=True):
+        """Buffer mutations and commit them with a single write.
+        
+        If the block raises, nothing is written. Nested transactions join
+        the outermost one. Unless ``durable``, the commit does not wait for
+        group commit to save it; the next save of the table takes it along.
+        """
+        with self.lock, self._file_locked():
+            if self.in_transaction:
+                yield self
+                return
+            self.in_transaction = True
+            self._begin()
+            try:
+                yield self
+            except BaseException:
+                self._rollback()
+                self._version += 1
+                raise
+            else:
+                self._commit()
+                self._mark_written()
+                self._note_write()
+                ticket = self._ticket() if durable else None
+            finally:
+                self.in_transaction = False
+        self._wait_durable(ticket)
+        self._notify()
+    
+    batch = transaction
+    
+    @property
+    def version(self):
+        """Number that grows whenever the table changes.
+        
+        Every insert, update, remove and clear moves it, and so does a
+        write by another handle or process, which reading it checks for.
+        Cache anything derived from the table under this number.
+        """
+        if self._signature() != self._seen_signature and self.lock.acquire(blocking=False):
+            try:
+                self._refresh()
+            finally:
+                self.lock.release()
+        if self._changed_elsewhere:
+            self._notify()
+        return self._version
+    
+    def on_change(self, callback):
+        """Call ``callback(table)`` after every committed change.
+        
+        Callbacks run on the thread that wrote, or that noticed a write from
+        elsewhere, once the table's locks are released. Returns a function
+        that unsubscribes.
+        """
+        self._subscribers = self._subscribers + (callback,)
+        
+        def unsubscribe():
+            self._subscribers = tuple(cb for cb in self._subscribers if cb is not callback)
+        return unsubscribe
+    
+    def _notify(self):
+        self._changed_elsewhere = False
+        for callback in self._subscribers:
+            callback(self)
+    
+    def _create_indexes(self, unique, ordered, indexed=(), text=(), substring=(), prefix=(), vectors=(),
+                        directory=None):
+        self.hash_indexes = {field: HashIndex(field) for field in indexed}
+        self.hash_indexes.update({field: HashIndex(field, unique=True) for field in unique})
+        self.sorted_indexes = {field: SortedIndex(field) for field in ordered}
+        self.indexes = list(self.hash_indexes.values()) + list(self.sorted_indexes.values())
+        self.text_index = None
+        if text:
+            # Saved beside the table; nobody reads it but us, so no indentation
+            storage = FileStorage(Path(directory) / f"{self.name}.search",
+                                  "compact" if DB_FORMAT == "json" else DB_FORMAT)
+            self.text_index = TextIndex(text, storage)
+            atexit.register(self.text_index.save)
+        self.trigram_index = TrigramIndex(substring) if substring else None
+        self.prefix_index = PrefixIndex(prefix) if prefix else None
+        self.vector_index = VectorIndex(vectors) if vectors else None
+        # Search indexes are built on first use and outlive release(); they only
+        # go stale when the table changes behind their back
+        self.lazy_indexes = [
+            index for index in (self.text_index, self.trigram_index, self.prefix_index, self.vector_index)
+            if index is not None
+        ]
+    
+    def _outdate_lazy_indexes(self):
+        """Make the search indexes catch up with the table on their next use."""
+        for index in self.lazy_indexes:
+            index.stale = True
+    
+    def _begin(self):
+        self.db.storage.begin()
+    
+    def _commit(self):
+        self.db.storage.commit()
+    
+    def _rollback(self):
+        self.db.storage.rollback()
+        self._invalidate()
+    
+    def _invalidate(self):
+        """Forget cached state after a write we did not apply ourselves."""
+        self._docs = None
+        self._version += 1
+        self._outdate_lazy_indexes()
+        if self.deferred is not None:
+            self.deferred.forget()
+        self.db.clear_cache()
+        self.db.table(self.db.default_table_name)._next_id = None
+    
+    @contextmanager
+    def _writing(self):
+        """Hold the write lock around a mutation we mirror into the snapshot."""
+        with self.lock, self._file_locked():
+            self._refresh()
+            committed = not self.in_transaction
+            try:
+                yield
+            finally:
+                self._version += 1
+                if committed:
+                    self._mark_written()
+                    self._note_write()
+                    ticket = self._ticket()
+        if committed:
+            self._wait_durable(ticket)
+            self._notify()
+    
+    @contextmanager
+    def _saving(self, rewritten=False):
+        """Hold ``save_lock`` around saving an unshared table, and bump its counter.
+        
+        A vacuum in another process opens the table shared, so it waits
+        for the save and then sees from the counter that the file moved.
+        """
+        if self.save_lock is None:
+            yield
+            return
+        with self.save_lock:
+            yield
+            self.save_lock.bump(rewritten)
+    
+    @contextmanager
+    def _file_locked(self, shared=False):
+        """Hold the cross-process lock too, when the table has one."""
+        if self.file_lock is None:
+            yield
+            return
+        self.file_lock.acquire(shared)
+        try:
+            yield
+        finally:
+            self.file_lock.release()
+    
+    def _mark_written(self):
+        """Tell other processes we wrote, and note our own write as seen."""
+        if self.file_lock is not None:
+            self.file_lock.bump()
+        self._seen_signature = self._signature()
+    
+    def _ticket(self):
+        """Number a committed write for ``_wait_durable``; call holding ``lock``."""
+        return self.group_commit.note() if self.group_commit is not None else None
+    
+    def _wait_durable(self, ticket):
+        """Return once the write numbered by ``_ticket`` is saved."""
+        if ticket is not None:
+            self.group_commit.wait(ticket)
+    
+    def _signature(self):
+        """Cheap token that changes when the table is written elsewhere."""
+        if self.file_lock is not None:
+            return self.file_lock.token()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    def _refresh(self):
+        """Notice writes made by other handles or processes."""
+        signature = self._signature()
+        if signature != self._seen_signature:
+            self._seen_signature = signature
+            self._invalidate()
+            self._changed_elsewhere = True
+    
+    def _read_all(self):
+        return self.db.all()
+    
+    def _snapshot(self):
+        """Return the working {doc_id: document} map, loading it if stale.
+        
+        Only writers (holding ``lock``) may use this; readers go through
+        ``_view``.
+        """
+        with self._file_locked(shared=True):
+            self._refresh()
+            docs = self._docs
+            if docs is None:
+                self._own()
+                docs = {}
+                for doc in self._read_all():
+                    if TOMBSTONE in doc:
+                        # Left over from before; purge() reschedules any too young to go
+                        _purger.schedule(self, 0)
+                    else:
+                        docs[doc.doc_id] = doc
+                for index in self.indexes:
+                    index.rebuild(docs)
+                self._docs = docs
+        return docs
+    
+    def flush(self):
+        """Save changes held back by write-behind or group commit now."""
+        if self.deferred is None:
+            return
+        with self.lock:
+            if self.deferred.dirty:
+                with self._saving():
+                    self.deferred.flush()
+                # The file now holds exactly our data, whatever a vacuum wrote before
+                self._seen_signature = self._signature()
+    
+    def release(self):
+        """Drop the in-memory copy of the table; the next read loads it again.
+        
+        Only a hint to save memory, so it does nothing while the table is
+        busy with a write. Changes that are not saved yet stay in memory
+        until they are.
+        """
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            if not self.in_transaction:
+                self._docs = None
+                self._published = None
+                self._forget_stored()
+        finally:
+            self.lock.release()
+    
+    def _forget_stored(self):
+        """Drop the parsed file kept for write-behind or group commit, unless it has unsaved changes."""
+        if self.deferred is not None:
+            if self.deferred.dirty:
+                return
+            self.deferred.forget()
+        self.db.clear_cache()
+        self.db.table(self.db.default_table_name)._next_id = None
+    
+    def _publish(self):
+        """Hand readers the committed state, shared until the next write (see ``_own``)."""
+        if self._docs is not None:
+            self._published = Snapshot(self._version, self._docs, self.hash_indexes, self.sorted_indexes)
+            self._shared = True
+    
+    def _own(self):
+        """Copy the documents and indexes away from the published snapshot before changing them."""
+        if not self._shared:
+            return
+        self._shared = False
+        if self._docs is not None:
+            self._docs = dict(self._docs)
+            self.hash_indexes = {field: index.copy() for field, index in self.hash_indexes.items()}
+            self.sorted_indexes = {field: index.copy() for field, index in self.sorted_indexes.items()}
+        else:
+            # About to be rebuilt, so start from empty ones
+            self.hash_indexes = {
+                field: HashIndex(field, index.unique) for field, index in self.hash_indexes.items()
+            }
+            self.sorted_indexes = {field: SortedIndex(field) for field in self.sorted_indexes}
+        self.indexes = list(self.hash_indexes.values()) + list(self.sorted_indexes.values())
+    
+    def _note_write(self):
+        """Remember the version this thread's write made, so its next read sees it."""
+        if self._writes is None:
+            self._writes = threading.local()
+        self._writes.version = self._version
+    
+    def _view(self):
+        """Return the current Snapshot for a reader.
+        
+        The fast path is a signature check and no lock. If the snapshot is
+        out of date we take the lock to publish a new one, unless another
+        thread is busy writing, in which case the last published one is
+        served. A thread waits for the lock instead if that one would miss
+        its own last write. A thread inside its own transaction sees its
+        uncommitted writes.
+        """
+        view = self._published
+        if (view is not None and view.version == self._version
+                and self._signature() == self._seen_signature):
+            return view
+        own_write = getattr(self._writes, "version", 0)
+        if not self.lock.acquire(blocking=view is None or view.version < own_write):
+            return view
+        try:
+            docs = self._snapshot()
+            if self.in_transaction:
+                return Snapshot(self._version, docs, self.hash_indexes, self.sorted_indexes)
+            if self._published is None or self._published.version != self._version:
+                self._publish()
+            view = self._published
+        finally:
+            self.lock.release()
+        if self._changed_elsewhere:
+            self._notify()
+        return view
+    
+    def _apply(self, doc_id, doc):
+        """Mirror a written document (None when removed) into the snapshot.
+        
+        A soft-deleted document counts as removed.
+        """
+        if self._docs is None:
+            self._outdate_lazy_indexes()
+            return
+        if doc is not None and TOMBSTONE in doc:
+            doc = None
+        self._own()
+        docs = self._docs
+        old = docs.get(doc_id)
+        for index in self.indexes + self.lazy_indexes:
+            if old is not None:
+                index.discard(doc_id, old)
+            if doc is not None:
+                index.add(doc_id, doc)
+        if doc is None:
+            docs.pop(doc_id, None)
+        else:
+            # A restored (or explicitly numbered) document goes back in ID order
+            out_of_order = old is None and docs and doc_id < next(reversed(docs))
+            docs[doc_id] = Document(doc, doc_id)
+            if out_of_order:
+                self._docs = dict(sorted(docs.items()))
+    
+    def _apply_update(self, doc_id, fields):
+        if self._docs is None:
+            self._outdate_lazy_indexes()
+        elif doc_id in self._docs:
+            self._apply(doc_id, {**self._docs[doc_id], **fields})
+    
+    def _apply_clear(self):
+        self._outdate_lazy_indexes()
+        if self._docs is not None:
+            self._own()
+            self._docs = {}
+            for index in self.indexes:
+                index.rebuild({})
+    
+    def _check_unique(self, data, doc_id=None):
+        """Raise ValueError if ``data`` repeats a value of a unique field."""
+        fields = [f for f, index in self.hash_indexes.items() if index.unique and f in data]
+        if not fields:
+            return
+        self._snapshot()
+        for field in fields:
+            holders = [i for i in self.hash_indexes[field].lookup(data[field]) if i != doc_id]
+            if holders:
+                raise ValueError(
+                    f"{self.name}: {field} {data[field]!r} already exists (document {holders[0]})"
+                )
+    
+    def insert(self, data, doc_id=None):
+        """Insert a document, under ``doc_id`` if given."""
+        with self._writing():
+            self._check_unique(data)
+            doc_id = self.db.insert(data if doc_id is None else Document(data, doc_id))
+            self._apply(doc_id, dict(data))
+            return doc_id
+    
+    def get_all(self):
+        """Get all documents.
+        
+        Documents come from the shared in-memory snapshot, so this costs a
+        stat() and a list copy unless the table changed. Treat them as
+        read-only.
+        """
+        return list(self._view().docs.values())
+    
+    def update(self, data, doc_id):
+        """Update a document by ID."""
+        with self._writing():
+            self._check_unique(data, doc_id)
+            updated = self.db.update(data, doc_ids=[doc_id])
+            self._apply_update(doc_id, data)
+            return updated
+    
+    def replace(self, data, doc_id):
+        """Replace a document's content by ID, dropping fields not in ``data``."""
+        with self._writing():
+            self._check_unique(data, doc_id)
+            updated = self.db.update(_replace_with(data), doc_ids=[doc_id])
+            self._apply(doc_id, dict(data))
+            return updated
+    
+    def get(self, doc_id):
+        """Get a document by ID."""
+        return self._view().docs.get(doc_id)
+    
+    def count(self):
+        """Return the number of documents."""
+        return len(self._view().docs)
+    
+    def get_by(self, field, value):
+        """Get the first document whose ``field`` equals ``value``."""
+        view = self._view()
+        docs = view.docs
+        index = view.hash_indexes.get(field)
+        if index is None:
+            return next((doc for doc in docs.values() if doc.get(field) == value), None)
+        doc_ids = index.lookup(value)
+        return docs[doc_ids[0]] if doc_ids else None
+    
+    def upsert_by(self, field, data):
+        """Update the document matching ``data[field]``, or insert ``data``."""
+        with self.transaction():
+            existing = self.get_by(field, data[field])
+            if existing:
+                self.update(data, existing.doc_id)
+                return existing.doc_id
+            return self.insert(data)
+    
+    def range(self, field, start=None, end=None):
+        """Get documents whose ``field`` lies between ``start`` and ``end``.
+        
+        Both bounds are inclusive and either may be omitted; dates are
+        compared as ISO strings. ``end`` also matches values that start
+        with it, so a date bound covers the whole day of a timestamp field.
+        Results are ordered by ``field``.
+        """
+        start, end = _iso(start), _iso(end)
+        view = self._view()
+        docs = view.docs
+        index = view.sorted_indexes.get(field)
+        if index is not None:
+            return [docs[doc_id] for doc_id in index.range(start, end)]
+        matches = [
+            doc for doc in docs.values()
+            if isinstance(doc.get(field), str) and _in_range(doc[field], start, end)
+        ]
+        return sorted(matches, key=lambda doc: doc[field])
+    
+    def remove(self, doc_id):
+        """Remove a document by ID."""
+        with self._writing():
+            removed = self.db.remove(doc_ids=[doc_id])
+            self._apply(doc_id, None)
+            return removed
+    
+    def delete(self, doc_id):
+        """Soft-delete a document; return whether it was there.
+        
+        It is hidden at once and can be brought back with ``restore`` until
+        the purge thread removes it, UNDO_SECONDS later at the earliest.
+        Unless the table is shared, the tombstone is not saved before this
+        returns but within TOMBSTONE_SAVE_SECONDS, together with any other
+        deletes (or writes) made meanwhile.
+        """
+        durable = self.deferred is None
+        with self.transaction(durable=durable):
+            if self.get(doc_id) is None:
+                return False
+            self.update({TOMBSTONE: datetime.now().isoformat()}, doc_id)
+        if not durable:
+            _write_behind.schedule(self, TOMBSTONE_SAVE_SECONDS)
+        _purger.schedule(self, UNDO_SECONDS)
+        return True
+    
+    def restore(self, doc_id):
+        """Undo ``delete``; return False if the document is gone for good.
+        
+        Raises ValueError if a unique field's value has been taken meanwhile.
+        """
+        with self.transaction():
+            doc = self._stored(doc_id)
+            if doc is None or TOMBSTONE not in doc:
+                return False
+            self.replace({field: value for field, value in doc.items() if field != TOMBSTONE}, doc_id)
+        return True
+    
+    def purge(self, age=None):
+        """Remove documents soft-deleted over ``age`` seconds ago; return how many.
+        
+        ``age`` defaults to UNDO_SECONDS. They all go in one write. The
+        rest are purged together once the youngest of them is old enough.
+        """
+        age = UNDO_SECONDS if age is None else age
+        cutoff = (datetime.now() - timedelta(seconds=age)).isoformat()
+        with self.transaction():
+            tombstones = self._tombstones()
+            expired = [doc.doc_id for doc in tombstones if doc[TOMBSTONE] <= cutoff]
+            for doc_id in expired:
+                self.remove(doc_id)
+        young = [doc[TOMBSTONE] for doc in tombstones if doc[TOMBSTONE] > cutoff]
+        if young:
+            wait = datetime.fromisoformat(max(young)) + timedelta(seconds=age) - datetime.now()
+            _purger.schedule(self, max(wait.total_seconds(), 0))
+        return len(expired)
+    
+    def _stored(self, doc_id):
+        """Return a document as stored, soft-deleted or not."""
+        self._refresh()
+        return self.db.get(doc_id=doc_id)
+    
+    def _tombstones(self):
+        """Return the soft-deleted documents, tombstone included."""
+        self._refresh()
+        return [doc for doc in self.db.all() if TOMBSTONE in doc]
+    
+    def search(self, query):
+        """Search documents."""
+        return [doc for doc in self._view().docs.values() if query(doc)]
+    
+    def stream(self, start=None, end=None, field=None):
+        """Yield every document, or those whose ``field`` is in range.
+        
+        Bounds work as in ``range``. Tables held in memory are read from a
+        single snapshot; SQLite reads them a page at a time.
+        """
+        if field is None:
+            yield from self.get_all()
+        else:
+            yield from self.range(field, start, end)
+    
+    def select(self):
+        """Start a query on this table (see Select)."""
+        return Select(self)
+    
+    def search_text(self, query, limit=20, substring=False):
+        """Rank documents for ``query`` with BM25 over the ``text`` fields.
+        
+        Returns up to ``limit`` (document, score, snippet) tuples, or all
+        of them with None, best first. A document matches if it holds any
+        query word, and the last word also matches as a prefix, so results
+        follow typing. With ``substring`` it matches instead if it holds the
+        query anywhere, as ``search_substring`` does, and BM25 only orders
+        the matches. The snippet shows the best passage with the matches in
+        bold.
+        """
+        if self.text_index is None:
+            raise ValueError(f"{self.name} has no text index; open it with text=(fields...)")
+        view = self._synced_view(self.text_index)
+        terms = self.text_index.terms(query)
+        if not substring:
+            docs = view.docs
+            ranked = self.text_index.score(terms, limit=limit, live=docs)
+            return [
+                (docs[doc_id], score, self.text_index.snippet(docs[doc_id], terms)) for doc_id, score in ranked
+            ]
+        matches = self.search_substring(query)
+        scores = dict(self.text_index.score(terms, limit=None, live={doc.doc_id for doc in matches}))
+        matches.sort(key=lambda doc: -scores.get(doc.doc_id, 0))
+        return [
+            (doc, scores.get(doc.doc_id, 0), self.text_index.snippet(doc, terms))
+            for doc in matches[:limit]
+        ]
+    
+    def search_substring(self, text):
+        """Return documents holding ``text`` in a ``substring`` field, ignoring case.
+        
+        Matches exactly what ``text.lower() in value.lower()`` would, list
+        fields being joined with spaces, and returns them in ID order. The
+        trigram index narrows the documents to check; text under three
+        characters has no trigram, so then every document is checked.
+        """
+        if self.trigram_index is None:
+            raise ValueError(f"{self.name} has no substring index; open it with substring=(fields...)")
+        docs = self._synced_view(self.trigram_index).docs
+        candidates = self.trigram_index.candidates(text)
+        doc_ids = docs if candidates is None else [doc_id for doc_id in candidates if doc_id in docs]
+        return [docs[doc_id] for doc_id in sorted(doc_ids) if self.trigram_index.matches(docs[doc_id], text)]
+    
+    def complete(self, text, limit=10, among=None):
+        """Return the best ``limit`` documents with a word starting with ``text``.
+        
+        For as-you-type suggestions over the ``prefix`` fields: "ana sm"
+        and "smi" both find "Ana Smith". A match in an earlier field ranks
+        first, then one nearer the start of the value, then the shorter
+        value. At most PrefixIndex.KEEP documents come back, unless
+        ``among`` is given: then the documents in it are ranked the same
+        way, without the index, and ``limit`` may be None for all of them.
+        """
+        if self.prefix_index is None:
+            raise ValueError(f"{self.name} has no prefix index; open it with prefix=(fields...)")
+        if among is not None:
+            ranked = [(self.prefix_index.rank(text, doc.doc_id, doc), doc) for doc in among]
+            ranked = sorted((key, doc) for key, doc in ranked if key is not None)
+            return [doc for _, doc in ranked][:limit]
+        docs = self._synced_view(self.prefix_index).docs
+        return [docs[doc_id] for doc_id in self.prefix_index.complete(text, limit) if doc_id in docs]
+    
+    def similar(self, texts, limit=5):
+        """Return the ``limit`` documents most like each of ``texts``.
+        
+        Compares word use over the ``vectors`` fields (see VectorIndex), so
+        entries about the same things rank first whatever their order. All
+        texts are scored in one batch. Returns one [(document, similarity)]
+        list per text, best first, similarity running from 0 to 1.
+        """
+        if self.vector_index is None:
+            raise ValueError(f"{self.name} has no vector index; open it with vectors=(fields...)")
+        docs = self._synced_view(self.vector_index).docs
+        results = self.vector_index.search(self.vector_index.vectors(texts), limit)
+        return [[(docs[doc_id], score) for doc_id, score in hits if doc_id in docs] for hits in results]
+    
+    def _index_current(self, index):
+        """Return whether ``index`` can be searched without loading the table."""
+        return not index.stale and self._signature() == self._seen_signature
+    
+    def _synced_view(self, index):
+        """Return a snapshot to search, first catching ``index`` up if it is stale."""
+        view = self._view()  # Picks up changes from elsewhere, which make the index stale
+        if index.stale:
+            # Writers wait meanwhile, so no change slips between the sync and the flag
+            with self.lock:
+                if index.stale:
+                    index.sync(self._snapshot())
+            view = self._view()
+        return view
+    
+    def _access(self, query, view):
+        """Pick the index access that leaves the fewest candidates.
+        
+        Returns (condition, candidate count, fetch, exact, description), or
+        None if no condition has an index. ``fetch()`` gives the candidate
+        IDs; ``exact`` means they all match that condition.
+        """
+        best = None
+        for condition in query.conditions:
+            op, field, operand = condition
+            hash_index = view.hash_indexes.get(field)
+            sorted_index = view.sorted_indexes.get(field)
+            values = operand if op == "in" else [operand]
+            if hash_index is not None and op != "range" and all(
+                    value is not None and _hashable(value) for value in values):
+                doc_ids = list(dict.fromkeys(
+                    doc_id for value in values for doc_id in hash_index.lookup(value)
+                ))
+                access = (condition, len(doc_ids), lambda doc_ids=doc_ids: doc_ids,
+                          op != "contains" and not hash_index.multi, f"hash index on {field}")
+            elif sorted_index is not None and op == "range" and _string_bounds(operand):
+                access = (condition, sorted_index.count(*operand),
+                          lambda index=sorted_index, bounds=operand: index.range(*bounds),
+                          True, f"sorted index on {field}")
+            elif sorted_index is not None and op == "==" and isinstance(operand, str):
+                # A range bound also matches longer values, so check them after
+                access = (condition, sorted_index.count(operand, operand),
+                          lambda index=sorted_index, value=operand: index.range(value, value),
+                          False, f"sorted index on {field}")
+            else:
+                continue
+            if best is None or access[1] < best[1]:
+                best = access
+        return best
+    
+    def _plan(self, query, view):
+        """Return (candidate IDs or None for all, conditions left, in order, steps)."""
+        access = self._access(query, view)
+        residual = list(query.conditions)
+        in_order = query.order is None
+        if access is None:
+            doc_ids = None
+            steps = [f"scan all {len(view.docs)} documents"]
+            if query.order and query.order[0] in view.sorted_indexes:
+                field, desc = query.order
+                indexed = view.sorted_indexes[field].range()
+                unindexed = set(view.docs).difference(indexed)
+                doc_ids = itertools.chain(reversed(indexed) if desc else indexed, sorted(unindexed))
+                in_order = True
+                steps = [f"walk sorted index on {field}" + (" backwards" if desc else "")
+                         + f", then {len(unindexed)} documents without it"]
+        else:
+            condition, count, fetch, exact, description = access
+            doc_ids = fetch()
+            if exact:
+                residual.remove(condition)
+            steps = [f"{description}: {_describe(condition)} → {count} candidates"]
+            if query.order and description == f"sorted index on {query.order[0]}":
+                in_order = True
+                if query.order[1]:
+                    doc_ids = doc_ids[::-1]
+            else:
+                # ID order, as a scan gives; the sort below is stable, so ties
+                # and documents without the field keep it too
+                doc_ids = sorted(doc_ids)
+        return doc_ids, residual, in_order, steps + _plan_steps(query, residual, in_order)
+    
+    def _run(self, query):
+        view = self._view()
+        docs = view.docs
+        doc_ids, residual, in_order, _ = self._plan(query, view)
+        matches = (
+            docs[doc_id] for doc_id in (docs if doc_ids is None else doc_ids)
+            if all(_holds(condition, docs[doc_id]) for condition in residual)
+        )
+        if not in_order:
+            return _sorted_docs(list(matches), *query.order)[:query.max_rows]
+        return list(itertools.islice(matches, query.max_rows))
+    
+    def _count(self, query):
+        view = self._view()
+        docs = view.docs
+        access = self._access(query, view)
+        if not query.conditions:
+            total = len(docs)
+        elif access is not None and access[3] and len(query.conditions) == 1:
+            total = access[1]
+        else:
+            unordered = copy.copy(query)
+            unordered.order = None
+            doc_ids, residual, _, _ = self._plan(unordered, view)
+            total = sum(
+                1 for doc_id in (docs if doc_ids is None else doc_ids)
+                if all(_holds(condition, docs[doc_id]) for condition in residual)
+            )
+        return total if query.max_rows is None else min(total, query.max_rows)
+    
+    def _explain(self, query):
+        view = self._view()
+        steps = self._plan(query, view)[3]
+        return "\n".join([f"{self.name} ({len(view.docs)} documents in memory)"] + [f"  {step}" for step in steps])
+    
+    def clear(self):
+        """Clear all documents."""
+        with self._writing():
+            self._apply_clear()
+            return self.db.truncate()
+    
+    def vacuum(self, renumber=False):
+        """Rewrite the table file in one go; return its size before and after.
+        
+        Like every save, the new file is written beside the old one and
+        renamed over it, so readers see either version whole. ``renumber``
+        gives documents consecutive IDs again; open pages may still hold
+        the old ones, so only use it with the app stopped. Expired soft
+        deletes are purged first; renumbering drops the rest.
+        """
+        self.purge()
+        with self._writing():
+            self.flush()
+            before = _file_size(self.path)
+            if not before:
+                return 0, 0
+            docs = self._snapshot()
+            if renumber:
+                docs = _compact_ids(docs.values())
+            else:
+                # Keep what can still be undone
+                docs = {**docs, **{doc.doc_id: doc for doc in self._tombstones()}}
+            data = self.db.storage.read() or {}
+            data["_default"] = {str(doc_id): dict(doc) for doc_id, doc in docs.items()}
+            FileStorage(self.path).write(data)
+            self._invalidate()
+        return before, _file_size(self.path)
+
+
+def _replace_with(data):
+    """TinyDB update operation that swaps a document's content for ``data``."""
+    def transform(doc):
+        doc.clear()
+        doc.update(data)
+    return transform
+
+
+def _iso(value):
+    """Return dates as ISO strings and anything else unchanged."""
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def _in_range(value, start, end):
+    if start is not None and value < start:
+        return False
+    return end is None or value <= end or value.startswith(end)
+
+
+def _numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _string_bounds(bounds):
+    """True if range bounds are strings (at least one), so only strings can match."""
+    present = [bound for bound in bounds if bound is not None]
+    return bool(present) and all(isinstance(bound, str) for bound in present)
+
+
+def _holds(condition, doc):
+    """Check one Select condition against a document."""
+    op, field, operand = condition
+    value = doc.get(field)
+    if op == "==":
+        return value == operand
+    if op == "in":
+        return value in operand
+    if op == "contains":
+        return isinstance(value, list) and operand in value
+    start, end = operand
+    present = [bound for bound in operand if bound is not None]
+    if isinstance(value, str):
+        return all(isinstance(bound, str) for bound in present) and _in_range(value, start, end)
+    if _numeric(value) and all(_numeric(bound) for bound in present):
+        return (start is None or value >= start) and (end is None or value <= end)
+    return False
+
+
+def _describe(condition):
+    op, field, operand = condition
+    if op == "range":
+        return f"{field} between {operand[0]!r} and {operand[1]!r}"
+    return f"{field} {op} {operand!r}"
+
+
+def _sorted_docs(docs, field, desc=False):
+    """Sort documents by ``field``, those without it last."""
+    present = sorted((doc for doc in docs if doc.get(field) is not None),
+                     key=lambda doc: doc[field], reverse=desc)
+    return present + [doc for doc in docs if doc.get(field) is None]
+
+
+def _plan_steps(query, residual, in_order):
+    """Describe what happens to the candidates of a query plan."""
+    steps = []
+    if residual:
+        steps.append("filter: " + ", ".join(_describe(condition) for condition in residual))
+    if query.order:
+        field, desc = query.order
+        how = "already in order" if in_order else "sort in memory"
+        steps.append(f"order by {field}" + (" desc" if desc else "") + f" ({how})")
+    if query.max_rows is not None:
+        steps.append(f"limit {query.max_rows}")
+    return steps
+
+
+def _column_value(value):
+    """Return a value suitable for an indexed column, or None."""
+    if isinstance(value, (str, int, float)):
+        return value
+    return None
+
+
+def _sql_filter(query):
+    """Translate the indexable part of a TinyDB query into SQL.
+    
+    Only equality and range tests on indexed fields joined with ``&`` are
+    pushed down; the full query is still applied to every candidate, so the
+    SQL clause only has to select a superset of the matches.
+    """
+    clauses, params = [], []
+    
+    def collect(hashval):
+        if not isinstance(hashval, tuple) or not hashval:
+            return
+        if hashval[0] == "and":
+            for part in hashval[1]:
+                collect(part)
+            return
+        if len(hashval) != 3 or hashval[0] not in ("==", "<", "<=", ">", ">="):
+            return
+        op, path, value = hashval
+        if len(path) != 1 or path[0] not in INDEXED_FIELDS:
+            return
+        if _column_value(value) is None:
+            return
+        op = "=" if op == "==" else op
+        clauses.append(f'"{path[0]}" {op} ?')
+        params.append(value)
+    
+    collect(getattr(query, "_hash", None))
+    return " AND ".join(clauses), params
+
+
+class SQLiteDatabase(Database):
+    """SQLite-backed database with the same surface as Database.
+    
+    Documents are stored as JSON text, and the fields we filter on
+    (see INDEXED_FIELDS) are copied into indexed columns so searches on
+    them do not scan the whole table.
+    
+    SQLite locks the file itself, so no lock file is needed across
+    processes. Writes start with BEGIN IMMEDIATE so the write lock is
+    held before we look for changes made by other connections. Every
+    write also bumps the table's row in VERSIONS_TABLE, which is how
+    readers notice that this table (and no other) changed.
+    
+    Reads always run in SQL, so they use the column indexes and never load
+    the whole table; only the search indexes keep documents in memory.
+    They take no lock: each thread reads the last commit through a
+    connection of its own, which WAL lets run alongside the writer.
+    
+    Every query skips soft-deleted rows with LIVE_SQL.
+    """
+    
+    VERSIONS_TABLE = "_table_versions"
+    
+    _connections = {}
+    _connections_lock = threading.Lock()
+    _readers = threading.local()  # {path: connection} for each thread
+    
+    def __init__(self, name, unique=(), ordered=(), indexed=(), text=(), substring=(), prefix=(), vectors=(),
+                 path=None):
+        path = path or SQLITE_PATH
+        self.name = name
+        self.path = str(path)
+        self.conn, self.lock = self._connect(path)
+        self.file_lock = None
+        self.in_transaction = False
+        self.owns_transaction = False
+        self._create_indexes(unique, ordered, indexed, text, substring, prefix, vectors, Path(path).parent)
+        columns = ", ".join(f'"{field}"' for field in INDEXED_FIELDS)
+        with self.lock, self.conn:
+            self.conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" ('
+                "doc_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                f"doc TEXT NOT NULL, {columns})"
+            )
+            for field in INDEXED_FIELDS:
+                self.conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{name}_{field}" ON "{name}" ("{field}")'
+                )
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.VERSIONS_TABLE} (name TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+            self.conn.execute(f"INSERT OR IGNORE INTO {self.VERSIONS_TABLE} VALUES (?, 0)", [name])
+            if self.conn.execute(f'SELECT 1 FROM "{name}" WHERE NOT {LIVE_SQL} LIMIT 1').fetchone():
+                _purger.schedule(self, 0)
+        self._seen_signature = self._signature()
+    
+    @classmethod
+    def _connect(cls, path):
+        """Share one connection (and its lock) per database file."""
+        path = str(path)
+        with cls._connections_lock:
+            if path not in cls._connections:
+                conn = sqlite3.connect(path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS[DB_FSYNC]}")
+                cls._connections[path] = (conn, threading.RLock())
+            return cls._connections[path]
+    
+    @contextmanager
+    def _writing(self):
+        """Run statements in the open transaction, or in one of their own."""
+        with self.lock:
+            if self.conn.in_transaction:
+                with super()._writing():
+                    yield
+                    self._bump()
+                return
+        # Own transaction, so subscribers hear about it after the commit
+        with self.transaction(), super()._writing():
+            yield
+            self._bump()
+    
+    def _bump(self):
+        """Move the table's version, in the write's transaction."""
+        self.conn.execute(f"UPDATE {self.VERSIONS_TABLE} SET version = version + 1 WHERE name = ?", [self.name])
+    
+    @contextmanager
+    def _reading(self):
+        """Yield a connection to read from without taking the lock.
+        
+        The thread running a write transaction reads through the shared
+        connection, so it sees its own changes; any other thread reads the
+        last commit through its own connection.
+        """
+        if self.conn.in_transaction and self.lock.acquire(blocking=False):
+            try:
+                if self.conn.in_transaction:
+                    yield self.conn
+                    return
+            finally:
+                self.lock.release()
+        readers = getattr(self._readers, "connections", None)
+        if readers is None:
+            readers = self._readers.connections = {}
+        if self.path not in readers:
+            readers[self.path] = sqlite3.connect(self.path)
+        yield readers[self.path]
+    
+    def _signature(self):
+        # Changes whenever this table's row in VERSIONS_TABLE is bumped
+        with self._reading() as conn:
+            row = conn.execute(f"SELECT version FROM {self.VERSIONS_TABLE} WHERE name = ?", [self.name]).fetchone()
+        return row[0] if row else None
+    
+    def _invalidate(self):
+        self._docs = None
+        self._version += 1
+        self._outdate_lazy_indexes()
+    
+    def _forget_stored(self):
+        # The rows live in the database file, nothing else is kept in memory
+        pass
+    
+    def _begin(self):
+        # Tables share a connection, so a cross-table batch is one transaction
+        self.owns_transaction = not self.conn.in_transaction
+        if self.owns_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+    
+    def _commit(self):
+        if self.owns_transaction:
+            self.conn.commit()
+    
+    def _rollback(self):
+        self.conn.rollback()
+        self._invalidate()
+    
+    def _row(self, data):
+        """Build the column values for a document."""
+        return [json.dumps(data)] + [_column_value(data.get(f)) for f in INDEXED_FIELDS]
+    
+    def _select_sql(self, where="", limit=None, order=None, tombstones=False):
+        sql = f'SELECT doc_id, doc FROM "{self.name}"'
+        clauses = [where] if where else []
+        if not tombstones:
+            clauses.append(LIVE_SQL)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order or 'doc_id'}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return sql
+    
+    def _select(self, where="", params=(), limit=None, order=None, tombstones=False):
+        with self._reading() as conn:
+            rows = conn.execute(self._select_sql(where, limit, order, tombstones), params).fetchall()
+        return [Document(json.loads(doc), doc_id) for doc_id, doc in rows]
+    
+    def _check_unique(self, data, doc_id=None):
+        for field, index in self.hash_indexes.items():
+            if not index.unique or field not in data:
+                continue
+            holders = [doc.doc_id for doc in self._where(field, data[field]) if doc.doc_id != doc_id]
+            if holders:
+                raise ValueError(
+                    f"{self.name}: {field} {data[field]!r} already exists (document {holders[0]})"
+                )
+    
+    def _where(self, field, value):
+        if field in INDEXED_FIELDS and _column_value(value) is not None:
+            return [doc for doc in self._select(f'"{field}" = ?', [value]) if doc.get(field) == value]
+        return [doc for doc in self._select() if doc.get(field) == value]
+    
+    def insert(self, data, doc_id=None):
         """Insert a document."""
-        return self.db.insert(data)
+        columns = ", ".join(f'"{field}"' for field in INDEXED_FIELDS)
+        placeholders = ", ".join("?" for _ in INDEXED_FIELDS)
+        with self._writing():
+            self._check_unique(data, doc_id)
+            try:
+                cursor = self.conn.execute(
+                    f'INSERT INTO "{self.name}" (doc_id, doc, {columns}) '
+                    f"VALUES (?, ?, {placeholders})",
+                    [doc_id] + self._row(dict(data))
+                )
+            except sqlite3.IntegrityError:
+                # Soft-deleted documents keep their row, so the ID may be taken
+                raise ValueError(f"Document with ID {doc_id} already exists") from None
+            self._apply(cursor.lastrowid, dict(data))
+        return cursor.lastrowid
+    
+    def _read_all(self):
+        return self._select()
+    
+    def get(self, doc_id):
+        """Get a document by ID."""
+        result = self._select("doc_id = ?", [doc_id])
+        return result[0] if result else None
     
     def get_all(self):
-        """Get all documents."""
-        return self.db.all()
+        """Get all documents, in ID order."""
+        return self._select()
+    
+    def count(self):
+        """Return the number of documents."""
+        with self._reading() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM "{self.name}" WHERE {LIVE_SQL}').fetchone()[0]
+    
+    def get_by(self, field, value):
+        """Get the first document whose ``field`` equals ``value``."""
+        result = self._where(field, value)
+        return result[0] if result else None
+    
+    def range(self, field, start=None, end=None):
+        """Get documents whose ``field`` lies between ``start`` and ``end``."""
+        start, end = _iso(start), _iso(end)
+        clauses, params = [], []
+        if field in INDEXED_FIELDS:
+            clauses.append(f'typeof("{field}") = \'text\'')
+            if start is not None:
+                clauses.append(f'"{field}" >= ?')
+                params.append(start)
+            if end is not None:
+                clauses.append(f'"{field}" <= ?')
+                params.append(end + "\uffff")
+        docs = self._select(" AND ".join(clauses), params)
+        return sorted(
+            (doc for doc in docs if isinstance(doc.get(field), str) and _in_range(doc[field], start, end)),
+            key=lambda doc: doc[field]
+        )
+    
+    def update(self, data, doc_id, replace=False):
+        """Update a document by ID."""
+        assignments = ", ".join(f'"{field}" = ?' for field in INDEXED_FIELDS)
+        with self._writing():
+            self._check_unique(data, doc_id)
+            result = self._select("doc_id = ?", [doc_id], tombstones=True)
+            if not result:
+                return []
+            doc = dict(data) if replace else dict(result[0], **data)
+            self.conn.execute(
+                f'UPDATE "{self.name}" SET doc = ?, {assignments} WHERE doc_id = ?',
+                self._row(doc) + [doc_id]
+            )
+            self._apply(doc_id, doc)
+        return [doc_id]
+    
+    def replace(self, data, doc_id):
+        """Replace a document's content by ID, dropping fields not in ``data``."""
+        return self.update(data, doc_id, replace=True)
+    
+    def remove(self, doc_id):
+        """Remove a document by ID."""
+        with self._writing():
+            cursor = self.conn.execute(f'DELETE FROM "{self.name}" WHERE doc_id = ?', [doc_id])
+            self._apply(doc_id, None)
+        return [doc_id] if cursor.rowcount else []
+    
+    def search(self, query):
+        """Search documents."""
+        where, params = _sql_filter(query)
+        return [doc for doc in self._select(where, params) if query(doc)]
+    
+    def _stored(self, doc_id):
+        result = self._select("doc_id = ?", [doc_id], tombstones=True)
+        return result[0] if result else None
+    
+    def _tombstones(self):
+        return self._select(f"NOT {LIVE_SQL}", tombstones=True)
+    
+    def _sql_plan(self, query):
+        """Translate ``query`` into (WHERE, params, conditions left, ORDER BY).
+        
+        Equality, ``in`` and string ranges on INDEXED_FIELDS become exact
+        SQL tests on their columns. A list-contains test is narrowed with
+        json_each but still checked afterwards, as is everything else.
+        ORDER BY is only returned when nothing is left to check in Python.
+        """
+        clauses, params, residual = [], [], []
+        for condition in query.conditions:
+            op, field, operand = condition
+            values = operand if op == "in" else [operand]
+            column = field in INDEXED_FIELDS and all(_column_value(value) is not None for value in values)
+            if op == "==" and column:
+                clauses.append(f'"{field}" = ?')
+                params.append(operand)
+            elif op == "in" and column and operand:
+                clauses.append(f'"{field}" IN ({", ".join("?" for _ in operand)})')
+                params.extend(operand)
+            elif op == "range" and field in INDEXED_FIELDS and _string_bounds(operand):
+                start, end = operand
+                clauses.append(f'typeof("{field}") = \'text\'')
+                if start is not None:
+                    clauses.append(f'"{field}" >= ?')
+                    params.append(start)
+                if end is not None:
+                    clauses.append(f'"{field}" <= ?')
+                    params.append(end + "\uffff")
+            elif op == "contains" and _column_value(operand) is not None:
+                clauses.append("EXISTS (SELECT 1 FROM json_each(doc, ?) WHERE value = ?)")
+                params.extend([f'$."{field}"', operand])
+                residual.append(condition)
+            else:
+                residual.append(condition)
+        order = None
+        if query.order and not residual and query.order[0] in INDEXED_FIELDS:
+            field, desc = query.order
+            order = f'"{field}" IS NULL, "{field}"' + (" DESC" if desc else "") + ", doc_id"
+        return " AND ".join(clauses), params, residual, order
+    
+    def _run(self, query):
+        where, params, residual, order = self._sql_plan(query)
+        if not residual and (query.order is None or order):
+            return self._select(where, params, query.max_rows, order)
+        rows = [
+            doc for doc in self._select(where, params)
+            if all(_holds(condition, doc) for condition in residual)
+        ]
+        if query.order:
+            rows = _sorted_docs(rows, *query.order)
+        return rows[:query.max_rows]
+    
+    def _count(self, query):
+        where, params, residual, _ = self._sql_plan(query)
+        if residual:
+            total = sum(
+                1 for doc in self._select(where, params)
+                if all(_holds(condition, doc) for condition in residual)
+            )
+        else:
+            sql = f'SELECT COUNT(*) FROM "{self.name}" WHERE ' + " AND ".join(filter(None, [where, LIVE_SQL]))
+            with self._reading() as conn:
+                total = conn.execute(sql, params).fetchone()[0]
+        return total if query.max_rows is None else min(total, query.max_rows)
+    
+    def _explain(self, query):
+        where, params, residual, order = self._sql_plan(query)
+        pushed = not residual and (query.order is None or order)
+        sql = self._select_sql(where, query.max_rows if pushed else None, order)
+        with self._reading() as conn:
+            plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        steps = [f"sql: {sql}"] + [f"sqlite: {detail}" for detail in plan]
+        if not pushed:
+            steps += _plan_steps(query, residual, query.order is None)
+        return "\n".join([f"{self.name} (SQLite)"] + [f"  {step}" for step in steps])
+    
+    def stream(self, start=None, end=None, field=None, page_size=1000):
+        """Yield documents in ID order, ``page_size`` rows per query.
+        
+        Each page is read from the last commit, so writes can land
+        between pages.
+        """
+        start, end = _iso(start), _iso(end)
+        last_id = 0
+        while True:
+            page = self._select("doc_id > ?", [last_id], limit=page_size)
+            for doc in page:
+                if field is None or (isinstance(doc.get(field), str) and _in_range(doc[field], start, end)):
+                    yield doc
+            if len(page) < page_size:
+                return
+            last_id = page[-1].doc_id
+    
+    def clear(self):
+        """Clear all documents."""
+        with self._writing():
+            self._apply_clear()
+            self.conn.execute(f'DELETE FROM "{self.name}"')
+            self.conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", [self.name])
+    
+    def vacuum(self, renumber=False):
+        """Give documents consecutive IDs again if ``renumber`` is set.
+        
+        Space is reclaimed for the whole file at once by vacuum_file().
+        Returns None because a single table has no size of its own.
+        Expired soft deletes are purged first; renumbering drops the rest.
+        """
+        self.purge()
+        if not renumber:
+            return None
+        with self.transaction():
+            docs = self._select()
+            renumbered = _compact_ids(docs)
+            if list(renumbered) != [doc.doc_id for doc in docs]:
+                self.clear()
+                for doc_id, doc in renumbered.items():
+                    self.insert(dict(doc), doc_id)
+        return None
+    
+    @staticmethod
+    def vacuum_file(path=None):
+        """Checkpoint the WAL and VACUUM; return the file size before and after."""
+        path = path or SQLITE_PATH
+        def size():
+            return _file_size(path) + _file_size(Path(f"{path}-wal"))
+        
+        before = size()
+        conn, lock = SQLiteDatabase._connect(path)
+        with lock:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return before, size()
+
+
+class LogDatabase(Database):
+    """Append-only log storage on top of an in-memory dict.
+    
+    Every mutation is appended to ``<name>.log`` as one JSON line instead of
+    rewriting the table, and applied to ``stored``, a plain {doc_id: doc}
+    dict, so it costs the same whatever the size of the table. On open the
+    snapshot in ``<name>.json`` is loaded and the log replayed over it. Once the log holds LOG_CHECKPOINT_EVERY
+    records the state is written to a fresh snapshot and the log truncated.
+    Replaying a record is idempotent, so a crash between writing the
+    snapshot and truncating the log loses nothing.
+    
+    With ``shared`` other processes may append to the same log. When the
+    generation counter moves we replay just the records added since our
+    last read, or reload everything if the epoch shows a checkpoint
+    rewrote the snapshot.
+    
+    Unless DB_FSYNC is off, appends are fsynced with group commit: writers
+    that commit while an fsync is running share the next one.
+    """
+    
+    def __init__(self, name, unique=(), ordered=(), indexed=(), text=(), substring=(), prefix=(), vectors=(),
+                 path=None, checkpoint_every=LOG_CHECKPOINT_EVERY, shared=MULTIPROCESS,
+                 group_commit=GROUP_COMMIT_MS / 1000):
+        self.name = name
+        self.snapshot_path = Path(path) if path else _table_path(name)
+        self._create_indexes(unique, ordered, indexed, text, substring, prefix, vectors,
+                            self.snapshot_path.parent)
+        self.log_path = self.snapshot_path.parent / f"{name}.log"
+        self.file_lock = FileLock(self.snapshot_path.parent / f"{name}.lock") if shared else None
+        self.save_lock = None if shared else FileLock(self.snapshot_path.parent / f"{name}.lock")
+        self.checkpoint_every = checkpoint_every
+        self.stored = {}  # doc_id -> document as stored, soft-deleted ones included
+        self.next_id = 1
+        self.lock = threading.RLock()
+        self.in_transaction = False
+        self.pending_records = []
+        with self._file_locked(), self._saving():
+            self._load()
+            self._drop_torn_record()
+        self.log_file = open(self.log_path, "ab")
+        if DB_FSYNC != "off":
+            self.group_commit = GroupCommit(self._sync_log, group_commit)
+            if DB_FSYNC == "full":
+                _fsync_directory(self.log_path.parent)
+        atexit.register(self._checkpoint_if_dirty)
+    
+    def _load(self):
+        """Load the snapshot and replay the whole log over it."""
+        tables = FileStorage(self.snapshot_path).read() or {}
+        self.stored = {int(doc_id): doc for doc_id, doc in tables.get("_default", {}).items()}
+        self.log_records, self.log_offset = 0, 0
+        self._replay()
+        self.next_id = max(self.stored, default=0) + 1
+        self.epoch = self.file_lock.counters()[1] if self.file_lock is not None else 0
+        self._seen_signature = self._signature()
+    
+    def _replay(self):
+        """Apply log records past ``log_offset`` to ``stored``."""
+        if not self.log_path.exists():
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self.log_offset)
+            for line in f:
+                try:
+                    record = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    break  # Torn final record from an interrupted append
+                _apply_log_record(self.stored, record)
+                self.log_records += 1
+                self.log_offset += len(line)
+    
+    def _drop_torn_record(self):
+        """Cut a record left half-written by a crash off the log.
+        
+        Otherwise the next append would continue its line, and replay,
+        which stops at the first bad line, would never get past it.
+        """
+        if self.log_path.exists() and self.log_path.stat().st_size > self.log_offset:
+            os.truncate(self.log_path, self.log_offset)
+    
+    def _refresh(self):
+        """Catch up with records appended by other processes.
+        
+        Also reloads ``stored`` after release() dropped it.
+        """
+        if self.stored is None:
+            next_id = self.next_id
+            self._load()
+            # IDs of documents removed since the last checkpoint stay used
+            self.next_id = max(self.next_id, next_id)
+            return
+        signature = self._signature()
+        if signature == self._seen_signature:
+            return
+        if self.file_lock.counters()[1] != self.epoch:
+            self._load()
+        else:
+            self._replay()
+            self.next_id = max(self.next_id, max(self.stored, default=0) + 1)
+            self._seen_signature = signature
+        self._invalidate()
+        self._changed_elsewhere = True
+    
+    def _invalidate(self):
+        self._docs = None
+        self._version += 1
+        self._outdate_lazy_indexes()
+    
+    def _read_all(self):
+        return [Document(doc, doc_id) for doc_id, doc in self.stored.items()]
+    
+    def _forget_stored(self):
+        # Every committed record is in the snapshot or the log, so _refresh() can reload it
+        self.stored = None
+    
+    def _stored(self, doc_id):
+        self._refresh()
+        doc = self.stored.get(doc_id)
+        return Document(doc, doc_id) if doc is not None else None
+    
+    def _tombstones(self):
+        self._refresh()
+        return [Document(doc, doc_id) for doc_id, doc in self.stored.items() if TOMBSTONE in doc]
+    
+    def _append(self, record):
+        self.pending_records.append(record)
+        if not self.in_transaction:
+            self._commit()
+    
+    def _begin(self):
+        self.pending_records = []
+    
+    def _commit(self):
+        records, self.pending_records = self.pending_records, []
+        if not records:
+            return
+        data = "".join(json.dumps(record) + "\n" for record in records).encode()
+        with self._saving():
+            self.log_file.write(data)
+            self.log_file.flush()
+        self.log_records += len(records)
+        self.log_offset += len(data)
+        if self.log_records >= self.checkpoint_every:
+            self.checkpoint()
+    
+    def _sync_log(self):
+        # Appends are already written out, and fsync needs no lock
+        os.fsync(self.log_file.fileno())
+    
+    def _rollback(self):
+        # The in-memory state already holds the changes; rebuild it from disk
+        self.pending_records = []
+        self._load()
+        self._invalidate()
+    
+    def checkpoint(self):
+        """Write the current state to the snapshot and truncate the log."""
+        with self.lock, self._file_locked(), self._saving(rewritten=True):
+            self._refresh()
+            # Nobody hand-edits the snapshot, so plain JSON skips the indentation
+            snapshot_format = "compact" if DB_FORMAT == "json" else DB_FORMAT
+            tables = {"_default": {str(doc_id): doc for doc_id, doc in self.stored.items()}}
+            FileStorage(self.snapshot_path, snapshot_format).write(tables)
+            self.log_file.truncate(0)
+            self.log_records, self.log_offset = 0, 0
+            if self.file_lock is not None:
+                self.file_lock.bump(rewritten=True)
+                self.epoch += 1
+                self._seen_signature = self._signature()
+    
+    def _signature(self):
+        # Without a lock file the in-memory table is authoritative for this process
+        return self.file_lock.token() if self.file_lock is not None else None
+    
+    def _checkpoint_if_dirty(self):
+        if self.log_records:
+            self.checkpoint()
+    
+    def insert(self, data, doc_id=None):
+        """Insert a document, under ``doc_id`` if given."""
+        with self._writing():
+            self._check_unique(data)
+            if doc_id is None:
+                doc_id = self.next_id
+            elif doc_id in self.stored:
+                raise ValueError(f"Document with ID {doc_id} already exists")
+            self.stored[doc_id] = dict(data)
+            self.next_id = max(self.next_id, doc_id + 1)
+            self._apply(doc_id, dict(data))
+            self._append({"op": "insert", "doc_id": doc_id, "doc": dict(data)})
+            return doc_id
     
     def update(self, data, doc_id):
         """Update a document by ID."""
-        return self.db.update(data, doc_ids=[doc_id])
+        with self._writing():
+            self._check_unique(data, doc_id)
+            doc = self.stored.get(doc_id)
+            if doc is None:
+                return []
+            doc.update(data)
+            self._apply_update(doc_id, data)
+            self._append({"op": "update", "doc_id": doc_id, "fields": dict(data)})
+            return [doc_id]
+    
+    def replace(self, data, doc_id):
+        """Replace a document's content by ID, dropping fields not in ``data``."""
+        with self._writing():
+            self._check_unique(data, doc_id)
+            if doc_id not in self.stored:
+                return []
+            self.stored[doc_id] = dict(data)
+            self._apply(doc_id, dict(data))
+            self._append({"op": "replace", "doc_id": doc_id, "doc": dict(data)})
+            return [doc_id]
     
     def remove(self, doc_id):
         """Remove a document by ID."""
-        return self.db.remove(doc_ids=[doc_id])
+        with self._writing():
+            if self.stored.pop(doc_id, None) is None:
+                return []
+            self._apply(doc_id, None)
+            self._append({"op": "remove", "doc_id": doc_id})
+            return [doc_id]
+    
+    def clear(self):
+        """Clear all documents."""
+        with self._writing():
+            self._apply_clear()
+            self.stored = {}
+            self.next_id = 1
+            self._append({"op": "truncate"})
+    
+    def vacuum(self, renumber=False):
+        """Fold the log into a fresh snapshot; return their size before and after.
+        
+        ``renumber`` gives documents consecutive IDs first (app stopped only).
+        Expired soft deletes are purged first; renumbering drops the rest.
+        """
+        self.purge()
+        with self._writing():
+            before = _file_size(self.snapshot_path) + _file_size(self.log_path)
+            if renumber:
+                docs = _compact_ids(self._snapshot().values())
+                self.stored = {doc_id: dict(doc) for doc_id, doc in docs.items()}
+                self.next_id = max(self.stored, default=0) + 1
+                self._invalidate()
+            self.checkpoint()
+        return before, _file_size(self.snapshot_path) + _file_size(self.log_path)
+
+
+def _apply_log_record(table, record):
+    """Apply one log record to a {doc_id: doc} dict."""
+    op = record["op"]
+    key = record.get("doc_id")
+    if op in ("insert", "replace"):
+        table[key] = record["doc"]
+    elif op == "update":
+        if key in table:
+            table[key].update(record["fields"])
+    elif op == "remove":
+        table.pop(key, None)
+    elif op == "truncate":
+        table.clear()
+
+
+BACKENDS = {
+    "tinydb": Database,
+    "log": LogDatabase,
+    "sqlite": SQLiteDatabase,
+}
+
+
+@contextmanager
+def batch(*databases):
+    """Batch writes across several tables.
+    
+    Each table is written once when the block exits, and none of them are
+    written if it raises. Tables commit one after another, so a failure
+    during the final writes can still leave earlier tables committed.
+    """
+    with ExitStack() as stack:
+        for database in databases:
+            stack.enter_context(database.transaction())
+        yield
+
+
+def open_database(name, partition_by=None, **options):
+    """Open a table with the backend selected by DB_BACKEND.
+    
+    With ``partition_by`` the table is split into one table per year of
+    that field (see PartitionedDatabase).
+    """
+    if DB_BACKEND not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND '{DB_BACKEND}', expected one of {sorted(BACKENDS)}")
+    DATA_DIR.mkdir(exist_ok=True)
+    if partition_by:
+        return PartitionedDatabase(name, partition_by, **options)
+    return BACKENDS[DB_BACKEND](name, **options)
+
+
+def _table_path(name):
+    """Return the data/ file for a table in DB_FORMAT.
+    
+    Refuses to start an empty file while the table still exists in another
+    format, which would otherwise look as if all its data had vanished.
+    """
+    path = DATA_DIR / f"{name}{formats.suffix(DB_FORMAT, DB_COMPRESS)}"
+    if not path.exists():
+        for table, other in _table_files():
+            if table == name:
+                flags = f"--format={DB_FORMAT}" + (" --zstd" if DB_COMPRESS else "")
+                raise RuntimeError(
+                    f"{other.name} is not stored as DB_FORMAT={DB_FORMAT}; "
+                    f"run `python -m utils.db migrate {flags}` first"
+                )
+    return path
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _compact_ids(docs):
+    """Map documents onto consecutive IDs, in their current order.
+    
+    Numbering starts just above the partition base of the lowest ID, so
+    documents in a yearly partition keep their year prefix.
+    """
+    docs = sorted(docs, key=lambda doc: doc.doc_id)
+    if not docs:
+        return {}
+    first = docs[0].doc_id // PARTITION_ID_SPAN * PARTITION_ID_SPAN + 1
+    return {first + i: doc for i, doc in enumerate(docs)}
+
+
+def _table_files():
+    """Yield (table name, path) for every table file in data/, in any format."""
+    if not DATA_DIR.exists():
+        return
+    for path in sorted(DATA_DIR.iterdir()):
+        for suffix in formats.SUFFIXES:
+            if path.name.endswith(suffix):
+                yield path.name[:-len(suffix)], path
+                break
+
+
+# (signature, names) for _table_names(); the signature changes when a table is added
+_catalog = (None, set())
+
+
+def _table_names():
+    """Return the names of all tables the current backend holds."""
+    global _catalog
+    if DB_BACKEND == "sqlite":
+        conn, lock = SQLiteDatabase._connect(SQLITE_PATH)
+        with lock:
+            signature = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if signature != _catalog[0]:
+                rows = conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+                ).fetchall()
+                _catalog = (signature, {row[0] for row in rows} - {SQLiteDatabase.VERSIONS_TABLE})
+        return _catalog[1]
+    try:
+        signature = DATA_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        return set()
+    if signature != _catalog[0]:
+        names = {name for name, _ in _table_files()}
+        names.update(path.stem for path in DATA_DIR.glob("*.log"))
+        _catalog = (signature, names)
+    return _catalog[1]
+
+
+# Documents in a partitioned table get IDs of year * PARTITION_ID_SPAN + n,
+# so the ID alone says which partition holds the document
+PARTITION_ID_SPAN = 10 ** 6
+
+
+def _partition_year(value):
+    """Return the year of an ISO date string, or 0 if there is none."""
+    value = _iso(value)
+    if isinstance(value, str) and value[:4].isdigit():
+        return int(value[:4])
+    return 0
+
+
+class PartitionedDatabase:
+    """One logical table stored as one table per year of ``field``.
+    
+    ``journal`` is kept as ``journal_2023``, ``journal_2024`` and so on, plus
+    ``journal_undated`` for documents without a usable date. Each is opened
+    with the configured backend the first time it is needed. Queries on
+    ``field`` only touch the years in their range, and writes to any year
+    work the same.
+    
+    The current and previous year are the hot tier and stay in memory.
+    Older years are cold, and only the ``cold_cache`` most recently used
+    stay loaded. ``stream`` walks the years one at a time and releases cold
+    ones straight after, so an all-time pass never holds every year at once.
+    
+    An existing unpartitioned table is split into years on first open.
+    Documents get new IDs in the process. One that repeats a unique value
+    of an earlier one is moved, unchanged, to ``<name>_duplicates``.
+    """
+    
+    def __init__(self, name, field="date", unique=(), ordered=(), indexed=(), text=(), substring=(), vectors=(),
+                 cold_cache=2):
+        self.name = name
+        self.field = field
+        self.unique = unique
+        self.ordered = tuple(ordered) if field in ordered else (field,) + tuple(ordered)
+        self.indexed = indexed
+        self.text = text
+        self.substring = substring
+        self.vectors = vectors
+        self.cold_cache = cold_cache
+        self.partitions = {}
+        self.cold = []  # Loaded cold years, least recently used first
+        self.partitions_lock = threading.Lock()
+        self.lock = threading.RLock()
+        self.transaction_stack = None
+        self.joined = set()
+        self._subscribers = ()
+        self._migrate_unpartitioned()
+    
+    @contextmanager
+    def transaction(self):
+        """Group writes; each partition written joins with its own transaction.
+        
+        Every partition commits or rolls back together when the block ends.
+        Nested transactions join the outermost one.
+        """
+        with self.lock:
+            if self.transaction_stack is not None:
+                yield self
+                return
+            with ExitStack() as stack:
+                self.transaction_stack, self.joined = stack, set()
+                try:
+                    yield self
+                finally:
+                    self.transaction_stack = None
+    
+    batch = transaction
+    
+    @property
+    def version(self):
+        with self.partitions_lock:
+            partitions = list(self.partitions.values())
+        return sum(db.version for db in partitions) + len(partitions)
+    
+    def on_change(self, callback):
+        """Call ``callback(table)`` after every change to any partition."""
+        self._subscribers = self._subscribers + (callback,)
+        
+        def unsubscribe():
+            self._subscribers = tuple(cb for cb in self._subscribers if cb is not callback)
+        return unsubscribe
+    
+    def _partition_changed(self, db):
+        for callback in self._subscribers:
+            callback(self)
+    
+    def flush(self):
+        """Save changes held back by write-behind in every partition."""
+        with self.partitions_lock:
+            partitions = list(self.partitions.values())
+        for db in partitions:
+            db.flush()
+    
+    def _partition_name(self, year):
+        return f"{self.name}_{year}" if year else f"{self.name}_undated"
+    
+    def _years(self):
+        """Return every year that has a partition, ascending (0 = undated)."""
+        prefix = f"{self.name}_"
+        years = set(self.partitions)
+        for table in _table_names():
+            suffix = table[len(prefix):] if table.startswith(prefix) else ""
+            if suffix == "undated":
+                years.add(0)
+            elif len(suffix) == 4 and suffix.isdigit():
+                years.add(int(suffix))
+        return sorted(years)
+    
+    def _years_between(self, start, end):
+        if start is None and end is None:
+            return self._years()
+        low = _partition_year(start) if start is not None else 1
+        high = _partition_year(end) if end is not None else 9999
+        return [year for year in self._years() if year and low <= year <= high]
+    
+    def _partition(self, year, write=False, keep=True):
+        """Return the table for ``year``, or None if it does not exist yet.
+        
+        Writes create the partition and, inside a transaction, join it.
+        ``keep`` counts the access for the cold-tier cache.
+        """
+        evicted = []
+        with self.partitions_lock:
+            db = self.partitions.get(year)
+            if db is None:
+                if not write and year not in self._years():
+                    return None
+                db = open_database(
+                    self._partition_name(year), unique=self.unique, ordered=self.ordered,
+                    indexed=self.indexed, text=self.text, substring=self.substring, vectors=self.vectors
+                )
+                db.on_change(self._partition_changed)
+                self.partitions[year] = db
+            if keep:
+                evicted = self._touch(year)
+        for cold_db in evicted:
+            cold_db.release()
+        if write and self.transaction_stack is not None and year not in self.joined:
+            self.transaction_stack.enter_context(db.transaction())
+            self.joined.add(year)
+        return db
+    
+    def _is_hot(self, year):
+        return year >= date.today().year - 1
+    
+    def _touch(self, year):
+        """Mark a cold year as used; return the tables pushed out of the cache."""
+        if self._is_hot(year):
+            return []
+        if year in self.cold:
+            self.cold.remove(year)
+        self.cold.append(year)
+        evicted = []
+        while len(self.cold) > self.cold_cache:
+            evicted.append(self.partitions[self.cold.pop(0)])
+        return evicted
+    
+    def _each_partition(self, years, keep=True):
+        """Yield (year, table) for existing partitions, releasing passed-over cold ones."""
+        for year in years:
+            db = self._partition(year, keep=keep)
+            if db is None:
+                continue
+            try:
+                yield year, db
+            finally:
+                if not keep and not self._is_hot(year) and year not in self.cold:
+                    db.release()
+    
+    def _migrate_unpartitioned(self):
+        """Split a table written before partitioning into per-year tables."""
+        if self.name not in _table_names():
+            return
+        legacy = open_database(self.name)
+        with legacy.transaction():
+            docs = legacy.get_all()
+            if not docs:
+                return
+            duplicates = []
+            with self.transaction():
+                for doc in sorted(docs, key=lambda doc: doc.doc_id):
+                    try:
+                        self.insert(dict(doc))
+                    except ValueError as exc:
+                        # Repeats a unique value of an earlier document; merging would lose one of them
+                        duplicates.append((doc, exc))
+            if duplicates:
+                kept = open_database(f"{self.name}_duplicates")
+                with kept.transaction():
+                    for doc, exc in duplicates:
+                        kept.insert(dict(doc))
+                        print(f"⚠️  {self.name}: {exc}; moved document {doc.doc_id} "
+                              f"to {self.name}_duplicates", file=sys.stderr)
+            # Every partition has committed, so emptying the old table is safe
+            legacy.clear()
+    
+    def stream(self, start=None, end=None, newest_first=False, field=None):
+        """Yield documents ordered by ``field``, one partition at a time.
+        
+        Without bounds undated documents are included, ahead of the rest.
+        Cold partitions are released once read. Bounds on another
+        ``field`` are checked document by document over every partition.
+        """
+        start, end = _iso(start), _iso(end)
+        if field not in (None, self.field):
+            for doc in self.stream(newest_first=newest_first):
+                if isinstance(doc.get(field), str) and _in_range(doc[field], start, end):
+                    yield doc
+            return
+        years = self._years_between(start, end)
+        for year, db in self._each_partition(reversed(years) if newest_first else years, keep=False):
+            docs = db.range(self.field, start, end) if year else db.get_all()
+            yield from reversed(docs) if newest_first else docs
+    
+    def latest(self, n):
+        """Return the ``n`` newest documents, newest first."""
+        return list(itertools.islice(self.stream(newest_first=True), n))
+    
+    def insert(self, data):
+        """Insert a document into the partition for its year."""
+        year = _partition_year(data.get(self.field))
+        with self.transaction():
+            db = self._partition(year, write=True)
+            # An empty partition would start at ID 1; later IDs follow the max.
+            # Soft-deleted documents still hold their IDs, so they count too.
+            empty = not db.count() and not db._tombstones()
+            doc_id = year * PARTITION_ID_SPAN + 1 if empty else None
+            return db.insert(data, doc_id)
+    
+    def get_all(self):
+        """Get all documents, oldest year first."""
+        return [doc for _, db in self._each_partition(self._years()) for doc in db.get_all()]
+    
+    def count(self):
+        """Return the number of documents in every year."""
+        return sum(db.count() for _, db in self._each_partition(self._years(), keep=False))
+    
+    def release(self):
+        """Drop every loaded year from memory (see Database.release)."""
+        with self.partitions_lock:
+            partitions = list(self.partitions.values())
+            self.cold = []
+        for db in partitions:
+            db.release()
+    
+    def _view(self):
+        """Return a Snapshot of every year, for code written against a single table.
+        
+        It holds all the documents but no indexes, so prefer the query methods.
+        """
+        version = self.version
+        return Snapshot(version, {doc.doc_id: doc for doc in self.stream()}, {}, {})
+    
+    def update(self, data, doc_id, replace=False):
+        """Update a document by ID.
+        
+        If ``field`` moves to another year the document moves partition
+        and gets a new ID, which is returned.
+        """
+        year = doc_id // PARTITION_ID_SPAN
+        with self.transaction():
+            if year not in self._years():
+                return []
+            db = self._partition(year, write=True)
+            doc = db.get(doc_id)
+            if doc is None:
+                return []
+            new_doc = dict(data) if replace else {**doc, **data}
+            if _partition_year(new_doc.get(self.field)) == year:
+                return db.replace(new_doc, doc_id) if replace else db.update(data, doc_id)
+            db.remove(doc_id)
+            return [self.insert(new_doc)]
+    
+    def replace(self, data, doc_id):
+        """Replace a document's content by ID, dropping fields not in ``data``."""
+        return self.update(data, doc_id, replace=True)
+    
+    def get(self, doc_id):
+        """Get a document by ID."""
+        db = self._partition(doc_id // PARTITION_ID_SPAN)
+        return db.get(doc_id) if db is not None else None
+    
+    def get_by(self, field, value):
+        """Get the first document whose ``field`` equals ``value``."""
+        if field != self.field:
+            return next((doc for doc in self.stream() if doc.get(field) == value), None)
+        db = self._partition(_partition_year(value))
+        return db.get_by(field, value) if db is not None else None
+    
+    def upsert_by(self, field, data):
+        """Update the document matching ``data[field]``, or insert ``data``."""
+        with self.transaction():
+            existing = self.get_by(field, data[field])
+            if existing:
+                updated = self.update(data, existing.doc_id)
+                return updated[0] if updated else existing.doc_id
+            return self.insert(data)
+    
+    def range(self, field, start=None, end=None):
+        """Get documents whose ``field`` lies between ``start`` and ``end``.
+        
+        On the partition field only the years in range are read.
+        """
+        if field != self.field:
+            start, end = _iso(start), _iso(end)
+            matches = [
+                doc for doc in self.stream()
+                if isinstance(doc.get(field), str) and _in_range(doc[field], start, end)
+            ]
+            return sorted(matches, key=lambda doc: doc[field])
+        years = self._years_between(_iso(start), _iso(end))
+        return [doc for _, db in self._each_partition(years) for doc in db.range(field, start, end)]
+    
+    def remove(self, doc_id):
+        """Remove a document by ID."""
+        year = doc_id // PARTITION_ID_SPAN
+        with self.transaction():
+            if year not in self._years():
+                return []
+            return self._partition(year, write=True).remove(doc_id)
+    
+    def delete(self, doc_id):
+        """Soft-delete a document by ID (see Database.delete)."""
+        year = doc_id // PARTITION_ID_SPAN
+        # No transaction of our own, which would save the tombstone straight away
+        with self.lock:
+            if year not in self._years():
+                return False
+            return self._partition(year, write=True).delete(doc_id)
+    
+    def restore(self, doc_id):
+        """Bring back a soft-deleted document (see Database.restore)."""
+        year = doc_id // PARTITION_ID_SPAN
+        with self.transaction():
+            if year not in self._years():
+                return False
+            return self._partition(year, write=True).restore(doc_id)
+    
+    def purge(self, age=None):
+        """Purge expired soft deletes from every partition; return how many."""
+        return sum(db.purge(age) for _, db in self._each_partition(self._years(), keep=False))
+    
+    def search_text(self, query, limit=20):
+        """Rank documents for ``query`` across every year (see Database.search_text).
+        
+        BM25 statistics are summed over the partitions, so scores from
+        different years compare. A year whose index is up to date is ranked
+        without loading it; only the years holding the best hits are read.
+        """
+        if not self.text:
+            raise ValueError(f"{self.name} has no text index; open it with text=(fields...)")
+        searched = []
+        for _, db in self._each_partition(self._years(), keep=False):
+            if not db._index_current(db.text_index):
+                db._synced_view(db.text_index)
+            searched.append(db)
+        terms = list(dict.fromkeys(term for db in searched for term in db.text_index.terms(query)))
+        stats = [db.text_index.stats(terms) for db in searched]
+        merged = (
+            sum(documents for documents, _, _ in stats),
+            sum(length for _, length, _ in stats),
+            {term: sum(counts[term] for _, _, counts in stats) for term in terms},
+        )
+        # Every hit of every year, best first, so hits dropped below (soft-deleted
+        # meanwhile) never push out live ones that a per-year limit would have cut
+        ranked = heapq.merge(
+            *([(score, doc_id, db) for doc_id, score in db.text_index.score(terms, merged, None)] for db in searched),
+            key=lambda hit: (-hit[0], hit[1]),
+        )
+        hits = []
+        for score, doc_id, db in ranked:
+            doc = self.get(doc_id)
+            if doc is not None:
+                hits.append((doc, score, db.text_index.snippet(doc, terms)))
+            if len(hits) == limit:
+                break
+        return hits
+    
+    def similar(self, texts, limit=5):
+        """Return the documents most like each of ``texts`` across every year (see Database.similar).
+        
+        Word weights are computed over all the partitions, so similarities
+        from different years compare. As with search_text, years whose index
+        is up to date are searched without loading them.
+        """
+        if not self.vectors:
+            raise ValueError(f"{self.name} has no vector index; open it with vectors=(fields...)")
+        searched = []
+        for _, db in self._each_partition(self._years(), keep=False):
+            if not db._index_current(db.vector_index):
+                db._synced_view(db.vector_index)
+            searched.append(db)
+        if not searched:
+            return [[] for _ in texts]
+        queries = searched[0].vector_index.vectors(texts)
+        stats = [db.vector_index.stats() for db in searched]
+        merged = (sum(documents for documents, _ in stats), sum(frequencies for _, frequencies in stats))
+        per_year = [db.vector_index.search(queries, limit, merged) for db in searched]
+        ranked = [
+            sorted((hit for hits in per_year for hit in hits[position]), key=lambda hit: -hit[1])[:limit]
+            for position in range(len(texts))
+        ]
+        # Fetch the hits a year at a time, so each cold year is loaded once for the whole batch
+        wanted = sorted({doc_id for hits in ranked for doc_id, _ in hits})
+        docs = {}
+        for year, group in itertools.groupby(wanted, lambda doc_id: doc_id // PARTITION_ID_SPAN):
+            for _, db in self._each_partition([year], keep=False):
+                docs.update((doc_id, db.get(doc_id)) for doc_id in group)
+        return [[(docs[doc_id], score) for doc_id, score in hits if docs.get(doc_id)] for hits in ranked]
+    
+    def search_substring(self, text):
+        """Return documents holding ``text`` in every year (see Database.search_substring)."""
+        if not self.substring:
+            raise ValueError(f"{self.name} has no substring index; open it with substring=(fields...)")
+        return [
+            doc for _, db in self._each_partition(self._years(), keep=False) for doc in db.search_substring(text)
+        ]
     
     def search(self, query):
         """Search documents."""
-        return self.db.search(query)
+        return [doc for _, db in self._each_partition(self._years(), keep=False) for doc in db.search(query)]
+    
+    def select(self):
+        """Start a query on this table (see Select)."""
+        return Select(self)
+    
+    def _query_years(self, query):
+        """Return the years that can hold matches, judged by tests on ``field``."""
+        years = self._years()
+        for op, field, operand in query.conditions:
+            if field != self.field:
+                continue
+            if op == "range" and _string_bounds(operand):
+                wanted = set(self._years_between(*operand))
+            elif op in ("==", "in"):
+                wanted = {_partition_year(value) for value in (operand if op == "in" else [operand])}
+            else:
+                continue
+            years = [year for year in years if year in wanted]
+        return years
+    
+    def _run(self, query):
+        """Run ``query`` on each partition it can match in and merge the results.
+        
+        Ordered by ``field``, years are read in that order and reading
+        stops once ``limit`` rows are found.
+        """
+        years = self._query_years(query)
+        if query.order and query.order[0] == self.field:
+            dated = [year for year in years if year]
+            years = (dated[::-1] if query.order[1] else dated) + [year for year in years if not year]
+            rows = []
+            for _, db in self._each_partition(years, keep=False):
+                rows.extend(db._run(query))
+                if query.max_rows is not None and len(rows) >= query.max_rows:
+                    break
+            return rows[:query.max_rows]
+        rows = [doc for _, db in self._each_partition(years, keep=False) for doc in db._run(query)]
+        if query.order:
+            rows = _sorted_docs(rows, *query.order)
+        return rows[:query.max_rows]
+    
+    def _count(self, query):
+        years = self._query_years(query)
+        total = sum(db._count(query) for _, db in self._each_partition(years, keep=False))
+        return total if query.max_rows is None else min(total, query.max_rows)
+    
+    def _explain(self, query):
+        years = self._query_years(query)
+        lines = [f"{self.name}: {len(years)} of {len(self._years())} yearly partitions"]
+        for _, db in self._each_partition(years, keep=False):
+            lines.extend(f"  {line}" for line in db._explain(query).splitlines())
+        return "\n".join(lines)
     
     def clear(self):
         """Clear all documents."""
-        return self.db.truncate()
+        with self.transaction():
+            for year in self._years():
+                self._partition(year, write=True).clear()
+
+
+class LazyDatabase:
+    """Stand-in for a table that opens and parses it on first use.
+    
+    Module-level tables are created this way so importing utils.db costs
+    nothing, and a page only pays for the tables it touches. The opened
+    table is shared by every session in the process.
+    """
+    
+    def __init__(self, name, **options):
+        self._lazy_name = name
+        self._lazy_options = options
+        self._lazy_target = None
+        self._lazy_lock = threading.Lock()
+    
+    def _open(self):
+        if self._lazy_target is None:
+            with self._lazy_lock:
+                if self._lazy_target is None:
+                    self._lazy_target = open_database(self._lazy_name, **self._lazy_options)
+        return self._lazy_target
+    
+    @property
+    def is_open(self):
+        return self._lazy_target is not None
+    
+    def __getattr__(self, attr):
+        return getattr(self._open(), attr)
+    
+    def __repr__(self):
+        state = "open" if self.is_open else "not opened"
+        return f"<LazyDatabase {self._lazy_name} ({state})>"
+
+
+def migrate_json_to_sqlite(path=None, force=False):
+    """Copy the existing data/*.json tables into the SQLite database.
+    
+    Document IDs are preserved. Tables that already hold rows are skipped
+    unless ``force`` is set, so the migration is safe to run twice.
+    """
+    migrated = {}
+    for name, table_file in _table_files():
+        target = SQLiteDatabase(name, path=path)
+        if target.get_all() and not force:
+            print(f"⏭️  Skipping {name}: SQLite table is not empty")
+            continue
+        docs = (FileStorage(table_file).read() or {}).get("_default", {})
+        with target.transaction():
+            target.clear()
+            for doc_id, doc in docs.items():
+                target.insert(doc, int(doc_id))
+        migrated[name] = len(docs)
+        print(f"✅ {name}: {len(docs)} documents")
+    return migrated
+
+
+def migrate_format(fmt, compress=False):
+    """Rewrite every table file in data/ as ``fmt``, optionally zstd-framed.
+    
+    Works in any direction, including back to indented JSON. Each file is
+    written next to the old one and swapped in before the old one is
+    removed. Log files are left alone; they replay over any format. Stop
+    the app first.
+    """
+    formats.check(fmt, compress)
+    converted = {}
+    for name, source in list(_table_files()):
+        target = DATA_DIR / f"{name}{formats.suffix(fmt, compress)}"
+        if target != source and target.exists():
+            print(f"⏭️  Skipping {source.name}: {target.name} already exists")
+            continue
+        raw = source.read_bytes()
+        FileStorage(target, fmt, compress).write(formats.decode(raw) or {})
+        if target != source:
+            source.unlink()
+        converted[name] = (len(raw), target.stat().st_size)
+        print(f"✅ {source.name} → {target.name}: {len(raw):,} → {target.stat().st_size:,} bytes")
+    return converted
+
+
+# Tables whose IDs are stored in other tables (habit_entries keep habit IDs)
+REFERENCED_TABLES = {"habits"}
+
+
+def vacuum(renumber=False):
+    """Compact every table of the current backend and report bytes reclaimed.
+    
+    Each table is rewritten under its write lock, in the lock file too, so
+    this is safe while the app runs: with DB_MULTIPROCESS it takes that lock
+    for every write, and otherwise around every save (see Database._saving).
+    ``renumber`` also compacts document IDs in tables nothing refers to.
+    Run that only with the app stopped. Returns {table: (bytes before,
+    bytes after)}.
+    """
+    results = {}
+    for name in sorted(_table_names()):
+        options = {} if DB_BACKEND == "sqlite" else {"shared": True}
+        db = BACKENDS[DB_BACKEND](name, **options)
+        sizes = db.vacuum(renumber=renumber and name not in REFERENCED_TABLES)
+        if sizes is not None:
+            results[name] = sizes
+            print(f"🧹 {name}: {sizes[0]:,} → {sizes[1]:,} bytes")
+        if isinstance(db, LogDatabase):
+            db.log_file.close()
+    for leftover in DATA_DIR.glob("*.tmp"):
+        # Left by saves that were killed; a save in progress is never this old
+        try:
+            if time.time() - leftover.stat().st_mtime > 600:
+                leftover.unlink()
+        except FileNotFoundError:
+            pass
+    if DB_BACKEND == "sqlite":
+        results[SQLITE_PATH.name] = SQLiteDatabase.vacuum_file()
+        print(f"🧹 {SQLITE_PATH.name}: {results[SQLITE_PATH.name][0]:,} → "
+              f"{results[SQLITE_PATH.name][1]:,} bytes")
+    reclaimed = sum(before - after for before, after in results.values())
+    print(f"Reclaimed {reclaimed:,} bytes")
+    return results
 
 
 # Database instances
-tasks_db = Database("tasks")
-journal_db = Database("journal")
-habits_db = Database("habits")
-notes_db = Database("notes")
-settings_db = Database("settings")
-health_db = Database("health")
-finance_db = Database("finance")
-contacts_db = Database("contacts")
-gratitude_db = Database("gratitude")
-goals_db = Database("goals")
-events_db = Database("events")
+tasks_db = LazyDatabase(
+    "tasks", ordered=("date", "deadline", "completed_at", "created_at"), indexed=("status", "priority", "tags"),
+    text=("title", "description", "tags"),
+)
+journal_db = LazyDatabase(
+    "journal", partition_by="date", unique=("date",), text=("content",), vectors=("content",)
+)
+habits_db = LazyDatabase("habits", indexed=("active",))
+habit_entries_db = LazyDatabase("habit_entries", unique=("key",), ordered=("key",))
+notes_db = LazyDatabase(
+    "notes", indexed=("tags",), text=("title", "content", "tags"), substring=("title", "content", "tags")
+)
+settings_db = LazyDatabase("settings", unique=("key",), ordered=("key",))
+settings_archive_db = LazyDatabase("settings_archive", unique=("key",), ordered=("key",))
+health_db = LazyDatabase("health", partition_by="date", unique=("date",))
+finance_db = LazyDatabase("finance", partition_by="date", text=("description", "category", "tags"))
+contacts_db = LazyDatabase(
+    "contacts", substring=("name", "company", "tags"), prefix=("name", "company", "tags"),
+    text=("name", "company", "email", "tags", "notes"),
+)
+GRATITUDE_FIELDS = ("gratitude_1", "gratitude_2", "gratitude_3", "wins", "lessons", "challenges", "intention")
+gratitude_db = LazyDatabase(
+    "gratitude", partition_by="date", unique=("date",), text=GRATITUDE_FIELDS, vectors=GRATITUDE_FIELDS
+)
+goals_db = LazyDatabase("goals", ordered=("deadline",), text=("title", "description"))
+events_db = LazyDatabase("events", ordered=("date",), text=("title", "description"))
+
+
+class SettingsStore:
+    """Key-value store over the settings table.
+    
+    Values live in a dict that is written through on every put and rebuilt
+    only when the table changes elsewhere, so gets are plain dict lookups.
+    Keys ending in a date (``priorities_2024-01-31``) can be moved to an
+    archive table so they stop growing the hot one; reads fall back to it.
+    """
+    
+    DATED_KEY = re.compile(r"_(\d{4}-\d{2}-\d{2})$")
+    
+    def __init__(self, db, archive_db):
+        self.db = db
+        self.archive_db = archive_db
+        # (table version, {key: value}), swapped as a whole so threads
+        # never see a half-built dict
+        self.cache = (None, {})
+    
+    def _values(self):
+        """Return the key -> value dict, reloading it if the table changed."""
+        current = self.db.version
+        version, values = self.cache
+        if version != current:
+            # Read after the version, so a change meanwhile only means one reload too many
+            values = {doc["key"]: doc.get("value") for doc in self.db.get_all() if "key" in doc}
+            self.cache = (current, values)
+        return values
+    
+    def get(self, key, default=None):
+        """Get a setting value."""
+        values = self._values()
+        if key in values:
+            return values[key]
+        if self.DATED_KEY.search(key):
+            archived = self.archive_db.get_by("key", key)
+            if archived:
+                return archived.get("value", default)
+        return default
+    
+    def get_many(self, keys, default=None):
+        """Get several settings as a {key: value} dict.
+        
+        ``keys`` may also be a {key: default} dict to give each key its own
+        default.
+        """
+        values = self._values()
+        if isinstance(keys, dict):
+            return {key: values.get(key, fallback) for key, fallback in keys.items()}
+        return {key: values.get(key, default) for key in keys}
+    
+    def get_prefix(self, prefix):
+        """Get every setting whose key starts with ``prefix``."""
+        return {doc["key"]: doc.get("value") for doc in self.db.range("key", prefix, prefix)}
+    
+    def put(self, key, value):
+        """Set a setting value."""
+        self.put_many({key: value})
+    
+    def put_many(self, items):
+        """Set several settings with a single write."""
+        with self.db.transaction():
+            values = self._values()
+            for key, value in items.items():
+                self.db.upsert_by("key", {"key": key, "value": value})
+            self.cache = (self.db.version, {**values, **items})
+    
+    def archive_dated(self, before=None):
+        """Move dated keys older than ``before`` (default 30 days ago) to the archive.
+        
+        Returns the number of keys moved.
+        """
+        cutoff = _iso(before or date.today() - timedelta(days=30))
+        moved = []
+        for doc in self.db.get_all():
+            match = self.DATED_KEY.search(doc.get("key", ""))
+            if match and match.group(1) < cutoff:
+                moved.append(doc)
+        if moved:
+            with batch(self.archive_db, self.db):
+                for doc in moved:
+                    self.archive_db.upsert_by("key", dict(doc))
+                    self.db.remove(doc.doc_id)
+        return len(moved)
+
+
+settings = SettingsStore(settings_db, settings_archive_db)
 
 
 def get_setting(key, default=None):
     """Get a setting value."""
-    Q = Query()
-    result = settings_db.search(Q.key == key)
-    if result:
-        return result[0].get("value", default)
-    return default
+    return settings.get(key, default)
 
 
 def set_setting(key, value):
     """Set a setting value."""
-    Q = Query()
-    existing = settings_db.search(Q.key == key)
-    if existing:
-        settings_db.update({"value": value}, existing[0].doc_id)
-    else:
-        settings_db.insert({"key": key, "value": value})
+    settings.put(key, value)
 
 
 def get_journal_entry(entry_date):
     """Get journal entry for a specific date."""
-    Q = Query()
     date_str = entry_date.strftime("%Y-%m-%d") if isinstance(entry_date, date) else entry_date
-    result = journal_db.search(Q.date == date_str)
-    return result[0] if result else None
+    return journal_db.get_by("date", date_str)
 
 
 def save_journal_entry(entry_date, content, mood=None, energy=None, stress=None):
     """Save or update a journal entry."""
-    Q = Query()
     date_str = entry_date.strftime("%Y-%m-%d") if isinstance(entry_date, date) else entry_date
     
     data = {
@@ -97,78 +2931,159 @@ def save_journal_entry(entry_date, content, mood=None, energy=None, stress=None)
         "updated_at": datetime.now().isoformat()
     }
     
-    existing = journal_db.search(Q.date == date_str)
-    if existing:
-        journal_db.update(data, existing[0].doc_id)
-        return existing[0].doc_id
-    else:
-        return journal_db.insert(data)
+    return journal_db.upsert_by("date", data)
 
 
 def get_tasks_by_status(status=None):
     """Get tasks filtered by status."""
     if status:
-        Q = Query()
-        return tasks_db.search(Q.status == status)
+        return tasks_db.select().where(status=status).all()
     return tasks_db.get_all()
 
 
 def get_tasks_for_date(target_date):
     """Get tasks for a specific date."""
-    Q = Query()
     date_str = target_date.strftime("%Y-%m-%d") if isinstance(target_date, date) else target_date
-    return tasks_db.search(Q.date == date_str)
+    return tasks_db.select().where(date=date_str).all()
 
 
 def get_habits_active():
     """Get all active habits."""
-    Q = Query()
-    return habits_db.search(Q.active == True)
+    return habits_db.select().where(active=True).all()
 
 
-def get_habit_entries(habit_id, start_date=None, end_date=None):
-    """Get habit entries for a specific habit."""
-    # Habit entries are stored within the habit document
-    habit = habits_db.get(doc_id=habit_id)
-    if not habit:
-        return []
-    
-    entries = habit.get("entries", [])
-    
-    if start_date or end_date:
-        filtered = []
-        for entry in entries:
-            entry_date = datetime.fromisoformat(entry["date"]).date()
-            if start_date and entry_date < start_date:
-                continue
-            if end_date and entry_date > end_date:
-                continue
-            filtered.append(entry)
-        return filtered
+def _habit_entry_key(habit_id, date_str=""):
+    """Key of a habit entry; sorts by habit first, then by date."""
+    return f"{habit_id}:{date_str}"
+
+
+_habit_entries_migrated = False
+
+
+def migrate_habit_entries():
+    """Move completions embedded in habit documents into habit_entries.
     
-    return entries
+    Older versions kept every completion in the habit's ``entries`` list.
+    This runs before the first habit entry access, and returns the number
+    of entries moved.
+    """
+    global _habit_entries_migrated
+    legacy = [habit.doc_id for habit in habits_db.get_all() if "entries" in habit]
+    moved = 0
+    if legacy:
+        with batch(habit_entries_db, habits_db):
+            for doc_id in legacy:
+                # Read again under the lock: the habit may have changed since the scan
+                habit = habits_db.get(doc_id)
+                if habit is None or "entries" not in habit:
+                    continue
+                for entry in habit["entries"]:
+                    habit_entries_db.upsert_by("key", {
+                        "key": _habit_entry_key(habit.doc_id, entry["date"]),
+                        "habit_id": habit.doc_id,
+                        "date": entry["date"],
+                        "completed": entry.get("completed", False)
+                    })
+                    moved += 1
+                habits_db.replace({k: v for k, v in habit.items() if k != "entries"}, habit.doc_id)
+    _habit_entries_migrated = True
+    return moved
+
+
+def get_habit_entries(habit_id, start_date=None, end_date=None):
+    """Get habit entries for a specific habit, oldest first."""
+    if not _habit_entries_migrated:
+        migrate_habit_entries()
+    start = _habit_entry_key(habit_id, _iso(start_date) or "")
+    end = _habit_entry_key(habit_id, _iso(end_date) or "")
+    return habit_entries_db.range("key", start, end)
+
+
+def get_habit_entry(habit_id, entry_date):
+    """Get a habit's entry for a specific date."""
+    if not _habit_entries_migrated:
+        migrate_habit_entries()
+    date_str = entry_date.strftime("%Y-%m-%d") if isinstance(entry_date, date) else entry_date
+    return habit_entries_db.get_by("key", _habit_entry_key(habit_id, date_str))
 
 
 def add_habit_entry(habit_id, entry_date, completed=True):
     """Add or update a habit entry."""
-    habit = habits_db.get(doc_id=habit_id)
-    if not habit:
+    if not _habit_entries_migrated:
+        migrate_habit_entries()
+    if not habits_db.get(habit_id):
         return False
     
     date_str = entry_date.strftime("%Y-%m-%d") if isinstance(entry_date, date) else entry_date
-    entries = habit.get("entries", [])
-    
-    # Check if entry already exists
-    for i, entry in enumerate(entries):
-        if entry["date"] == date_str:
-            entries[i]["completed"] = completed
-            habits_db.update({"entries": entries}, habit_id)
-            return True
-    
-    # Add new entry
-    entries.append({
+    habit_entries_db.upsert_by("key", {
+        "key": _habit_entry_key(habit_id, date_str),
+        "habit_id": habit_id,
         "date": date_str,
         "completed": completed
     })
-    habits_db.update({"entries": entries}, habit_id)
     return True
+
+
+def remove_habit(habit_id):
+    """Remove a habit together with its entries."""
+    with batch(habit_entries_db, habits_db):
+        for entry in get_habit_entries(habit_id):
+            habit_entries_db.remove(entry.doc_id)
+        habits_db.remove(habit_id)
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Dashboard database maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    migrate_sqlite = commands.add_parser("migrate-sqlite", help="Copy data/*.json into SQLite")
+    migrate_sqlite.add_argument("--force", action="store_true", help="Overwrite non-empty tables")
+    
+    migrate = commands.add_parser("migrate", help="Convert data/ table files to another format")
+    migrate.add_argument("--format", required=True, choices=formats.FORMATS)
+    migrate.add_argument("--zstd", action="store_true", help="Wrap files in a zstd frame")
+    
+    commands.add_parser("benchmark-formats", help="Compare file size and load time per format")
+    
+    vacuum_command = commands.add_parser("vacuum", help="Compact every table and report bytes reclaimed")
+    vacuum_command.add_argument("--renumber", action="store_true",
+                                help="Also make document IDs consecutive (stop the app first)")
+    
+    stress = commands.add_parser("stress", help="Check concurrent access on a scratch table")
+    stress.add_argument("--writers", type=int, default=8)
+    stress.add_argument("--readers", type=int, default=8)
+    stress.add_argument("--rounds", type=int, default=200)
+    stress.add_argument("--processes", type=int, default=0,
+                        help="Write from this many processes instead of threads")
+    
+    crash = commands.add_parser("crash-test", help="Kill a writer mid-write repeatedly and check the table")
+    crash.add_argument("--rounds", type=int, default=20)
+    crash.add_argument("--rows", type=int, default=500, help="Rows in the scratch table")
+    
+    args = parser.parse_args()
+    if args.command == "migrate-sqlite":
+        migrate_json_to_sqlite(force=args.force)
+        print(f"🎉 Done! Set DB_BACKEND=sqlite to use {SQLITE_PATH.name}")
+    elif args.command == "migrate":
+        migrate_format(args.format, args.zstd)
+        print(f"🎉 Done! Set DB_FORMAT={args.format}" + (" and DB_COMPRESS=zstd" if args.zstd else ""))
+    elif args.command == "benchmark-formats":
+        # db_checks imports utils.db, so it is only loaded for the commands that need it
+        from utils import db_checks
+        db_checks.benchmark_formats()
+    elif args.command == "vacuum":
+        vacuum(args.renumber)
+    elif args.command in ("stress", "crash-test"):
+        from utils import db_checks
+        if args.command == "crash-test":
+            problems = db_checks.crash_test(args.rounds, args.rows)
+        elif args.processes:
+            problems = db_checks.multiprocess_stress_test(args.processes, args.rounds)
+        else:
+            problems = db_checks.stress_test(args.writers, args.readers, args.rounds)
+        for problem in problems:
+            print(f"❌ {problem}")
+        print("🎉 No problems found" if not problems else f"{len(problems)} problems")
+        raise SystemExit(1 if problems else 0)
@@ -0,0 +1,262 @@
+"""Benchmarks and fault-injection checks for utils.db.
+
+Run them through ``python -m utils.db``: ``benchmark-formats`` compares
+the storage formats on data/, ``stress`` drives a scratch table from many
+threads (or processes, with ``--processes``), and ``crash-test`` kills a
+writer mid-save over and over. The checks work on a scratch table in a
+temporary directory with the backend selected by DB_BACKEND, and leave
+data/ alone.
+"""
+import atexit
+import json
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from utils import formats
+from utils.db import DB_BACKEND, BACKENDS, LogDatabase, SQLiteDatabase, _table_files
+
+
+def benchmark_formats(repeat=5):
+    """Compare size and load time of every available format on data/.
+    
+    Each table is decoded once and re-encoded in memory, so nothing on
+    disk changes. Load time is the best of ``repeat`` decodes, summed over
+    all tables. The baseline is the original setup: indented JSON parsed
+    by the standard library. Returns {label: (bytes, seconds)}.
+    """
+    tables = [formats.decode(path.read_bytes()) or {} for _, path in _table_files()]
+    if not tables:
+        print("No table files in data/ - run seed_data.py first")
+        return {}
+    
+    def measure(encode, decode):
+        size, seconds = 0, 0.0
+        for data in tables:
+            raw = encode(data)
+            size += len(raw)
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                decode(raw)
+                timings.append(time.perf_counter() - started)
+            seconds += min(timings)
+        return size, seconds
+    
+    results = {"json (stdlib)": measure(lambda data: json.dumps(data, indent=2).encode(), json.loads)}
+    for compress in (False, True):
+        for fmt in formats.FORMATS:
+            try:
+                formats.check(fmt, compress)
+            except ImportError:
+                continue
+            label = fmt + ("+zstd" if compress else "")
+            results[label] = measure(lambda data: formats.encode(data, fmt, compress), formats.decode)
+    
+    base_size, base_seconds = results["json (stdlib)"]
+    print(f"{'format':<14}{'bytes':>12}{'load ms':>10}{'size':>8}{'load':>7}")
+    for label, (size, seconds) in results.items():
+        print(f"{label:<14}{size:>12,}{seconds * 1000:>10.2f}"
+              f"{size / base_size:>8.0%} {seconds / base_seconds:>6.0%}")
+    return results
+
+
+def stress_test(writers=8, readers=8, rounds=200):
+    """Hammer a scratch table from many threads and check nothing was lost.
+    
+    Each writer bumps a shared counter ``rounds`` times inside a
+    transaction (read-modify-write, so lost updates show up as a short
+    count) and inserts one row per round. Readers check on every pass that
+    get_all, get_by and range agree with each other and that the counter
+    never goes backwards. Returns a list of problems, empty on success.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _scratch_table(tmp)
+        db.insert({"key": "counter", "value": 0})
+        errors = []
+        done = threading.Event()
+        
+        def write(worker):
+            _stress_writes(db, worker, rounds)
+        
+        def read():
+            last = 0
+            while not done.is_set():
+                docs = db.get_all()
+                counter = db.get_by("key", "counter")["value"]
+                rows = db.range("key", "row:", "row:")
+                if counter < last:
+                    errors.append(f"counter went back from {last} to {counter}")
+                if len({doc["key"] for doc in docs}) != len(docs):
+                    errors.append("get_all returned a duplicate key")
+                if [doc["key"] for doc in rows] != sorted(doc["key"] for doc in rows):
+                    errors.append("range returned rows out of order")
+                last = counter
+                time.sleep(0.001)
+        
+        threads = [threading.Thread(target=read) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        started = time.perf_counter()
+        writing = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+        for thread in writing:
+            thread.start()
+        for thread in writing:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        for thread in threads:
+            thread.join()
+        
+        _check_stress_totals(db, writers * rounds, errors)
+        _close_scratch_table(db)
+        # Reopen to check what reached the disk, e.g. with write-behind
+        reopened = _scratch_table(tmp)
+        _check_stress_totals(reopened, writers * rounds, errors)
+        _close_scratch_table(reopened)
+        print(f"{DB_BACKEND}: {writers * rounds} transactions from {writers} threads "
+              f"with {readers} readers in {elapsed:.2f}s")
+    return errors
+
+
+def multiprocess_stress_test(processes=4, rounds=200):
+    """Run the stress writers in separate processes sharing one table.
+    
+    The table is opened in shared mode, as with DB_MULTIPROCESS, so this
+    checks the lock file and change counter rather than the thread lock.
+    Returns a list of problems, empty on success.
+    """
+    import multiprocessing
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _scratch_table(tmp, shared=True)
+        db.insert({"key": "counter", "value": 0})
+        started = time.perf_counter()
+        workers = [
+            multiprocessing.Process(target=_stress_process, args=(tmp, worker, rounds))
+            for worker in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        
+        errors = [f"worker exited with {w.exitcode}" for w in workers if w.exitcode]
+        _check_stress_totals(db, processes * rounds, errors)
+        _close_scratch_table(db)
+        print(f"{DB_BACKEND}: {processes * rounds} transactions from {processes} processes "
+              f"in {elapsed:.2f}s")
+    return errors
+
+
+def crash_test(rounds=20, rows=500):
+    """Kill a writer process mid-write again and again; check the table survives.
+    
+    A child process keeps bumping a counter in a scratch table padded with
+    ``rows`` rows, so each save takes a while, and records every value
+    once its write has returned. It is SIGKILLed at a random moment, and
+    the table must then still load with all its rows and a counter that
+    is the last recorded value (or the one after, if the kill came between
+    the save and the record). Returns a list of problems, empty on success.
+    """
+    import multiprocessing
+    
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _scratch_table(tmp)
+        with db.transaction():
+            db.insert({"key": "counter", "value": 0})
+            for i in range(rows):
+                db.insert({"key": f"row:{i:06d}", "value": "x" * 1000})
+        _close_scratch_table(db)
+        recorded = multiprocessing.Value("q", 0)
+        writing = multiprocessing.Value("b", 0)
+        mid_write = 0
+        for attempt in range(rounds):
+            start = recorded.value
+            writer = multiprocessing.Process(target=_crash_writer, args=(tmp, recorded, writing))
+            writer.start()
+            deadline = time.monotonic() + 30
+            while recorded.value == start and writer.is_alive() and time.monotonic() < deadline:
+                time.sleep(0.001)
+            time.sleep(random.uniform(0, 0.2))
+            writer.kill()
+            writer.join()
+            mid_write += writing.value
+            try:
+                db = _scratch_table(tmp)
+                counter = db.get_by("key", "counter")["value"]
+                found = len(db.range("key", "row:", "row:"))
+            except Exception as exc:
+                errors.append(f"round {attempt}: table unreadable after the kill: {exc!r}")
+                break
+            if not recorded.value <= counter <= recorded.value + 1:
+                errors.append(f"round {attempt}: counter is {counter}, "
+                              f"writer recorded {recorded.value}")
+            if found != rows:
+                errors.append(f"round {attempt}: {found} rows, expected {rows}")
+            recorded.value = counter
+            if isinstance(db, LogDatabase):
+                # Leave the log as the writer left it for the next one to append to
+                atexit.unregister(db._checkpoint_if_dirty)
+                db.log_file.close()
+            else:
+                _close_scratch_table(db)
+        print(f"{DB_BACKEND}: killed the writer {rounds} times, "
+              f"{mid_write} of them inside a write")
+    return errors
+
+
+def _crash_writer(directory, recorded, writing):
+    db = _scratch_table(directory)
+    counter = db.get_by("key", "counter")
+    value = counter["value"]
+    while True:
+        value += 1
+        writing.value = 1
+        db.update({"value": value}, counter.doc_id)
+        writing.value = 0
+        recorded.value = value
+
+
+def _scratch_table(directory, shared=False):
+    backend = BACKENDS[DB_BACKEND]
+    if backend is SQLiteDatabase:
+        return backend("stress", unique=("key",), ordered=("key",),
+                       path=Path(directory) / "stress.sqlite3")
+    return backend("stress", unique=("key",), ordered=("key",),
+                   path=Path(directory) / "stress.json", shared=shared)
+
+
+def _close_scratch_table(db):
+    # Save everything now so the exit hooks have nothing left to write
+    db.flush()
+    if isinstance(db, LogDatabase):
+        db.checkpoint()
+        db.log_file.close()
+
+
+def _stress_writes(db, worker, rounds):
+    for i in range(rounds):
+        with db.transaction():
+            counter = db.get_by("key", "counter")
+            db.update({"value": counter["value"] + 1}, counter.doc_id)
+            db.insert({"key": f"row:{worker:03d}:{i:05d}", "value": i})
+
+
+def _stress_process(directory, worker, rounds):
+    db = _scratch_table(directory, shared=True)
+    _stress_writes(db, worker, rounds)
+    _close_scratch_table(db)
+
+
+def _check_stress_totals(db, expected, errors):
+    counter = db.get_by("key", "counter")["value"]
+    rows = len(db.range("key", "row:", "row:"))
+    if counter != expected:
+        errors.append(f"counter is {counter}, expected {expected}")
+    if rows != expected:
+        errors.append(f"{rows} rows written, expected {expected}")
@@ -0,0 +1,229 @@
+"""Streaming export of utils.db tables to CSV or Parquet.
+
+Every table becomes ``<out_dir>/<table>.csv`` (or ``.parquet``) with a
+``doc_id`` column. Dicts inside a document become dotted columns
+(``metadata.source``). Lists become child tables named
+``<table>__<field>``, e.g. ``goals__key_results``, with the parent's
+``doc_id`` and a ``<field>_index`` position column to join on; lists of
+plain values get a single ``value`` column.
+
+Tables are read with ``stream()`` and written ``chunk_size`` rows at a
+time, so a large table is never held as one list. Parquet needs the
+pyarrow package.
+"""
+import csv
+import json
+import os
+from pathlib import Path
+
+from utils import db
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FORMATS = ("csv", "parquet")
+CHUNK_SIZE = 5000
+
+# Table -> field that --start/--end slice on; None means always exported in full
+TABLES = {
+    "tasks": "created_at",
+    "journal": "date",
+    "habits": "created_at",
+    "habit_entries": "date",
+    "notes": "created_at",
+    "settings": None,
+    "settings_archive": None,
+    "health": "date",
+    "finance": "date",
+    "contacts": "created_at",
+    "gratitude": "date",
+    "goals": "created_at",
+    "events": "date",
+}
+
+
+def _documents(name, start=None, end=None):
+    """Stream a table's documents, sliced on its TABLES field when bounded."""
+    table = getattr(db, f"{name}_db")
+    field = TABLES[name]
+    if field is None or (start is None and end is None):
+        return table.stream()
+    return table.stream(start, end, field=field)
+
+
+def flatten(table, doc, keys):
+    """Yield ``(table, row)`` for ``doc`` and for every item of its lists.
+    
+    ``keys`` are the columns that tie the rows to their document.
+    """
+    row = dict(keys)
+    lists = []
+    
+    def walk(fields, prefix):
+        for field, value in fields.items():
+            column = prefix + field
+            if isinstance(value, dict):
+                walk(value, column + ".")
+            elif isinstance(value, list):
+                lists.append((column, value))
+            else:
+                row[column] = value
+    
+    walk(doc, "")
+    yield table, row
+    for column, items in lists:
+        child = f"{table}__{column.replace('.', '_')}"
+        for position, item in enumerate(items):
+            child_keys = {**keys, f"{column}_index": position}
+            yield from flatten(child, item if isinstance(item, dict) else {"value": item}, child_keys)
+
+
+def _rows(name, start=None, end=None):
+    for doc in _documents(name, start, end):
+        yield from flatten(name, doc, {"doc_id": doc.doc_id})
+
+
+def _column_type(kinds):
+    """Pick the Parquet type for a column from the Python types seen in it."""
+    if kinds == {bool}:
+        return pyarrow.bool_()
+    if kinds == {int}:
+        return pyarrow.int64()
+    if kinds and kinds <= {int, float}:
+        return pyarrow.float64()
+    return pyarrow.string()
+
+
+def _parquet_value(value, kind):
+    if value is None:
+        return None
+    if kind == pyarrow.string():
+        return value if isinstance(value, str) else json.dumps(value)
+    if kind == pyarrow.float64():
+        return float(value)
+    return value
+
+
+class CSVWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=columns, extrasaction="ignore")
+        self.writer.writeheader()
+    
+    def write(self, rows):
+        self.writer.writerows(rows)
+    
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, columns, kinds):
+        self.schema = pyarrow.schema(
+            [(column, _column_type(kinds.get(column, set()))) for column in columns]
+        )
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+    
+    def write(self, rows):
+        """Write ``rows`` as one row group."""
+        data = {
+            field.name: [_parquet_value(row.get(field.name), field.type) for row in rows]
+            for field in self.schema
+        }
+        self.writer.write_table(pyarrow.Table.from_pydict(data, schema=self.schema))
+    
+    def close(self):
+        self.writer.close()
+
+
+def export_table(name, out_dir, fmt="csv", start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Export one table and its child tables; return {output table: rows}.
+    
+    The table is streamed twice: once to collect columns (and their types
+    for Parquet), once to write. A document written in between is exported
+    with the columns already known. Files are written under a temporary
+    name and renamed when complete, so a reader never sees half a file.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {list(EXPORT_FORMATS)}")
+    if fmt == "parquet" and pyarrow is None:
+        raise ImportError("Parquet export needs the pyarrow package (pip install pyarrow)")
+    
+    columns, kinds = {}, {}
+    for table, row in _rows(name, start, end):
+        known = columns.setdefault(table, {})
+        for column, value in row.items():
+            known[column] = None
+            if value is not None:
+                kinds.setdefault((table, column), set()).add(type(value))
+    
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    writers, buffers, counts, paths = {}, {}, {}, {}
+    try:
+        for table, table_columns in columns.items():
+            paths[table] = out_dir / f"{table}.{fmt}"
+            tmp_path = paths[table].with_name(paths[table].name + ".tmp")
+            if fmt == "csv":
+                writers[table] = CSVWriter(tmp_path, list(table_columns))
+            else:
+                table_kinds = {column: kinds.get((table, column), set()) for column in table_columns}
+                writers[table] = ParquetWriter(tmp_path, list(table_columns), table_kinds)
+            buffers[table], counts[table] = [], 0
+        for table, row in _rows(name, start, end):
+            if table not in writers:
+                continue
+            buffer = buffers[table]
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                writers[table].write(buffer)
+                counts[table] += len(buffer)
+                buffer.clear()
+        for table, buffer in buffers.items():
+            if buffer:
+                writers[table].write(buffer)
+                counts[table] += len(buffer)
+    except BaseException:
+        for writer in writers.values():
+            writer.close()
+        for path in paths.values():
+            path.with_name(path.name + ".tmp").unlink(missing_ok=True)
+        raise
+    for writer in writers.values():
+        writer.close()
+    for path in paths.values():
+        os.replace(path.with_name(path.name + ".tmp"), path)
+    return counts
+
+
+def export_all(out_dir, fmt="csv", start=None, end=None, tables=None, chunk_size=CHUNK_SIZE):
+    """Export every table (or ``tables``); return {output table: rows}."""
+    exported = {}
+    for name in tables or TABLES:
+        counts = export_table(name, out_dir, fmt, start, end, chunk_size)
+        if not counts:
+            print(f"⏭️  {name}: nothing to export")
+        for table, rows in counts.items():
+            print(f"✅ {table}: {rows:,} rows")
+        exported.update(counts)
+    return exported
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Export dashboard tables to CSV or Parquet")
+    parser.add_argument("out_dir", help="Directory to write the files to")
+    parser.add_argument("--format", default="csv", choices=EXPORT_FORMATS)
+    parser.add_argument("--start", help="Only documents on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Only documents on or before this date (YYYY-MM-DD)")
+    parser.add_argument("--table", action="append", choices=list(TABLES), dest="tables",
+                        help="Export only this table (repeatable)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    
+    args = parser.parse_args()
+    export_all(args.out_dir, args.format, args.start, args.end, args.tables, args.chunk_size)
+    print(f"🎉 Done! Files are in {args.out_dir}")
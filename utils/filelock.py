@@ -0,0 +1,66 @@
+"""Advisory cross-process locks used by utils.db.
+
+Tables shared between processes (DB_MULTIPROCESS) lock every write.
+Other tables lock only while saving their file, so vacuum can rewrite
+it from another process without losing a save.
+"""
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, fall back to in-process only
+    fcntl = None
+
+
+class FileLock:
+    """flock()-based lock on ``path`` that also stores a change counter.
+
+    The file holds two numbers. ``generation`` is bumped after every
+    committed write. ``epoch`` is bumped when the data was rewritten
+    wholesale, e.g. a log checkpoint, so readers that follow a file
+    incrementally know to start over. Readers compare the raw contents,
+    which is a single pread() and needs no lock.
+    """
+
+    WIDTH = 20
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.depth = 0
+
+    def acquire(self, shared=False):
+        """Take the lock; nested calls only count, the outermost one locks."""
+        if self.depth == 0 and fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0 and fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def token(self):
+        """Return the raw counter bytes; they change on every bump."""
+        return os.pread(self.fd, 2 * self.WIDTH + 2, 0)
+
+    def counters(self):
+        """Return ``(generation, epoch)``."""
+        try:
+            generation, epoch = self.token().split()
+            return int(generation), int(epoch)
+        except ValueError:
+            return 0, 0
+
+    def bump(self, rewritten=False):
+        """Record a write. Call while holding the exclusive lock."""
+        generation, epoch = self.counters()
+        record = f"{generation + 1:0{self.WIDTH}d} {epoch + rewritten:0{self.WIDTH}d}\n"
+        os.pwrite(self.fd, record.encode(), 0)
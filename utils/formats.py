@@ -0,0 +1,74 @@
+"""On-disk encodings for utils.db table files.
+
+"json" is the original indented TinyDB file. "compact" is the same JSON
+without whitespace, written by orjson when it is installed. "msgpack" is
+binary and needs the msgpack package. Any of them can be wrapped in a
+zstd frame, which needs the zstandard package. Reads work out the
+encoding from the bytes, so any table file can be opened whatever
+DB_FORMAT says.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMATS = ("json", "compact", "msgpack")
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def suffix(fmt, compress=False):
+    """Return the file suffix for a table stored as ``fmt``."""
+    return (".msgpack" if fmt == "msgpack" else ".json") + (".zst" if compress else "")
+
+
+SUFFIXES = tuple(suffix(fmt, compress) for fmt in ("json", "msgpack") for compress in (False, True))
+
+
+def check(fmt, compress=False):
+    """Raise if ``fmt`` (and compression) cannot be used in this environment."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown storage format '{fmt}', expected one of {list(FORMATS)}")
+    if fmt == "msgpack" and msgpack is None:
+        raise ImportError("The msgpack format needs the msgpack package (pip install msgpack)")
+    if compress and zstandard is None:
+        raise ImportError("zstd compression needs the zstandard package (pip install zstandard)")
+
+
+def encode(data, fmt="json", compress=False):
+    """Serialize a TinyDB tables dict to bytes."""
+    if fmt == "msgpack":
+        raw = msgpack.packb(data)
+    elif fmt == "compact":
+        raw = orjson.dumps(data) if orjson else json.dumps(data, separators=(",", ":")).encode()
+    else:
+        raw = json.dumps(data, indent=2).encode()
+    if compress:
+        raw = zstandard.ZstdCompressor().compress(raw)
+    return raw
+
+
+def decode(raw):
+    """Parse bytes written by ``encode`` in any format; empty input gives None."""
+    if raw.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ImportError("This file is zstd-compressed; pip install zstandard to read it")
+        raw = zstandard.ZstdDecompressor().decompress(raw)
+    if not raw.strip():
+        return None
+    if raw.lstrip()[:1] == b"{":
+        return orjson.loads(raw) if orjson else json.loads(raw)
+    if msgpack is None:
+        raise ImportError("This file is msgpack-encoded; pip install msgpack to read it")
+    return msgpack.unpackb(raw)
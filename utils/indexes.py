@@ -0,0 +1,763 @@
+"""In-memory secondary indexes maintained by utils.db.Database."""
+import bisect
+import hashlib
+import heapq
+import itertools
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class HashIndex:
+    """Map each value of a field to the IDs of the documents holding it.
+    
+    A list value (e.g. tags) is indexed under each of its items, and
+    ``multi`` records that the index has seen one, so a lookup may then
+    also return documents whose list merely contains the value.
+    """
+    
+    def __init__(self, field, unique=False):
+        self.field = field
+        self.unique = unique
+        self.multi = False
+        self.entries = {}
+    
+    def _keys(self, doc):
+        value = doc.get(self.field)
+        values = dict.fromkeys(value) if isinstance(value, list) else [value]
+        keys = []
+        for value in values:
+            try:
+                hash(value)
+            except TypeError:
+                continue
+            if value is not None:
+                keys.append(value)
+        return keys
+    
+    def rebuild(self, docs):
+        """Index every document in a {doc_id: doc} mapping."""
+        self.entries = {}
+        self.multi = False
+        for doc_id, doc in docs.items():
+            self.add(doc_id, doc)
+    
+    def add(self, doc_id, doc):
+        if isinstance(doc.get(self.field), list):
+            self.multi = True
+        for key in self._keys(doc):
+            self.entries.setdefault(key, []).append(doc_id)
+    
+    def copy(self):
+        """Return an independent copy for a read-only snapshot."""
+        index = HashIndex(self.field, self.unique)
+        index.multi = self.multi
+        index.entries = {key: list(doc_ids) for key, doc_ids in self.entries.items()}
+        return index
+    
+    def discard(self, doc_id, doc):
+        for key in self._keys(doc):
+            doc_ids = self.entries.get(key)
+            if doc_ids and doc_id in doc_ids:
+                doc_ids.remove(doc_id)
+                if not doc_ids:
+                    del self.entries[key]
+    
+    def lookup(self, value):
+        """Return the IDs of documents whose field equals ``value``."""
+        try:
+            return self.entries.get(value, [])
+        except TypeError:
+            return []
+
+
+class SortedIndex:
+    """Keep the string values of a field in sorted order for range scans."""
+    
+    def __init__(self, field):
+        self.field = field
+        self.keys = []
+    
+    def rebuild(self, docs):
+        """Index every document in a {doc_id: doc} mapping."""
+        self.keys = sorted(
+            (doc[self.field], doc_id) for doc_id, doc in docs.items()
+            if isinstance(doc.get(self.field), str)
+        )
+    
+    def add(self, doc_id, doc):
+        value = doc.get(self.field)
+        if isinstance(value, str):
+            bisect.insort(self.keys, (value, doc_id))
+    
+    def copy(self):
+        """Return an independent copy for a read-only snapshot."""
+        index = SortedIndex(self.field)
+        index.keys = list(self.keys)
+        return index
+    
+    def discard(self, doc_id, doc):
+        value = doc.get(self.field)
+        if isinstance(value, str):
+            i = bisect.bisect_left(self.keys, (value, doc_id))
+            if i < len(self.keys) and self.keys[i] == (value, doc_id):
+                del self.keys[i]
+    
+    def range(self, start=None, end=None):
+        """Return the IDs of documents with ``start <= value <= end``.
+        
+        ``end`` also matches values that start with it, so a date bound
+        covers the whole day of a timestamp. IDs come back in value order.
+        """
+        lo = 0 if start is None else bisect.bisect_left(self.keys, (start,))
+        hi = len(self.keys) if end is None else bisect.bisect_right(self.keys, (end + "\uffff",))
+        return [doc_id for _, doc_id in self.keys[lo:hi]]
+    
+    def count(self, start=None, end=None):
+        """Return how many documents ``range`` would, without listing them."""
+        lo = 0 if start is None else bisect.bisect_left(self.keys, (start,))
+        hi = len(self.keys) if end is None else bisect.bisect_right(self.keys, (end + "\uffff",))
+        return max(hi - lo, 0)
+
+
+TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    return TOKEN.findall(text.lower())
+
+
+def _fingerprint(text):
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+class TextIndex:
+    """Inverted index over text fields, ranked with BM25.
+    
+    For every term it keeps the documents holding it and how often; for
+    every document its length in tokens, its terms and a fingerprint of
+    its text. The index starts ``stale``, and the table marks it stale
+    again when it changes unseen; the next search calls ``sync``, which
+    tokenizes just the documents whose fingerprint changed, so a state
+    read back from ``storage`` (any TinyDB Storage) catches up with the
+    table cheaply and tables nobody searches cost nothing. The state is written back by ``save``, on exit and after
+    a sync that changed anything; it is only a cache, so losing it costs
+    one full rebuild.
+    
+    Unlike the other indexes it is not copied into snapshots. Writers
+    update it in place and readers search it under ``lock`` instead, which
+    keeps writes cheap however large the index grows.
+    """
+    
+    K1 = 1.2
+    B = 0.75
+    PREFIX_TERMS = 20  # Completions kept for the last query word, most common first
+    PREFIX_MIN = 3  # Shorter last words match whole only; they would expand to most of the vocabulary
+    
+    def __init__(self, fields, storage=None):
+        self.fields = tuple(fields)
+        self.storage = storage
+        self.lock = threading.Lock()
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.docs = {}  # doc_id -> (fingerprint, length, terms)
+        self.total_length = 0
+        self.vocabulary = None  # Sorted terms for prefix matching, None when stale
+        self.loaded = storage is None
+        self.stale = True
+        self.dirty = False
+    
+    def text(self, doc):
+        """Return the indexed text of ``doc``, one field (or list item) per line."""
+        parts = []
+        for field in self.fields:
+            value = doc.get(field)
+            if isinstance(value, list):
+                parts.extend(str(item) for item in value)
+            elif value is not None:
+                parts.append(str(value))
+        return "\n".join(parts)
+    
+    def _add(self, doc_id, text, fingerprint):
+        counts = Counter(tokenize(text))
+        for term, frequency in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self.vocabulary = None
+            postings[doc_id] = frequency
+        length = sum(counts.values())
+        self.docs[doc_id] = (fingerprint, length, tuple(counts))
+        self.total_length += length
+        self.dirty = True
+    
+    def _discard(self, doc_id):
+        known = self.docs.pop(doc_id, None)
+        if known is None:
+            return
+        _, length, terms = known
+        for term in terms:
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+                self.vocabulary = None
+        self.total_length -= length
+        self.dirty = True
+    
+    def add(self, doc_id, doc):
+        if self.stale:
+            return  # sync() will pick it up
+        text = self.text(doc)
+        with self.lock:
+            self._discard(doc_id)
+            self._add(doc_id, text, _fingerprint(text))
+    
+    def discard(self, doc_id, doc):
+        if self.stale:
+            return
+        with self.lock:
+            self._discard(doc_id)
+    
+    def sync(self, docs):
+        """Bring the index in line with a {doc_id: doc} mapping.
+        
+        The caller must keep ``docs`` from changing meanwhile.
+        """
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            changed = False
+            for doc_id in [doc_id for doc_id in self.docs if doc_id not in docs]:
+                self._discard(doc_id)
+                changed = True
+            for doc_id, doc in docs.items():
+                text = self.text(doc)
+                fingerprint = _fingerprint(text)
+                known = self.docs.get(doc_id)
+                if known is None or known[0] != fingerprint:
+                    self._discard(doc_id)
+                    self._add(doc_id, text, fingerprint)
+                    changed = True
+            self.stale = False
+        if changed:
+            self.save()
+    
+    def _load(self):
+        self.loaded = True
+        try:
+            state = self.storage.read()
+            if not state or state.get("fields") != list(self.fields):
+                return
+            for doc_id, (fingerprint, length) in state["docs"].items():
+                self.docs[int(doc_id)] = (fingerprint, length, [])
+                self.total_length += length
+            for term, flat in state["postings"].items():
+                postings = self.postings[term] = dict(zip(flat[::2], flat[1::2]))
+                for doc_id in postings:
+                    self.docs[doc_id][2].append(term)
+        except (KeyError, TypeError, ValueError):
+            # Unreadable: start empty and let sync index everything
+            self.postings, self.docs, self.total_length = {}, {}, 0
+    
+    def save(self):
+        """Write the index to ``storage`` if it changed since last time."""
+        if self.storage is None or not self.dirty:
+            return
+        with self.lock:
+            state = {
+                "fields": list(self.fields),
+                "docs": {
+                    str(doc_id): [fingerprint, length] for doc_id, (fingerprint, length, _) in self.docs.items()
+                },
+                "postings": {
+                    term: [value for item in postings.items() for value in item]
+                    for term, postings in self.postings.items()
+                },
+            }
+            self.dirty = False
+        self.storage.write(state)
+    
+    def terms(self, query):
+        """Return the query's terms; the last one also matches as a prefix, for typing."""
+        words = tokenize(query)
+        if not words or len(words[-1]) < self.PREFIX_MIN:
+            return list(dict.fromkeys(words))
+        with self.lock:
+            if self.vocabulary is None:
+                self.vocabulary = sorted(self.postings)
+            vocabulary = self.vocabulary
+        prefix = words[-1]
+        expanded = vocabulary[
+            bisect.bisect_left(vocabulary, prefix):bisect.bisect_left(vocabulary, prefix + "\uffff")
+        ]
+        if len(expanded) > self.PREFIX_TERMS:
+            with self.lock:
+                expanded = heapq.nlargest(
+                    self.PREFIX_TERMS, expanded, key=lambda term: len(self.postings.get(term, ()))
+                )
+        return list(dict.fromkeys(words[:-1] + [prefix] + expanded))
+    
+    def stats(self, terms):
+        """Return (documents, total length, {term: documents holding it})."""
+        with self.lock:
+            counts = {term: len(self.postings.get(term, ())) for term in terms}
+            return len(self.docs), self.total_length, counts
+    
+    def score(self, terms, stats=None, limit=20, live=None):
+        """Rank documents holding any of ``terms``; return [(doc_id, score)], best first.
+        
+        ``stats`` lets several indexes (e.g. yearly partitions) share one
+        BM25 collection; by default this index's own are used. Only IDs in
+        ``live`` are returned when it is given.
+        """
+        documents, total_length, counts = stats or self.stats(terms)
+        if not documents:
+            return []
+        average = total_length / documents or 1
+        base, per_token = self.K1 * (1 - self.B), self.K1 * self.B / average
+        docs = self.docs
+        scores = {}
+        with self.lock:
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                held = counts.get(term) or len(postings)
+                weight = math.log(1 + (documents - held + 0.5) / (held + 0.5)) * (self.K1 + 1)
+                for doc_id, frequency in postings.items():
+                    norm = base + per_token * docs[doc_id][1]
+                    scores[doc_id] = scores.get(doc_id, 0) + weight * frequency / (frequency + norm)
+        if live is not None:
+            scores = {doc_id: score for doc_id, score in scores.items() if doc_id in live}
+        if limit is None:
+            return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+    
+    def snippet(self, doc, terms, width=30):
+        """Return about ``width`` words of ``doc`` around its best run of matches.
+        
+        Matched words are wrapped in ``**`` for Markdown, and ``…`` marks
+        cut text.
+        """
+        wanted = set(terms)
+        best = ""
+        best_hits = -1
+        for field in self.fields:
+            value = doc.get(field)
+            text = ", ".join(map(str, value)) if isinstance(value, list) else str(value or "")
+            words = list(TOKEN.finditer(text))
+            hits = [i for i, word in enumerate(words) if word.group().lower() in wanted]
+            if not words or len(hits) <= best_hits:
+                continue
+            # The window that starts at the match with most matches in reach
+            start = max(hits, key=lambda i: sum(1 for j in hits if i <= j < i + width)) if hits else 0
+            start = max(0, min(start - 3, len(words) - width))
+            window = words[start:start + width]
+            pieces, position = [], window[0].start()
+            for word in window:
+                pieces.append(text[position:word.start()])
+                pieces.append(f"**{word.group()}**" if word.group().lower() in wanted else word.group())
+                position = word.end()
+            snippet = " ".join("".join(pieces).split())
+            best = ("… " if start else "") + snippet + (" …" if start + width < len(words) else "")
+            best_hits = len(hits)
+        return best
+
+
+class TrigramIndex:
+    """Map every three-character run of some fields' text to the documents holding it.
+    
+    A substring of three or more characters can only occur in documents
+    holding all of its trigrams, so ``candidates`` intersects those sets
+    and the caller checks the few documents left with ``matches``. Text is
+    lowercased, and each field (a list joined with spaces) is indexed on
+    its own, so no trigram spans two fields.
+    
+    Like TextIndex it is built by the first search while ``stale`` (see
+    ``sync``), then updated in place and searched under ``lock`` rather
+    than copied into snapshots.
+    """
+    
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.lock = threading.Lock()
+        self.grams = {}  # trigram -> {doc_id}
+        self.stale = True
+    
+    def values(self, doc):
+        """Return the lowercased text of each field that ``doc`` has."""
+        values = []
+        for field in self.fields:
+            value = doc.get(field)
+            if isinstance(value, list):
+                values.append(" ".join(map(str, value)).lower())
+            elif value is not None:
+                values.append(str(value).lower())
+        return values
+    
+    def matches(self, doc, text):
+        """Return whether ``text`` occurs in any field of ``doc``, ignoring case."""
+        text = text.lower()
+        return any(text in value for value in self.values(doc))
+    
+    def _grams(self, doc):
+        return {value[i:i + 3] for value in self.values(doc) for i in range(len(value) - 2)}
+    
+    def add(self, doc_id, doc):
+        if self.stale:
+            return  # sync() will pick it up
+        grams = self._grams(doc)
+        with self.lock:
+            for gram in grams:
+                self.grams.setdefault(gram, set()).add(doc_id)
+    
+    def discard(self, doc_id, doc):
+        if self.stale:
+            return
+        grams = self._grams(doc)
+        with self.lock:
+            for gram in grams:
+                doc_ids = self.grams.get(gram)
+                if doc_ids is not None:
+                    doc_ids.discard(doc_id)
+                    if not doc_ids:
+                        del self.grams[gram]
+    
+    def sync(self, docs):
+        """Index every document in a {doc_id: doc} mapping.
+        
+        The caller must keep ``docs`` from changing meanwhile.
+        """
+        grams = {}
+        for doc_id, doc in docs.items():
+            for gram in self._grams(doc):
+                doc_ids = grams.get(gram)
+                if doc_ids is None:
+                    grams[gram] = {doc_id}
+                else:
+                    doc_ids.add(doc_id)
+        with self.lock:
+            self.grams = grams
+            self.stale = False
+    
+    def candidates(self, text):
+        """Return the IDs of documents that may hold ``text``.
+        
+        Returns None for text under three characters, which has no trigram
+        to narrow with, so every document is a candidate.
+        """
+        text = text.lower()
+        if len(text) < 3:
+            return None
+        wanted = {text[i:i + 3] for i in range(len(text) - 2)}
+        with self.lock:
+            postings = [self.grams.get(gram) for gram in wanted]
+            if not all(postings):
+                return set()
+            postings.sort(key=len)
+            found = set(postings[0])
+            for doc_ids in postings[1:]:
+                found &= doc_ids
+                if not found:
+                    break
+        return found
+
+
+class _TrieNode:
+    def __init__(self):
+        self.children = {}  # next character -> _TrieNode
+        self.keys = []  # Ranking keys of the strings that end here
+        self.top = []  # Best keys in this subtree, one per document, best first
+
+
+class PrefixIndex:
+    """Trie over the words of some fields, for as-you-type suggestions.
+    
+    Each field value (each item of a list) is lowercased and inserted from
+    the start of every word, so both "ana sm" and "smi" reach "Ana Smith".
+    Every node keeps the best ``KEEP`` documents below it, so ``complete``
+    only walks the typed characters and reads them off. A match in an
+    earlier field ranks first, then one nearer the start of the value,
+    then the shorter value. Strings are cut at ``DEPTH`` characters.
+    
+    Like TextIndex it is built by the first search while ``stale``, then
+    updated in place and searched under ``lock``.
+    """
+    
+    KEEP = 20
+    DEPTH = 64
+    
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.lock = threading.Lock()
+        self.root = _TrieNode()
+        self.stale = True
+    
+    def _entries(self, doc_id, doc):
+        """Yield (string, ranking key) for every word start in ``doc``'s fields."""
+        for position, field in enumerate(self.fields):
+            value = doc.get(field)
+            for item in value if isinstance(value, list) else [value]:
+                if item is None:
+                    continue
+                text = " ".join(str(item).lower().split())
+                for word, match in enumerate(TOKEN.finditer(text)):
+                    yield text[match.start():][:self.DEPTH], (position, word, len(text), text, doc_id)
+    
+    def _path(self, string, create=False):
+        """Return the nodes from the root to ``string``'s, or None if it is missing."""
+        path = [self.root]
+        for char in string:
+            node = path[-1].children.get(char)
+            if node is None:
+                if not create:
+                    return None
+                node = path[-1].children[char] = _TrieNode()
+            path.append(node)
+        return path
+    
+    def _offer(self, node, key):
+        """Put ``key`` into ``node.top`` if it ranks there."""
+        top = node.top
+        for i, held in enumerate(top):
+            if held[-1] == key[-1]:
+                if held <= key:
+                    return
+                del top[i]
+                break
+        if len(top) < self.KEEP or key < top[-1]:
+            bisect.insort(top, key)
+            del top[self.KEEP:]
+    
+    def _refill(self, node):
+        """Recompute ``node.top`` from its own keys and its children's tops."""
+        best = {}
+        for key in itertools.chain(node.keys, *(child.top for child in node.children.values())):
+            held = best.get(key[-1])
+            if held is None or key < held:
+                best[key[-1]] = key
+        node.top = heapq.nsmallest(self.KEEP, best.values())
+    
+    def add(self, doc_id, doc):
+        if self.stale:
+            return  # sync() will pick it up
+        with self.lock:
+            for string, key in self._entries(doc_id, doc):
+                path = self._path(string, create=True)
+                path[-1].keys.append(key)
+                for node in path:
+                    self._offer(node, key)
+    
+    def discard(self, doc_id, doc):
+        if self.stale:
+            return
+        with self.lock:
+            for string, key in self._entries(doc_id, doc):
+                path = self._path(string)
+                if path is None or key not in path[-1].keys:
+                    continue
+                path[-1].keys.remove(key)
+                # Bottom up, so each node refills from children already fixed
+                for depth in range(len(path) - 1, -1, -1):
+                    node = path[depth]
+                    if depth and not node.keys and not node.children:
+                        del path[depth - 1].children[string[depth - 1]]
+                    elif key in node.top:
+                        self._refill(node)
+    
+    def sync(self, docs):
+        """Index every document in a {doc_id: doc} mapping.
+        
+        The caller must keep ``docs`` from changing meanwhile.
+        """
+        root = _TrieNode()
+        for doc_id, doc in docs.items():
+            for string, key in self._entries(doc_id, doc):
+                node = root
+                for char in string:
+                    child = node.children.get(char)
+                    if child is None:
+                        child = node.children[char] = _TrieNode()
+                    node = child
+                node.keys.append(key)
+        # Children before parents: reversed pre-order
+        order, pending = [], [root]
+        while pending:
+            node = pending.pop()
+            order.append(node)
+            pending.extend(node.children.values())
+        for node in reversed(order):
+            self._refill(node)
+        with self.lock:
+            self.root = root
+            self.stale = False
+    
+    def rank(self, text, doc_id, doc):
+        """Return how well ``doc`` completes ``text`` (lower is better), or None if no word starts with it.
+        
+        The same ranking as ``complete``, worked out from the document alone.
+        """
+        prefix = " ".join(text.lower().split())[:self.DEPTH]
+        keys = [key for string, key in self._entries(doc_id, doc) if string.startswith(prefix)]
+        return min(keys) if keys else None
+    
+    def complete(self, text, limit=10):
+        """Return the IDs of the best documents (at most ``KEEP``) with a word starting with ``text``."""
+        prefix = " ".join(text.lower().split())[:self.DEPTH]
+        with self.lock:
+            node = self.root
+            for char in prefix:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            return [key[-1] for key in node.top[:limit]]
+
+
+def _bucket(term, dimensions):
+    """Return the (column, sign) a term is hashed to; stable across processes."""
+    digest = zlib.crc32(term.encode())
+    return digest % dimensions, 1.0 if digest & 0x80000000 else -1.0
+
+
+class VectorIndex:
+    """Hashed bag-of-words vectors of some fields, for "more like this" search.
+    
+    Each document is a row of a float32 NumPy matrix. Every word is hashed
+    to one of ``DIMENSIONS`` columns with a +/-1 sign and weighs
+    1 + log(count). ``search`` scores a batch of queries by cosine
+    similarity with two matrix products, weighting columns by inverse
+    document frequency at query time, so stored rows never need
+    recomputing as the collection grows. Everything runs locally; it
+    needs numpy.
+    
+    Like TextIndex it is built by the first search while ``stale``, then
+    updated in place and searched under ``lock``.
+    """
+    
+    DIMENSIONS = 1024
+    
+    text = TextIndex.text
+    
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.lock = threading.Lock()
+        self.rows = None  # float32 matrix, one row per document, with spare rows at the end
+        self.squares = None  # rows ** 2, for the weighted row norms
+        self.ids = []  # doc_id of each used row
+        self.positions = {}  # doc_id -> row
+        self.frequencies = None  # documents with a nonzero value in each column
+        self.stale = True
+    
+    def vectors(self, texts):
+        """Return the unweighted vectors of ``texts`` as a matrix, one row each."""
+        if numpy is None:
+            raise ImportError("Similarity search needs the numpy package (pip install numpy)")
+        counters = [Counter(tokenize(text)) for text in texts]
+        buckets = {term: _bucket(term, self.DIMENSIONS) for term in set().union(*counters)}
+        rows = numpy.repeat(numpy.arange(len(texts)), [len(counts) for counts in counters])
+        columns = [buckets[term][0] for counts in counters for term in counts]
+        weights = numpy.array([buckets[term][1] for counts in counters for term in counts], numpy.float32)
+        weights *= 1 + numpy.log([count for counts in counters for count in counts.values()], dtype=numpy.float32)
+        matrix = numpy.zeros((len(texts), self.DIMENSIONS), numpy.float32)
+        # One scatter for the whole batch; words sharing a column add up
+        numpy.add.at(matrix, (rows, columns), weights)
+        return matrix
+    
+    def _put(self, doc_id, vector):
+        row = self.positions.get(doc_id)
+        if row is None:
+            row = len(self.ids)
+            if row == len(self.rows):
+                # Grow by doubling, so appends stay cheap
+                self.rows = numpy.concatenate([self.rows, numpy.zeros_like(self.rows)])
+                self.squares = numpy.concatenate([self.squares, numpy.zeros_like(self.squares)])
+            self.ids.append(doc_id)
+            self.positions[doc_id] = row
+        else:
+            self.frequencies -= self.rows[row] != 0
+        self.rows[row] = vector
+        self.squares[row] = vector * vector
+        self.frequencies += vector != 0
+    
+    def add(self, doc_id, doc):
+        if self.stale:
+            return  # sync() will pick it up
+        vector = self.vectors([self.text(doc)])[0]
+        with self.lock:
+            self._put(doc_id, vector)
+    
+    def discard(self, doc_id, doc):
+        if self.stale:
+            return
+        with self.lock:
+            row = self.positions.pop(doc_id, None)
+            if row is None:
+                return
+            self.frequencies -= self.rows[row] != 0
+            # Move the last row into the gap
+            last = len(self.ids) - 1
+            if row != last:
+                self.rows[row] = self.rows[last]
+                self.squares[row] = self.squares[last]
+                self.ids[row] = self.ids[last]
+                self.positions[self.ids[row]] = row
+            self.rows[last] = 0
+            self.squares[last] = 0
+            self.ids.pop()
+    
+    def sync(self, docs):
+        """Index every document in a {doc_id: doc} mapping.
+        
+        The caller must keep ``docs`` from changing meanwhile.
+        """
+        ids = list(docs)
+        vectors = self.vectors([self.text(docs[doc_id]) for doc_id in ids])
+        rows = numpy.zeros((max(2 * len(ids), 16), self.DIMENSIONS), numpy.float32)
+        rows[:len(ids)] = vectors
+        with self.lock:
+            self.rows = rows
+            self.squares = rows * rows
+            self.ids = ids
+            self.positions = {doc_id: row for row, doc_id in enumerate(ids)}
+            self.frequencies = (vectors != 0).sum(axis=0).astype(numpy.float32)
+            self.stale = False
+    
+    def stats(self):
+        """Return (documents, documents per column), for sharing weights across indexes."""
+        with self.lock:
+            return len(self.ids), self.frequencies.copy()
+    
+    def search(self, queries, limit=5, stats=None):
+        """Return the ``limit`` most similar documents for each row of ``queries``.
+        
+        ``queries`` comes from ``vectors``. The result holds one
+        [(doc_id, cosine similarity)] list per query, best first, without
+        documents sharing no word with it. ``stats`` lets several indexes
+        (e.g. yearly partitions) weigh columns alike.
+        """
+        documents, frequencies = stats or self.stats()
+        weights = (numpy.log((1 + documents) / (1 + frequencies)) + 1) ** 2
+        with self.lock:
+            used = len(self.ids)
+            if not used:
+                return [[] for _ in queries]
+            dots = self.rows[:used] @ (queries * weights).T
+            norms = numpy.sqrt(self.squares[:used] @ weights)
+            ids = list(self.ids)
+        query_norms = numpy.sqrt((queries * queries) @ weights)
+        scores = dots / (numpy.outer(norms, query_norms) + 1e-9)
+        results = []
+        for column in scores.T:
+            count = min(limit, used)
+            best = numpy.argpartition(-column, count - 1)[:count]
+            best = best[numpy.argsort(-column[best])]
+            results.append([(ids[row], float(column[row])) for row in best if column[row] > 0])
+        return results
@@ -0,0 +1,105 @@
+"""Quick search across tables, for the search box in the app sidebar.
+
+Every table in SOURCES keeps a full-text index (``text=`` in utils.db)
+that follows each write, so a query only ranks the postings of its words.
+Clicking a result opens the page that owns it, where
+``show_search_target()`` shows the document at the top.
+"""
+import streamlit as st
+
+from utils.db import (
+    contacts_db, events_db, finance_db, goals_db, gratitude_db, journal_db, notes_db, tasks_db
+)
+
+# Type -> table, heading, owning page, the field that names a hit and the fields shown when opened
+SOURCES = {
+    "tasks": {"table": tasks_db, "label": "✅ Tasks", "page": "pages/1_Tasks.py",
+              "title": "title", "show": ("description", "status", "deadline")},
+    "journal": {"table": journal_db, "label": "📝 Journal", "page": "pages/2_Journal.py",
+                "title": "date", "show": ("content",)},
+    "notes": {"table": notes_db, "label": "💡 Notes", "page": "pages/5_Notes.py",
+              "title": "title", "show": ("content", "tags")},
+    "contacts": {"table": contacts_db, "label": "👥 Contacts", "page": "pages/9_Contacts.py",
+                 "title": "name", "show": ("company", "email", "phone", "notes")},
+    "goals": {"table": goals_db, "label": "🎯 Goals", "page": "pages/11_Goals.py",
+              "title": "title", "show": ("description", "deadline", "progress")},
+    "events": {"table": events_db, "label": "📅 Events", "page": "pages/12_Calendar.py",
+               "title": "title", "show": ("date", "time", "description")},
+    "gratitude": {"table": gratitude_db, "label": "🙏 Gratitude", "page": "pages/10_Gratitude.py",
+                  "title": "date", "show": ("gratitude_1", "gratitude_2", "gratitude_3", "wins", "lessons")},
+    "finance": {"table": finance_db, "label": "💰 Finance", "page": "pages/8_Finance.py",
+                "title": "description", "show": ("date", "amount", "category")},
+}
+PER_TYPE = 5
+
+
+def search_all(query, per_type=PER_TYPE):
+    """Return [(type, [(document, score, snippet), ...])] for every type with hits.
+    
+    Each type holds its best ``per_type`` hits; the type with the best
+    hit comes first.
+    """
+    groups = []
+    for kind, source in SOURCES.items():
+        hits = source["table"].search_text(query, limit=per_type)
+        if hits:
+            groups.append((kind, hits))
+    groups.sort(key=lambda group: -group[1][0][1])
+    return groups
+
+
+def title_of(kind, doc):
+    """Return the one-line name of a hit."""
+    return str(doc.get(SOURCES[kind]["title"]) or "Untitled")
+
+
+def search_palette():
+    """Show the quick search box and its results, grouped by type.
+    
+    Each result is a button that opens the page it lives on.
+    """
+    query = st.text_input("🔍 Search everything", key="global_search", placeholder="Tasks, notes, people...")
+    if not query.strip():
+        return
+    
+    groups = search_all(query)
+    if not groups:
+        st.caption("No matches.")
+        return
+    
+    for kind, hits in groups:
+        source = SOURCES[kind]
+        st.markdown(f"**{source['label']}**")
+        for doc, score, snippet in hits:
+            if st.button(title_of(kind, doc), key=f"search_{kind}_{doc.doc_id}", use_container_width=True):
+                st.session_state["search_target"] = {"kind": kind, "doc_id": doc.doc_id}
+                st.switch_page(source["page"])
+            if snippet:
+                st.caption(snippet)
+
+
+def show_search_target(kind):
+    """On the page for ``kind``, show the document opened from quick search."""
+    target = st.session_state.get("search_target")
+    if not target or target["kind"] != kind:
+        return
+    doc = SOURCES[kind]["table"].get(target["doc_id"])
+    if doc is None:
+        del st.session_state["search_target"]
+        return
+    
+    with st.container(border=True):
+        col_text, col_close = st.columns([5, 1])
+        with col_text:
+            st.markdown(f"#### 🔎 {title_of(kind, doc)}")
+        with col_close:
+            if st.button("✖️ Close", key="close_search_target"):
+                del st.session_state["search_target"]
+                st.rerun()
+        for field in SOURCES[kind]["show"]:
+            value = doc.get(field)
+            if value in (None, "", []):
+                continue
+            if isinstance(value, list):
+                value = ", ".join(map(str, value))
+            st.markdown(f"**{field.replace('_', ' ').capitalize()}:** {value}")
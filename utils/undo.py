@@ -0,0 +1,46 @@
+"""Undo for soft deletes made from the Streamlit pages."""
+import time
+
+import streamlit as st
+
+from utils.db import UNDO_SECONDS
+
+
+def delete_with_undo(table, doc_id, label):
+    """Soft-delete a document and offer to undo it for UNDO_SECONDS.
+    
+    ``label`` names the document in the toast, e.g. ``task **Call Sam**``.
+    The page shows the Undo button by calling ``show_undo()``.
+    """
+    if table.delete(doc_id):
+        st.session_state.setdefault("undo_deletes", []).append(
+            {"table": table, "doc_id": doc_id, "label": label, "at": time.monotonic(), "toasted": False}
+        )
+
+
+def show_undo():
+    """Show a toast and an Undo button for each delete still inside the undo window."""
+    now = time.monotonic()
+    pending = [d for d in st.session_state.get("undo_deletes", []) if now - d["at"] < UNDO_SECONDS]
+    st.session_state["undo_deletes"] = pending
+    
+    for deleted in list(pending):
+        if not deleted["toasted"]:
+            st.toast(f"🗑️ Deleted {deleted['label']}")
+            deleted["toasted"] = True
+        
+        col_text, col_undo = st.columns([5, 1])
+        with col_text:
+            left = int(UNDO_SECONDS - (now - deleted["at"]))
+            st.caption(f"🗑️ Deleted {deleted['label']} - undo within {left}s")
+        with col_undo:
+            if st.button("↩️ Undo", key=f"undo_delete_{deleted['table'].name}_{deleted['doc_id']}"):
+                pending.remove(deleted)
+                try:
+                    restored = deleted["table"].restore(deleted["doc_id"])
+                except ValueError as e:
+                    st.error(f"Could not undo: {e}")
+                    continue
+                if restored:
+                    st.rerun()
+                st.warning("Too late to undo, it has already been purged.")